@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import time
+
+import socketio
+
+import driver_tracing
+from driver_executor import serialize_driver
+from client_metrics import CLIENT_STATS_INTERVAL, metrics, start_metrics_server
+from connection_supervisor import RECONNECT_BASE_DELAY, RECONNECT_MAX_DELAY, backoff_delays
+from messaging_client_base import SOCKETIO_SERIALIZER, USER_ID, WEBSOCKET_SERVER_URL
+from multi_chat_monitor import MultiChatMonitor
+from poll_scheduler import AdaptivePollScheduler, is_tab_hidden
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_QUEUE_SIZE = 1000  # Detection blocks (backpressure) when the backend falls this far behind
+INBOUND_QUEUE_SIZE = 100  # Responses beyond this are dropped with a warning
+
+
+class AsyncMessagingEngine:
+    """
+    asyncio runtime for a messaging client.
+
+    Detection, outbound emission and inbound response handling run as separate
+    tasks connected by bounded queues, so a slow backend never delays the next
+    scan. WebDriver-touching calls run in worker threads, and the driver's
+    DriverExecutor serializes their commands, letting a response send jump
+    ahead of the rest of a scan.
+
+    The first connect is retried with the same jittered backoff as
+    SocketSupervisor, and the client's own reconnection uses the same delays.
+    With a BrowserSupervisor, the detection loop probes the Chrome session
+    and reattaches the client when it went away. Messages from
+    `monitored_urls` (see MultiChatMonitor) are queued on the same outbound
+    queue from the monitor's thread.
+    """
+
+    def __init__(self, client, server_url=WEBSOCKET_SERVER_URL, scheduler=None, watermark_store=None,
+                 browser_supervisor=None, monitored_urls=None):
+        self.client = client
+        self.server_url = server_url
+        self.scheduler = scheduler or AdaptivePollScheduler()
+        self.watermark_store = watermark_store
+        self.browser_supervisor = browser_supervisor
+        self.monitored_urls = monitored_urls
+        self.monitor = None
+        self.sio = socketio.AsyncClient(
+            serializer=SOCKETIO_SERIALIZER, reconnection_delay=RECONNECT_BASE_DELAY, reconnection_delay_max=RECONNECT_MAX_DELAY
+        )
+        self.driver_executor = serialize_driver(client.driver)
+        self.outbound = None
+        self.inbound = None
+        self._loop = None
+        self._outage_started = None
+        self.sio.on("sendSelectedResponse", self._on_send_selected_response, namespace="/messaging")
+        self.sio.on("connect", self._on_connect, namespace="/messaging")
+        self.sio.on("disconnect", self._on_disconnect, namespace="/messaging")
+
+    async def run_driver(self, fn, *args):
+        """Runs a WebDriver-touching call off the event loop; its commands are queued on the driver thread."""
+        return await asyncio.to_thread(fn, *args)
+
+    async def run(self):
+        self.outbound = asyncio.Queue(maxsize=OUTBOUND_QUEUE_SIZE)
+        self.inbound = asyncio.Queue(maxsize=INBOUND_QUEUE_SIZE)
+        self._loop = asyncio.get_running_loop()
+
+        await self._connect()
+
+        if self.monitored_urls:
+            self.monitor = MultiChatMonitor(
+                self.monitored_urls, self._relay_monitored_message, watermark_store=self.watermark_store
+            )
+            # The detect loop relays the open chat; keep the monitor off it from the first scan
+            self.monitor.set_foreground_chat(await self.run_driver(self.client.get_current_chat_id))
+            await asyncio.to_thread(self.monitor.start)
+
+        start_metrics_server()
+        tasks = [
+            asyncio.create_task(self._detect_loop(), name="detect"),
+            asyncio.create_task(self._emit_loop(), name="emit"),
+            asyncio.create_task(self._response_loop(), name="respond"),
+        ]
+        if CLIENT_STATS_INTERVAL > 0:
+            tasks.append(asyncio.create_task(self._stats_loop(), name="stats"))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if self.monitor is not None:
+                await asyncio.to_thread(self.monitor.stop)
+            await self.sio.disconnect()
+            if self.watermark_store is not None:
+                self.watermark_store.close()
+
+    async def _connect(self):
+        """Connects to the back end, retrying with jittered exponential backoff until it is reachable."""
+        url = f"{self.server_url}/messaging"
+        for delay in backoff_delays():
+            try:
+                await self.sio.connect(url, namespaces=["/messaging"])
+                logger.info(f"Async engine connected to WebSocket server: {url}")
+                return
+            except Exception as e:
+                logger.warning(f"Connecting to {url} failed ({e}); retrying in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+    def _on_connect(self):
+        metrics.connected()
+        if self._outage_started is not None:
+            duration = time.monotonic() - self._outage_started
+            self._outage_started = None
+            metrics.recovered('socket', duration)
+            logger.info(f"Reconnected to {self.server_url} after {duration:.2f}s.")
+
+    def _on_disconnect(self, *args):
+        if self._outage_started is None:
+            self._outage_started = time.monotonic()
+
+    async def _ensure_driver(self, force):
+        """Reattaches the client if the browser session is gone (see BrowserSupervisor.ensure)."""
+        if self.browser_supervisor is None:
+            return
+        driver = self.client.driver
+        new_driver = await asyncio.to_thread(self.browser_supervisor.ensure, driver, force)
+        if new_driver is not driver:
+            self.driver_executor = serialize_driver(new_driver)
+            await asyncio.to_thread(self.client.attach_driver, new_driver)
+
+    def _stored_watermark(self, chat_id):
+        if self.watermark_store is None:
+            return 0
+        return self.watermark_store.get(chat_id) or 0
+
+    def _set_foreground_chat(self, chat_id):
+        if self.monitor is not None:
+            self.monitor.set_foreground_chat(chat_id)
+
+    async def _detect_loop(self):
+        previous_chat_id = await self.run_driver(self.client.get_current_chat_id)
+        self._set_foreground_chat(previous_chat_id)
+        last_processed_ts_float = self._stored_watermark(previous_chat_id)
+
+        cycle_failed = False
+        while True:
+            try:
+                # Reattach if Chrome (or chromedriver) went away; the watermark carries over
+                await self._ensure_driver(cycle_failed)
+                cycle_failed = False
+                if not self.scheduler.should_poll():
+                    await self._wait_for_new_messages()
+                    continue
+
+                cycle_started = time.monotonic()
+                current_chat_id = await self.run_driver(self.client.get_current_chat_id)
+                if current_chat_id != previous_chat_id:
+                    await self.outbound.put(("chatChanged", {"new_chat_id": current_chat_id}, None))
+                    snapshot = await self.run_driver(self.client.build_chat_snapshot, current_chat_id)
+                    if snapshot is not None:
+                        await self.outbound.put(("chatSnapshot", snapshot, None))
+                    previous_chat_id = current_chat_id
+                    self._set_foreground_chat(current_chat_id)
+                    last_processed_ts_float = self._stored_watermark(current_chat_id)
+                    self.scheduler.record_activity()
+
+                new_messages = await self.run_driver(self.client.detect_new_messages, last_processed_ts_float)
+                if new_messages:
+                    self.scheduler.record_activity()
+                for message in new_messages:
+                    payload = self.client.build_message_payload(
+                        message['content'], message['timestamp'], message['hashed_sender_name'], current_chat_id
+                    )
+                    await self.outbound.put(("newMessage", payload, message.get('detected_at')))
+                    last_processed_ts_float = self.client.watermark_ts(message)
+                    if self.watermark_store is not None:
+                        self.watermark_store.set(current_chat_id, last_processed_ts_float)
+
+                if self.watermark_store is not None:
+                    self.watermark_store.flush_if_due()
+                metrics.message_detected(len(new_messages))
+                metrics.cycle_done(time.monotonic() - cycle_started, len(new_messages))
+                driver_tracing.end_cycle()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Error in async detection loop.")
+                cycle_failed = True
+
+            await self._wait_for_new_messages()
+
+    def _relay_monitored_message(self, chat_id, message):
+        """Called on the monitor's thread: queues a monitored chat's message on the engine's loop, waiting while the queue is full."""
+        payload = self.client.build_message_payload(
+            message['content'], message['timestamp'], message['hashed_sender_name'], chat_id
+        )
+        asyncio.run_coroutine_threadsafe(
+            self.outbound.put(("newMessage", payload, message.get('detected_at'))), self._loop
+        ).result()
+
+    async def _wait_for_new_messages(self):
+        tab_hidden = await self.run_driver(is_tab_hidden, self.client.driver)
+        interval = self.scheduler.next_interval(tab_hidden)
+        metrics.set_gauge('poll_interval_seconds', interval)
+
+        # Push sources block on an event, which does not touch the driver
+        if getattr(self.client, 'message_observer', None) is not None or getattr(self.client, 'message_source', None) is not None:
+            await asyncio.to_thread(self.client.wait_for_new_messages, interval)
+        else:
+            await asyncio.sleep(interval)
+
+    async def _emit_loop(self):
+        while True:
+            event, payload, detected_at = await self.outbound.get()
+            try:
+                await self.sio.emit(event, payload, namespace="/messaging")
+                if event == "newMessage":
+                    metrics.message_emitted(detected_at)
+                logger.info(f"Emitted '{event}' via WebSocket.")
+            except Exception as e:
+                if event == "newMessage":
+                    metrics.emit_failed()
+                logger.exception(f"Failed to emit '{event}' via WebSocket.")
+            finally:
+                self.outbound.task_done()
+
+    async def _stats_loop(self):
+        while True:
+            await asyncio.sleep(CLIENT_STATS_INTERVAL)
+            if not self.sio.connected:
+                continue
+            try:
+                payload = metrics.snapshot()
+                payload['user_id'] = USER_ID
+                await self.sio.emit("clientStats", payload, namespace="/messaging")
+            except Exception as e:
+                logger.exception("Failed to emit 'clientStats'.")
+
+    async def _response_loop(self):
+        while True:
+            response = await self.inbound.get()
+            try:
+                await self.run_driver(self.client.send_response, response)
+                self.scheduler.record_activity()
+            except Exception as e:
+                logger.exception("Failed to send selected response.")
+            finally:
+                self.inbound.task_done()
+
+    async def _on_send_selected_response(self, data):
+        selected_response = data.get("selected_response")
+        if not selected_response:
+            logger.error("Received sendSelectedResponse event without selected_response")
+            return
+        logger.info(f"Received selected response: {selected_response}")
+        try:
+            self.inbound.put_nowait(selected_response)
+        except asyncio.QueueFull:
+            logger.warning("Inbound response queue is full; dropping response.")
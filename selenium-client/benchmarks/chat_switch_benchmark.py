@@ -0,0 +1,112 @@
+"""
+Switch-to-first-emit latency of messaging_slack when the user moves between
+chats, with the chat-state cache on and off. Each of --chats fake Slack chats
+holds --history messages; while a chat is in the background --arrivals new
+messages land in it, and the benchmark times from the switch to the first of
+them reaching the outbound queue, and counts the WebDriver commands the
+switch cycle took.
+
+Runs against the in-process FakeDriver; --latency-ms models chromedriver's
+per-command overhead and --node-latency-us the in-page cost per serialized
+message node.
+
+Usage: python benchmarks/chat_switch_benchmark.py [--chats 4] [--history 1000] [--arrivals 3] [--switches 40]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import messaging_slack  # noqa: E402
+from chat_state_cache import ChatStateCache  # noqa: E402
+from fake_webdriver import FakeDriver, SlackPage  # noqa: E402
+from message_index import MessageIndexRegistry  # noqa: E402
+from slack_extraction import slack_change_detector  # noqa: E402
+from watermark_store import WatermarkStore  # noqa: E402
+
+
+class OutboundRecorder:
+    """Stands in for the outbound spool and notes when the first message of a switch was queued."""
+
+    def __init__(self):
+        self.first_sent_at = None
+        self.sent = 0
+
+    def send(self, event, payload, key, detected_at=None):
+        if self.first_sent_at is None:
+            self.first_sent_at = time.perf_counter()
+        self.sent += 1
+        return True
+
+
+def run_case(args, cache_enabled):
+    pages = [
+        SlackPage(args.history, "dm", url=f"https://app.slack.com/client/T0000000/C{i:07d}")
+        for i in range(args.chats)
+    ]
+    driver = FakeDriver(pages[0], args.latency_ms / 1000, args.node_latency_us / 1e6)
+    recorder = OutboundRecorder()
+
+    messaging_slack.watermark_store = WatermarkStore(os.path.join(tempfile.mkdtemp(), "watermarks.db"))
+    messaging_slack.outbound = recorder
+    messaging_slack.message_indexes = MessageIndexRegistry()
+    messaging_slack.change_detector = slack_change_detector()
+    messaging_slack.chat_states = ChatStateCache() if cache_enabled else ChatStateCache(max_entries=0)
+
+    # Visit every chat once, so each has a watermark
+    chat_id = None
+    for page in pages:
+        driver.page = page
+        chat_id, _ = messaging_slack.poll_chat(driver, chat_id)
+
+    latencies = []
+    commands = []
+    for switch in range(args.switches):
+        page = pages[(switch + 1) % len(pages)]
+        page.arrive(args.arrivals)
+        recorder.first_sent_at = None
+        driver.page = page
+        driver.reset_counts()
+        started = time.perf_counter()
+        chat_id, relayed = messaging_slack.poll_chat(driver, chat_id)
+        if relayed != args.arrivals or recorder.first_sent_at is None:
+            raise RuntimeError(f"Switch {switch} relayed {relayed} messages, expected {args.arrivals}.")
+        latencies.append(recorder.first_sent_at - started)
+        commands.append(driver.command_count)
+
+    messaging_slack.watermark_store.close()
+    latencies.sort()
+    label = "cache on" if cache_enabled else "cache off"
+    print(
+        f"{label:<10} {statistics.median(latencies) * 1000:>9.2f} ms {latencies[int(len(latencies) * 0.95) - 1] * 1000:>9.2f} ms"
+        f" {statistics.mean(commands):>9.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=4)
+    parser.add_argument("--history", type=int, default=1000, help="Messages rendered in each chat")
+    parser.add_argument("--arrivals", type=int, default=3, help="Messages arriving in a chat while it is in the background")
+    parser.add_argument("--switches", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Per-command WebDriver overhead")
+    parser.add_argument("--node-latency-us", type=float, default=20.0, help="In-page cost per serialized message node")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    # No back end here: 'chatChanged' and 'chatSnapshot' are built but not emitted
+    messaging_slack.sio.emit = lambda event, data, namespace=None: None
+
+    print(f"{args.chats} chats, {args.history} messages each, {args.arrivals} arrivals per switch, {args.switches} switches")
+    print(f"{'':<10} {'p50':>12} {'p95':>12} {'commands':>9}")
+    for cache_enabled in (False, True):
+        run_case(args, cache_enabled)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Memory benchmark for the dedup cache that replaced messaging_instagram's
+unbounded seen_messages set. Feeds --messages unique messages spread over
+--chats chats (plus a repeat of a recent message every few messages) and
+reports traced memory and the cache counters at regular checkpoints. With
+--compare-set, the old set of (sender, content) tuples is measured the same way.
+
+Usage: python benchmarks/dedup_memory_benchmark.py [--messages 1000000] [--chats 20]
+           [--max-entries 10000] [--bloom-capacity 0] [--compare-set]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup_cache import DedupCache  # noqa: E402
+
+CHECKPOINTS = 10
+REPEAT_EVERY = 7  # Every 7th message repeats one seen a few messages earlier
+
+
+def messages(count, chats):
+    for i in range(count):
+        j = i - 3 if i % REPEAT_EVERY == 0 and i >= 3 else i
+        yield f"chat-{j % chats}", f"{j:08x}", f"Sender {j % 5}", f"Message {j}"
+
+
+def run_cache(args):
+    cache = DedupCache(max_entries=args.max_entries, ttl=args.ttl, bloom_capacity=args.bloom_capacity)
+    print(f"DedupCache (max entries {args.max_entries}, bloom capacity {args.bloom_capacity})")
+    print(f"{'messages':>10} {'memory':>10} {'entries':>8} {'hits':>8} {'misses':>9} {'evictions':>10} {'bloom hits':>10}")
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    step = args.messages // CHECKPOINTS
+    for i, (chat_id, key, _, _) in enumerate(messages(args.messages, args.chats), start=1):
+        cache.seen(chat_id, key)
+        if i % step == 0:
+            memory = tracemalloc.get_traced_memory()[0] - baseline
+            stats = cache.stats
+            print(
+                f"{i:>10} {memory / 1e6:>8.2f}MB {len(cache):>8} {stats['hits']:>8} {stats['misses']:>9} "
+                f"{stats['evictions']:>10} {stats['bloom_hits']:>10}"
+            )
+    elapsed = time.perf_counter() - started
+    tracemalloc.stop()
+    print(f"{args.messages / elapsed:,.0f} lookups/s")
+
+
+def run_set(args):
+    seen = set()
+    print("set of (sender, content)")
+    print(f"{'messages':>10} {'memory':>10} {'entries':>8}")
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    step = args.messages // CHECKPOINTS
+    for i, (_, _, sender, content) in enumerate(messages(args.messages, args.chats), start=1):
+        seen.add((sender, content))
+        if i % step == 0:
+            memory = tracemalloc.get_traced_memory()[0] - baseline
+            print(f"{i:>10} {memory / 1e6:>8.2f}MB {len(seen):>8}")
+    tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--max-entries", type=int, default=10000)
+    parser.add_argument("--ttl", type=float, default=24 * 3600)
+    parser.add_argument("--bloom-capacity", type=int, default=0)
+    parser.add_argument("--compare-set", action="store_true", help="Also measure the old unbounded set")
+    args = parser.parse_args()
+
+    run_cache(args)
+    if args.compare_set:
+        print()
+        run_set(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Offline benchmark for the message scanning code paths.
+
+Loads the generated Slack and Instagram HTML fixtures into headless Chrome via
+file:// and, for each scan function, reports per-poll wall time, WebDriver
+command count, Python CPU time and browser CPU time (CDP Performance
+TaskDuration). Results are written as JSON so runs can be compared.
+
+Usage: python benchmarks/dom_benchmark.py [--sizes 10 100 1000 5000] [--iterations 3] [--output dom_benchmark.json]
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import pathlib
+import statistics
+import sys
+import time
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import messaging_instagram  # noqa: E402
+import messaging_slack  # noqa: E402
+from fixtures import BASE_TS, SIZES, SLACK_VARIANTS, ensure_fixtures  # noqa: E402
+from instagram_client import InstagramClient  # noqa: E402
+from slack_client import SlackClient  # noqa: E402
+from slack_extraction import take_slack_snapshot  # noqa: E402
+
+
+class CommandCounter:
+    """Counts WebDriver commands by wrapping the driver's execute()."""
+
+    def __init__(self, driver):
+        self.count = 0
+        execute = driver.execute
+
+        def counting_execute(driver_command, params=None):
+            self.count += 1
+            return execute(driver_command, params)
+
+        driver.execute = counting_execute
+
+
+def browser_task_seconds(driver):
+    metrics = driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]
+    return next((metric["value"] for metric in metrics if metric["name"] == "TaskDuration"), 0.0)
+
+
+def slack_cases(count):
+    # Catch-up scenario: everything in the last 10% of the history is new
+    watermark = BASE_TS + int(count * 0.9)
+    return [
+        ("slack_extraction.take_slack_snapshot", lambda driver: take_slack_snapshot(driver)),
+        ("messaging_slack.detect_new_messages", lambda driver: messaging_slack.detect_new_messages(driver, watermark)),
+        ("messaging_slack.find_last_message_from_me", lambda driver: messaging_slack.find_last_message_from_me(driver)),
+        ("SlackClient.collect_messages_after", lambda driver: SlackClient(driver).collect_messages_after(watermark)),
+    ]
+
+
+def instagram_cases(count):
+    def collect_standalone(driver):
+        # Every poll starts from an empty dedup set so the full scan is measured
+        messaging_instagram.seen_messages.clear()
+        return messaging_instagram.collect_new_messages_instagram(driver)
+
+    return [
+        ("messaging_instagram.collect_new_messages_instagram", collect_standalone),
+        ("InstagramClient.collect_messages_after", lambda driver: InstagramClient(driver).collect_messages_after(0)),
+    ]
+
+
+def measure(driver, counter, fn, iterations):
+    wall, commands, python_cpu, browser_cpu = [], [], [], []
+    for _ in range(iterations):
+        browser_before = browser_task_seconds(driver)
+        commands_before = counter.count
+        cpu_before = time.process_time()
+        start = time.perf_counter()
+
+        fn(driver)
+
+        wall.append(time.perf_counter() - start)
+        python_cpu.append(time.process_time() - cpu_before)
+        commands.append(counter.count - commands_before)
+        browser_cpu.append(browser_task_seconds(driver) - browser_before)
+
+    return {
+        "polls": iterations,
+        "wall_ms_median": round(statistics.median(wall) * 1000, 3),
+        "wall_ms_max": round(max(wall) * 1000, 3),
+        "commands_per_poll": statistics.median(commands),
+        "python_cpu_ms_per_poll": round(statistics.median(python_cpu) * 1000, 3),
+        "browser_cpu_ms_per_poll": round(statistics.median(browser_cpu) * 1000, 3),
+    }
+
+
+def initialize_headless_chrome():
+    chrome_options = Options()
+    chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-gpu")
+    return webdriver.Chrome(options=chrome_options)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--output", default="dom_benchmark.json")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    paths = ensure_fixtures(args.sizes)
+
+    driver = initialize_headless_chrome()
+    driver.execute_cdp_cmd("Performance.enable", {})
+    counter = CommandCounter(driver)
+    results = []
+    try:
+        for count in args.sizes:
+            fixtures = [(f"slack_{variant}_{count}", slack_cases(count)) for variant in SLACK_VARIANTS]
+            fixtures.append((f"instagram_{count}", instagram_cases(count)))
+
+            for fixture_name, cases in fixtures:
+                driver.get(pathlib.Path(paths[fixture_name]).as_uri())
+                for case_name, fn in cases:
+                    result = {"fixture": fixture_name, "messages": count, "case": case_name}
+                    result.update(measure(driver, counter, fn, args.iterations))
+                    results.append(result)
+                    print(
+                        f"{fixture_name:<22} {case_name:<52} "
+                        f"{result['wall_ms_median']:>10.1f} ms {result['commands_per_poll']:>7} cmds"
+                    )
+    finally:
+        driver.quit()
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "iterations": args.iterations,
+            "results": results,
+        }, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Measures Socket.IO bytes and events per second for per-message 'newMessage'
+emits versus batched 'newMessages' emits, with the JSON and msgpack serializers.
+
+Runs a local stand-in for the backend's /messaging namespace and counts the
+encoded Socket.IO packet bytes it receives.
+
+Usage: python benchmarks/emit_throughput.py [--messages 2000] [--batch-size 25]
+"""
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import engineio.payload
+import socketio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_batcher import MessageBatcher  # noqa: E402
+
+USER_ID = "bench@easyspeak-aac.com"
+
+# The client coalesces queued packets into one long-polling request; allow
+# large bursts instead of the server's default of 16 packets per request.
+engineio.payload.Payload.max_decode_packets = 100000
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer:
+    """Local /messaging namespace that counts received events, messages and request bytes."""
+
+    def __init__(self, serializer):
+        self.sio = socketio.Server(async_mode="threading", serializer=serializer)
+        self.bytes_received = 0
+        self.events_received = 0
+        self.messages_received = 0
+        self.expected_messages = 0
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+        self.sio.on("newMessage", self._on_new_message, namespace="/messaging")
+        self.sio.on("newMessages", self._on_new_messages, namespace="/messaging")
+
+        # Count every encoded Socket.IO packet before it is decoded
+        handle_eio_message = self.sio._handle_eio_message
+
+        def counting_handler(eio_sid, data):
+            with self._lock:
+                self.bytes_received += len(data)
+            return handle_eio_message(eio_sid, data)
+
+        self.sio.eio.on("message", counting_handler)
+
+        app = socketio.WSGIApp(self.sio)
+        self.httpd = make_server("127.0.0.1", 0, app, ThreadingWSGIServer, QuietHandler)
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def reset(self, expected_messages):
+        with self._lock:
+            self.bytes_received = 0
+            self.events_received = 0
+            self.messages_received = 0
+            self.expected_messages = expected_messages
+            self.done.clear()
+
+    def _record(self, count):
+        with self._lock:
+            self.events_received += 1
+            self.messages_received += count
+            if self.messages_received >= self.expected_messages:
+                self.done.set()
+
+    def _on_new_message(self, sid, data):
+        self._record(1)
+
+    def _on_new_messages(self, sid, data):
+        self._record(len(data["messages"]))
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+def make_payloads(count):
+    return [
+        {
+            "content": f"Synthetic message number {i} with a little bit of text",
+            "timestamp": 1700000000000 + i,
+            "user_id": USER_ID,
+            "hashed_sender_name": f"{i % 5:064x}",
+        }
+        for i in range(count)
+    ]
+
+
+def run_case(server, serializer, payloads, batch_size):
+    client = socketio.Client(serializer=serializer)
+    client.connect(f"http://127.0.0.1:{server.port}", namespaces=["/messaging"], transports=["polling"])
+    server.reset(len(payloads))
+
+    start = time.perf_counter()
+    if batch_size <= 1:
+        for payload in payloads:
+            client.emit("newMessage", payload, namespace="/messaging")
+    else:
+        batcher = MessageBatcher(
+            lambda event, data: client.emit(event, data, namespace="/messaging"),
+            USER_ID, window=0, max_batch_size=batch_size,
+        )
+        for payload in payloads:
+            batcher.add(payload)
+        batcher.flush()
+    completed = server.done.wait(120)
+    elapsed = time.perf_counter() - start
+    client.disconnect()
+
+    return {
+        "serializer": serializer,
+        "batch_size": batch_size,
+        "completed": completed,
+        "seconds": round(elapsed, 4),
+        "events": server.events_received,
+        "bytes": server.bytes_received,
+        "bytes_per_message": round(server.bytes_received / len(payloads), 1),
+        "messages_per_second": round(len(payloads) / elapsed, 1),
+        "events_per_second": round(server.events_received / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--output", help="Optional path for the JSON results")
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.messages)
+    results = []
+    for serializer in ("default", "msgpack"):
+        server = StandInServer(serializer)
+        try:
+            for batch_size in (1, args.batch_size):
+                results.append(run_case(server, serializer, payloads, batch_size))
+        finally:
+            server.close()
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
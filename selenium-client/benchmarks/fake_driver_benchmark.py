@@ -0,0 +1,194 @@
+"""
+Browser-free microbenchmark for the scan code paths, run against the in-process
+FakeDriver. Reports poll cycles per second and WebDriver commands per poll for
+each scan function at several history sizes, optionally with an injected
+per-command latency (e.g. --latency-ms 2 to model chromedriver overhead).
+
+--load runs a short load test instead: messages arrive at --arrival-rate per
+second while SlackClient (or InstagramClient, with --platform instagram) polls
+as fast as it can, and the run checks that every arrival was detected exactly once.
+
+--contention measures how long a response send waits while another thread scans
+a large history through the shared DriverExecutor, for whole-history scans
+(chunk size 0) and chunked scans.
+
+Usage: python benchmarks/fake_driver_benchmark.py [--sizes 10 100 1000] [--cycles 200] [--latency-ms 0]
+       python benchmarks/fake_driver_benchmark.py --load [--platform slack] [--arrival-rate 200] [--duration 5]
+       python benchmarks/fake_driver_benchmark.py --contention [--history 2000] [--chunk-sizes 0 100] [--duration 5]
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import messaging_instagram  # noqa: E402
+import messaging_slack  # noqa: E402
+from driver_executor import serialize_driver  # noqa: E402
+from driver_tracing import Histogram  # noqa: E402
+from fast_send import SLACK_COMPOSER_SELECTORS, send_text  # noqa: E402
+from fake_webdriver import instagram_driver, slack_driver  # noqa: E402
+from fixtures import BASE_TS  # noqa: E402
+from instagram_client import InstagramClient  # noqa: E402
+from slack_client import SlackClient  # noqa: E402
+from slack_extraction import extract_slack_messages, take_slack_snapshot  # noqa: E402
+
+SEND_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5]
+
+
+def idle_detector(client_class, watermark):
+    """Polls one client repeatedly; after the first poll nothing changes, so only the fingerprint is read."""
+    clients = {}
+
+    def detect(driver):
+        if driver not in clients:
+            clients[driver] = client_class(driver)
+        return clients[driver].detect_new_messages(watermark)
+
+    return detect
+
+
+def slack_cases(count):
+    watermark = BASE_TS + int(count * 0.9)
+    return [
+        ("messaging_slack.detect_new_messages", lambda driver: messaging_slack.detect_new_messages(driver, watermark)),
+        ("messaging_slack.find_last_message_from_me", lambda driver: messaging_slack.find_last_message_from_me(driver)),
+        ("slack_extraction.take_slack_snapshot", lambda driver: take_slack_snapshot(driver)),
+        ("SlackClient.collect_messages_after", lambda driver: SlackClient(driver).collect_messages_after(watermark)),
+        ("SlackClient.detect_new_messages (idle)", idle_detector(SlackClient, watermark)),
+    ]
+
+
+def instagram_cases(count):
+    def collect_standalone(driver):
+        messaging_instagram.seen_messages.clear()
+        return messaging_instagram.collect_new_messages_instagram(driver)
+
+    return [
+        ("messaging_instagram.collect_new_messages_instagram", collect_standalone),
+        ("InstagramClient.collect_messages_after", lambda driver: InstagramClient(driver).collect_messages_after(0)),
+        ("InstagramClient.detect_new_messages (idle)", idle_detector(InstagramClient, 0)),
+    ]
+
+
+def run_cycles(driver, fn, cycles):
+    driver.reset_counts()
+    start = time.perf_counter()
+    for _ in range(cycles):
+        fn(driver)
+    elapsed = time.perf_counter() - start
+    return cycles / elapsed, driver.command_count / cycles
+
+
+def microbenchmark(args):
+    latency = args.latency_ms / 1000
+    print(f"{'fixture':<24} {'case':<52} {'polls/s':>10} {'cmds/poll':>10}")
+    for count in args.sizes:
+        fixtures = [
+            (f"slack_dm_{count}", slack_driver(count, "dm", command_latency=latency), slack_cases(count)),
+            (f"slack_thread_{count}", slack_driver(count, "thread", command_latency=latency), slack_cases(count)),
+            (f"instagram_{count}", instagram_driver(count, command_latency=latency), instagram_cases(count)),
+        ]
+        for fixture_name, driver, cases in fixtures:
+            for case_name, fn in cases:
+                polls_per_second, commands = run_cycles(driver, fn, args.cycles)
+                print(f"{fixture_name:<24} {case_name:<52} {polls_per_second:>10.1f} {commands:>10.1f}")
+
+
+def load_test(args):
+    if args.platform == "instagram":
+        driver = instagram_driver(100, command_latency=args.latency_ms / 1000)
+        client = InstagramClient(driver)
+    else:
+        driver = slack_driver(100, "channel", command_latency=args.latency_ms / 1000)
+        client = SlackClient(driver)
+    watermark = BASE_TS + 99  # Last message in the initial history
+    # Settle on the initial history before anything arrives
+    client.detect_new_messages(watermark)
+    driver.page.arrival_rate = args.arrival_rate
+    detected = []
+    polls = 0
+
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline:
+        for message in client.detect_new_messages(watermark):
+            detected.append(message['message_id'])
+            watermark = message['timestamp']
+        polls += 1
+
+    # Catch anything that arrived during the last poll
+    driver.page.arrival_rate = 0
+    for message in client.detect_new_messages(watermark):
+        detected.append(message['message_id'])
+
+    arrived = driver.page.arrived
+    duplicates = len(detected) - len(set(detected))
+    print(f"polls: {polls} ({polls / args.duration:.1f}/s), arrived: {arrived}, detected: {len(detected)}, duplicates: {duplicates}")
+    if len(set(detected)) != arrived or duplicates:
+        sys.exit(1)
+
+
+def contention_test(args):
+    print(f"{'chunk size':>10} {'scans/s':>10} {'sends':>7} {'send p50':>10} {'send p95':>10} {'send max':>10}")
+    for chunk_size in args.chunk_sizes:
+        driver = slack_driver(
+            args.history, "dm", command_latency=args.latency_ms / 1000, node_latency=args.node_latency_us / 1e6
+        )
+        serialize_driver(driver)
+        stop = threading.Event()
+        scans = []
+
+        def scan():
+            while not stop.is_set():
+                extract_slack_messages(driver, chunk_size=chunk_size)
+                scans.append(1)
+
+        scanner = threading.Thread(target=scan, daemon=True)
+        scanner.start()
+        send_seconds = Histogram(SEND_LATENCY_BUCKETS)
+        deadline = time.monotonic() + args.duration
+        while time.monotonic() < deadline:
+            time.sleep(args.send_interval)
+            started = time.perf_counter()
+            send_text(driver, SLACK_COMPOSER_SELECTORS, "ok")
+            send_seconds.record(time.perf_counter() - started)
+        stop.set()
+        scanner.join()
+        driver.driver_executor.shutdown()
+        print(
+            f"{chunk_size:>10} {len(scans) / args.duration:>10.1f} {send_seconds.count:>7} "
+            f"{send_seconds.percentile(0.5) * 1000:>8.0f}ms {send_seconds.percentile(0.95) * 1000:>8.0f}ms "
+            f"{send_seconds.max * 1000:>8.0f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--cycles", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Injected latency per WebDriver command")
+    parser.add_argument("--load", action="store_true", help="Run the arrival-rate load test instead")
+    parser.add_argument("--platform", choices=["slack", "instagram"], default="slack", help="Client to run --load against")
+    parser.add_argument("--arrival-rate", type=float, default=200.0, help="Messages per second during --load")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds to run --load or --contention for")
+    parser.add_argument("--contention", action="store_true", help="Measure send latency during concurrent scans instead")
+    parser.add_argument("--history", type=int, default=2000, help="Messages in the chat during --contention")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[0, 100], help="Scan chunk sizes to compare (0 = whole history)")
+    parser.add_argument("--node-latency-us", type=float, default=50.0, help="Injected in-page cost per extracted message node")
+    parser.add_argument("--send-interval", type=float, default=0.1, help="Seconds between sends during --contention")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.load:
+        load_test(args)
+    elif args.contention:
+        contention_test(args)
+    else:
+        microbenchmark(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,713 @@
+"""
+In-process stand-in for a Selenium WebDriver, for browser-free microbenchmarks
+and load tests.
+
+FakeDriver implements the subset of the WebDriver API the clients use
+(find_element(s), get_attribute, .text, is_displayed, click, send_keys,
+current_url and execute_script) over an in-memory DOM built from the same
+markup as the benchmark fixtures. execute_script runs Python equivalents of
+the repo's known scripts; unknown scripts raise JavascriptException.
+
+Every command goes through FakeDriver.execute(), like the real driver, so the
+command counters and any wrapper around execute() see the same traffic. An
+optional per-command latency models the chromedriver round trip, and pages
+can grow over time at a configurable arrival rate.
+"""
+import collections
+import html.parser
+import os
+import re
+import sys
+import time
+
+from selenium.common.exceptions import InvalidSelectorException, JavascriptException, NoSuchElementException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.remote.command import Command
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import BASE_TS, ME, SENDERS, instagram_fixture, instagram_row_html, slack_fixture, slack_message_html  # noqa: E402
+from change_detector import FINGERPRINT_SCRIPT  # noqa: E402
+from fast_send import FOCUS_COMPOSER_SCRIPT, WAIT_FOR_COMPOSER_TEXT_SCRIPT  # noqa: E402
+from instagram_extraction import ROWS_AFTER_SCRIPT  # noqa: E402
+from poll_scheduler import VISIBILITY_SCRIPT  # noqa: E402
+from slack_extraction import EXTRACT_MESSAGES_SCRIPT, PANE_FINGERPRINT_SCRIPT, SNAPSHOT_SCRIPT  # noqa: E402
+
+# Bumped on every DOM mutation; cached query results from older generations are discarded
+_generation = 0
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "wbr"}
+
+
+class FakeNode:
+    """An element in the in-memory DOM. Children are FakeNodes or text strings."""
+
+    __slots__ = ("tag", "attrs", "classes", "children", "parent", "hidden", "value", "matched", "queries")
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.classes = set(self.attrs.get("class", "").split())
+        self.children = []
+        self.parent = parent
+        self.hidden = False
+        self.value = ""  # Typed text for inputs and contenteditable editors
+        self.matched = {}  # Selector -> bool; nodes never move once inserted, so results stay valid
+        self.queries = {}  # Selector -> (generation, matching descendants)
+
+    def append(self, child):
+        self.insert(len(self.children), child)
+
+    def insert(self, index, child):
+        global _generation
+        if isinstance(child, FakeNode):
+            child.parent = self
+        self.children.insert(index, child)
+        _generation += 1
+
+    def remove(self, child):
+        global _generation
+        self.children.remove(child)
+        _generation += 1
+
+    def elements(self):
+        return [child for child in self.children if isinstance(child, FakeNode)]
+
+    def descendants(self):
+        stack = list(reversed(self.elements()))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.elements()))
+
+    def ancestors(self):
+        node = self.parent
+        while node is not None:
+            yield node
+            node = node.parent
+
+    def inner_text(self):
+        parts = []
+        for child in self.children:
+            parts.append(child if isinstance(child, str) else child.inner_text())
+        return "".join(parts) + self.value
+
+    def is_displayed(self):
+        if self.hidden or "display:none" in self.attrs.get("style", "").replace(" ", ""):
+            return False
+        return all(not ancestor.hidden for ancestor in self.ancestors())
+
+
+class _TreeBuilder(html.parser.HTMLParser):
+    def __init__(self, root):
+        super().__init__(convert_charrefs=True)
+        self.stack = [root]
+
+    def handle_starttag(self, tag, attrs):
+        node = FakeNode(tag, {name: value or "" for name, value in attrs})
+        self.stack[-1].append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.stack[-1].append(FakeNode(tag, {name: value or "" for name, value in attrs}))
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        if data.strip():
+            self.stack[-1].append(data)
+
+
+def parse_html(markup, root=None):
+    """Parses markup into `root` (a new document node by default) and returns it."""
+    root = root if root is not None else FakeNode("#document")
+    builder = _TreeBuilder(root)
+    builder.feed(markup)
+    builder.close()
+    return root
+
+
+# --- CSS selectors: descendant combinators over tag, .class and [attr], [attr=v], [attr^=v], [attr*=v] ---
+
+_COMPOUND_RE = re.compile(r"^([a-zA-Z][\w-]*|\*)?((?:\.[\w-]+|\[[^\]]+\])*)$")
+_PART_RE = re.compile(r"\.([\w-]+)|\[([\w-]+)(?:([\^*$]?=)\s*(['\"]?)(.*?)\4)?\]")
+_selector_cache = {}
+
+
+def _parse_compound(text):
+    match = _COMPOUND_RE.match(text)
+    if match is None:
+        raise InvalidSelectorException(f"Unsupported selector in fake driver: {text!r}")
+    tag = match.group(1) if match.group(1) not in (None, "*") else None
+    classes, attrs = [], []
+    for part in _PART_RE.finditer(match.group(2)):
+        if part.group(1):
+            classes.append(part.group(1))
+        else:
+            attrs.append((part.group(2), part.group(3), part.group(5)))
+    return tag, classes, attrs
+
+
+def parse_selector(selector):
+    if selector not in _selector_cache:
+        _selector_cache[selector] = [_parse_compound(part) for part in selector.split()]
+    return _selector_cache[selector]
+
+
+def _matches_compound(node, compound):
+    tag, classes, attrs = compound
+    if tag is not None and node.tag != tag:
+        return False
+    if classes and not node.classes.issuperset(classes):
+        return False
+    for name, op, expected in attrs:
+        actual = node.attrs.get(name)
+        if actual is None:
+            return False
+        if op == "=" and actual != expected:
+            return False
+        if op == "^=" and not actual.startswith(expected):
+            return False
+        if op == "*=" and expected not in actual:
+            return False
+        if op == "$=" and not actual.endswith(expected):
+            return False
+    return True
+
+
+def matches(node, selector):
+    result = node.matched.get(selector)
+    if result is not None:
+        return result
+    compounds = parse_selector(selector)
+    result = _matches_compound(node, compounds[-1])
+    if result:
+        remaining = len(compounds) - 2
+        for ancestor in node.ancestors():
+            if remaining < 0:
+                break
+            if _matches_compound(ancestor, compounds[remaining]):
+                remaining -= 1
+        result = remaining < 0
+    node.matched[selector] = result
+    return result
+
+
+def select_all(root, selector):
+    cached = root.queries.get(selector)
+    if cached is not None and cached[0] == _generation:
+        return cached[1]
+    result = [node for node in root.descendants() if matches(node, selector)]
+    root.queries[selector] = (_generation, result)
+    return result
+
+
+def select_one(root, selector):
+    result = select_all(root, selector)
+    return result[0] if result else None
+
+
+def closest(node, selector):
+    if matches(node, selector):
+        return node
+    return next((ancestor for ancestor in node.ancestors() if matches(ancestor, selector)), None)
+
+
+# --- XPath: only the expressions the clients use ---
+
+def _xpath_h5_span(root):
+    return [span for h5 in root.descendants() if h5.tag == "h5" for span in h5.elements() if span.tag == "span"]
+
+
+def _xpath_dir_auto(root):
+    return [node for node in root.descendants() if node.tag == "div" and node.attrs.get("dir") == "auto"]
+
+
+def _xpath_dir_auto_outside_h5(root):
+    return [node for node in _xpath_dir_auto(root) if closest(node, "h5") is None]
+
+
+def _xpath_message_textarea(root):
+    while root.parent is not None:
+        root = root.parent
+    return [node for node in root.descendants() if node.tag == "textarea" and "Message" in node.attrs.get("aria-label", "")]
+
+
+XPATH_QUERIES = {
+    './/h5/span': _xpath_h5_span,
+    './/div[@dir="auto"]': _xpath_dir_auto,
+    './/div[@dir="auto" and not(ancestor::h5)]': _xpath_dir_auto_outside_h5,
+    "//textarea[contains(@aria-label,'Message')]": _xpath_message_textarea,
+}
+
+
+def find_nodes(root, by, value):
+    if by == By.CSS_SELECTOR:
+        return select_all(root, value)
+    if by == By.XPATH:
+        query = XPATH_QUERIES.get(value)
+        if query is None:
+            raise InvalidSelectorException(f"Unsupported XPath in fake driver: {value!r}")
+        return query(root)
+    raise InvalidSelectorException(f"Unsupported locator strategy in fake driver: {by!r}")
+
+
+# --- execute_script: Python equivalents of the repo's scripts ---
+
+def _chunk(driver, nodes, start, count):
+    nodes = nodes[start:start + count] if count else nodes[start:]
+    if driver.node_latency:
+        # Serializing nodes is the in-page cost that grows with history
+        time.sleep(driver.node_latency * len(nodes))
+    return nodes
+
+
+def _after_ts(nodes, after_ts):
+    """Index of the first node after the last one with a data-ts at or before `after_ts`."""
+    first = len(nodes)
+    while first > 0:
+        timestamp_element = select_one(nodes[first - 1], "a.c-timestamp")
+        if timestamp_element is not None and float(timestamp_element.attrs.get("data-ts") or "nan") <= after_ts:
+            break
+        first -= 1
+    return first
+
+
+def _extract_messages(driver, selector, sender_selectors, start=0, count=None, after_ts=None):
+    records = []
+    nodes = select_all(driver.page.document, selector)
+    if start and start < 0:
+        start = max(0, len(nodes) + start)
+    if after_ts is not None:
+        start = (start or 0) + _after_ts(nodes, after_ts)
+    for node in _chunk(driver, nodes, start or 0, count):
+        timestamp_element = select_one(node, "a.c-timestamp")
+        sender = None
+        for sender_selector in sender_selectors:
+            sender_element = select_one(node, sender_selector)
+            if sender_element is not None:
+                sender = sender_element.inner_text()
+                break
+        blocks = select_one(node, "div.c-message_kit__blocks")
+        records.append({
+            'message_id': timestamp_element.attrs.get("data-ts") if timestamp_element is not None else None,
+            'sender_name': sender,
+            'content': blocks.inner_text() if blocks is not None else "",
+            'in_thread': closest(node, "div.c-virtual_list__item--thread") is not None,
+        })
+    return records
+
+
+def _snapshot(driver, selector, sender_selectors, start=0, count=None, after_ts=None):
+    main_content = select_one(driver.page.document, "div.p-view_contents.p-view_contents--primary")
+    label = main_content.attrs.get("aria-label", "") if main_content is not None else ""
+    thread_pane = select_one(driver.page.document, "div.p-threads_view")
+    return {
+        'url': driver.page.url,
+        'is_dm': "Conversation with" in label,
+        'thread_open': thread_pane is not None and thread_pane.is_displayed(),
+        'messages': _extract_messages(driver, selector, sender_selectors, start, count, after_ts),
+    }
+
+
+def _fingerprint(driver, selector, key_selector, key_attribute, pane_selector):
+    nodes = select_all(driver.page.document, selector)
+    last = nodes[-1] if nodes else None
+    key_element = select_one(last, key_selector) if last is not None and key_selector else last
+    key = ""
+    if key_element is not None:
+        key = (key_element.attrs.get(key_attribute) if key_attribute else key_element.inner_text()) or ""
+    pane = select_one(driver.page.document, pane_selector) if pane_selector else None
+    pane_text = pane.inner_text() if pane is not None and pane.is_displayed() else ""
+    return "|".join([driver.page.url, str(len(nodes)), str(hash(key)), str(hash(pane_text))])
+
+
+def _pane_fingerprint(driver, main_selector, thread_selector, thread_pane_selector):
+    def pane_fingerprint(selector):
+        nodes = select_all(driver.page.document, selector)
+        last = select_one(nodes[-1], "a.c-timestamp") if nodes else None
+        return f"{len(nodes)}|{hash(last.attrs.get('data-ts') or '' if last is not None else '')}"
+
+    thread_pane = select_one(driver.page.document, thread_pane_selector)
+    thread_open = thread_pane is not None and thread_pane.is_displayed()
+    return [
+        driver.page.url,
+        pane_fingerprint(main_selector),
+        f"{pane_fingerprint(thread_selector)}|{hash(thread_pane.inner_text())}" if thread_open else "",
+    ]
+
+
+def _extract_rows(driver, selector):
+    records = []
+    for row in select_all(driver.page.document, selector):
+        sender_element = select_one(row, "h5 span")
+        text_elements = _xpath_dir_auto_outside_h5(row)
+        records.append({
+            'sender_name': sender_element.inner_text() if sender_element is not None else None,
+            'content': text_elements[0].inner_text() if text_elements else "",
+        })
+    return records
+
+
+def _rows_after(driver, selector, anchor, chunk_start=0, count=None):
+    rows = [
+        {'sender_name': record['sender_name'], 'content': record['content'], 'timestamp': None}
+        for record in _extract_rows(driver, selector)
+    ]
+
+    def context(i):
+        current = rows[i]
+        repeats = 0
+        while i - repeats > 0 and (rows[i - repeats - 1]['sender_name'], rows[i - repeats - 1]['content']) == (
+            current['sender_name'], current['content']
+        ):
+            repeats += 1
+        previous = rows[i - repeats - 1] if i - repeats > 0 else {'sender_name': "", 'content': ""}
+        return (current['sender_name'], current['content'], previous['sender_name'], previous['content'], repeats)
+
+    keys = {}
+    groups = {}
+
+    def key(i):
+        if i not in keys:
+            start = i
+            while start > 0 and rows[start]['timestamp'] is None and start - 1 not in groups:
+                start -= 1
+            if start > 0 and rows[start]['timestamp'] is None:
+                group = groups[start - 1]
+            else:
+                group = {'next': start, 'time': rows[start]['timestamp'], 'occurrences': collections.Counter()}
+            while group['next'] <= i:
+                c = context(group['next'])
+                group['occurrences'][c] += 1
+                keys[group['next']] = format(hash((c, group['time'], group['occurrences'][c])) & 0xFFFFFFFF, "x")
+                groups[group['next']] = group
+                group['next'] += 1
+        return keys[i]
+
+    start = 0
+    found = False
+    if anchor:
+        for i in range(len(rows) - 1, -1, -1):
+            if key(i) == anchor:
+                start = i + 1
+                found = True
+                break
+    chunk_start = chunk_start or 0
+    start = max(start, len(rows) + chunk_start) if chunk_start < 0 else start + chunk_start
+    end = min(len(rows), start + count) if count else len(rows)
+    records = []
+    for i in range(start, end):
+        rows[i]['key'] = key(i)
+        records.append(rows[i])
+    if driver.node_latency:
+        # Serializing rows is the in-page cost that grows with history
+        time.sleep(driver.node_latency * len(records))
+    return {'url': driver.page.url, 'found': found, 'rows': records}
+
+
+def _visibility_state(driver):
+    return driver.page.visibility_state
+
+
+def _focus_composer(driver, selectors):
+    for i, selector in enumerate(selectors):
+        editor = select_one(driver.page.document, selector)
+        if editor is not None:
+            driver.active_element = editor
+            return i
+    return -1
+
+
+def _wait_for_composer_text(driver, selector, expected, timeout_ms):
+    # The fake DOM updates synchronously, so there is nothing to wait for
+    editor = select_one(driver.page.document, selector)
+    text = " ".join((editor.inner_text() if editor is not None else "").split())
+    expected = " ".join(expected.split())
+    return text == "" if expected == "" else expected in text
+
+
+SCRIPT_HANDLERS = {
+    EXTRACT_MESSAGES_SCRIPT: _extract_messages,
+    SNAPSHOT_SCRIPT: _snapshot,
+    FINGERPRINT_SCRIPT: _fingerprint,
+    PANE_FINGERPRINT_SCRIPT: _pane_fingerprint,
+    ROWS_AFTER_SCRIPT: _rows_after,
+    VISIBILITY_SCRIPT: _visibility_state,
+    FOCUS_COMPOSER_SCRIPT: _focus_composer,
+    WAIT_FOR_COMPOSER_TEXT_SCRIPT: _wait_for_composer_text,
+}
+
+# Scripts with no observable effect on the fake DOM
+IGNORED_SCRIPT_PREFIXES = ("arguments[0].dispatchEvent(",)
+
+
+def register_script(script, handler):
+    """Registers `handler(driver, *args)` as the fake implementation of `script`."""
+    SCRIPT_HANDLERS[script] = handler
+
+
+# --- Synthetic pages ---
+
+class FakePage:
+    """
+    A synthetic chat page. `arrival_rate` messages per second from other
+    senders are appended as wall-clock time passes (checked on every command);
+    arrive() adds messages immediately for deterministic runs.
+    """
+
+    def __init__(self, url, markup, arrival_rate=0.0):
+        self.url = url
+        self.document = parse_html(markup)
+        self.arrival_rate = arrival_rate
+        self.visibility_state = "visible"
+        self.arrived = 0
+        self.sent = []
+        self._last_tick = time.monotonic()
+        self._pending_arrivals = 0.0
+
+    def tick(self):
+        now = time.monotonic()
+        if self.arrival_rate:
+            self._pending_arrivals += (now - self._last_tick) * self.arrival_rate
+            count = int(self._pending_arrivals)
+            if count:
+                self._pending_arrivals -= count
+                self.arrive(count)
+        self._last_tick = now
+
+    def arrive(self, count=1):
+        for _ in range(count):
+            self.append_message(SENDERS[self.arrived % len(SENDERS)], None)
+            self.arrived += 1
+
+    def submit(self, editor):
+        """Called when Enter is pressed in a composer: posts its text as a message from 'me'."""
+        text = editor.value
+        editor.value = ""
+        if text:
+            self.sent.append(text)
+            self.append_message(self.me, text, editor)
+
+    def append_message(self, sender, text, editor=None):
+        raise NotImplementedError
+
+
+class SlackPage(FakePage):
+    me = ME
+
+    def __init__(self, messages=100, variant="dm", arrival_rate=0.0, url="https://app.slack.com/client/T0000000/C0000000"):
+        super().__init__(url, slack_fixture(messages, variant), arrival_rate)
+        self.next_index = messages
+        self.thread_pane = select_one(self.document, "div.p-threads_view")
+        self.main_pane = select_one(self.document, "div.p-view_contents.p-view_contents--primary")
+        self.last_sender = {}
+
+    def close_thread(self):
+        if self.thread_pane is not None:
+            self.thread_pane.hidden = True
+
+    def open_thread(self):
+        if self.thread_pane is not None:
+            self.thread_pane.hidden = False
+
+    def append_message(self, sender, text, editor=None):
+        # New messages land in the pane whose composer was used, else the open thread, else the main pane
+        in_thread = self.thread_pane is not None and not self.thread_pane.hidden
+        if editor is not None:
+            in_thread = closest(editor, "div.p-threads_view") is not None
+        pane = self.thread_pane if in_thread else self.main_pane
+        item_class = "c-virtual_list__item c-virtual_list__item--thread" if in_thread else "c-virtual_list__item"
+
+        i = self.next_index
+        self.next_index += 1
+        markup = (
+            f'<div class="{item_class}">'
+            f'{slack_message_html(i, BASE_TS + i, sender, self.last_sender.get(in_thread) != sender, text)}'
+            '</div>'
+        )
+        self.last_sender[in_thread] = sender
+
+        fragment = parse_html(markup)
+        item = fragment.elements()[0]
+        # Thread messages go before the thread footer, like Slack's layout
+        footer = select_one(pane, "div.p-threads_footer__input") if in_thread else None
+        if footer is not None:
+            pane.insert(pane.children.index(footer), item)
+        else:
+            pane.append(item)
+
+
+class InstagramPage(FakePage):
+    me = "You"
+
+    def __init__(self, messages=100, arrival_rate=0.0, url="https://www.instagram.com/direct/t/100000000000000/"):
+        super().__init__(url, instagram_fixture(messages), arrival_rate)
+        self.next_index = messages
+        self.grid = select_one(self.document, "div[role='grid']")
+
+    def append_message(self, sender, text, editor=None):
+        i = self.next_index
+        self.next_index += 1
+        self.grid.append(parse_html(instagram_row_html(i, sender, text)).elements()[0])
+
+
+# --- Driver and elements ---
+
+class FakeElement:
+    def __init__(self, driver, node):
+        self._driver = driver
+        self.node = node
+
+    def __eq__(self, other):
+        return isinstance(other, FakeElement) and other.node is self.node
+
+    def __hash__(self):
+        return id(self.node)
+
+    @property
+    def tag_name(self):
+        return self.node.tag
+
+    @property
+    def text(self):
+        return self._driver.run_command(
+            Command.GET_ELEMENT_TEXT,
+            lambda: self.node.inner_text().strip() if self.node.is_displayed() else "",
+        )
+
+    def get_attribute(self, name):
+        # Selenium implements this with a script atom
+        return self._driver.run_command(Command.W3C_EXECUTE_SCRIPT, lambda: self.node.attrs.get(name))
+
+    def is_displayed(self):
+        return self._driver.run_command(Command.W3C_EXECUTE_SCRIPT, self.node.is_displayed)
+
+    def click(self):
+        def click():
+            self._driver.active_element = self.node
+        self._driver.run_command(Command.CLICK_ELEMENT, click)
+
+    def clear(self):
+        def clear():
+            self.node.value = ""
+        self._driver.run_command(Command.CLEAR_ELEMENT, clear)
+
+    def send_keys(self, *values):
+        def send_keys():
+            for value in values:
+                for char in str(value):
+                    if char in (Keys.ENTER, Keys.RETURN):
+                        self._driver.page.submit(self.node)
+                    else:
+                        self.node.value += char
+        self._driver.run_command(Command.SEND_KEYS_TO_ELEMENT, send_keys)
+
+    def find_elements(self, by=By.ID, value=None):
+        nodes = self._driver.run_command(Command.FIND_CHILD_ELEMENTS, lambda: find_nodes(self.node, by, value))
+        return [FakeElement(self._driver, node) for node in nodes]
+
+    def find_element(self, by=By.ID, value=None):
+        nodes = self._driver.run_command(Command.FIND_CHILD_ELEMENT, lambda: find_nodes(self.node, by, value))
+        if not nodes:
+            raise NoSuchElementException(f"Unable to locate element: {value}")
+        return FakeElement(self._driver, nodes[0])
+
+
+class FakeDriver:
+    """
+    WebDriver stand-in over a FakePage. `command_latency` seconds are spent on
+    every command to model chromedriver overhead (0 for pure Python cost), and
+    `node_latency` seconds per node an extraction script serializes.
+    The DOM work of a command runs inside execute(), so anything wrapping
+    execute() (tracing, serialization) covers it like a real browser round trip.
+    """
+
+    def __init__(self, page, command_latency=0.0, node_latency=0.0):
+        self.page = page
+        self.command_latency = command_latency
+        self.node_latency = node_latency
+        self.command_count = 0
+        self.command_counts = collections.Counter()
+        self.active_element = None
+        self.current_window_handle = "FAKE-TARGET"
+
+    def execute(self, driver_command, params=None):
+        self.command_count += 1
+        self.command_counts[driver_command] += 1
+        if self.command_latency:
+            time.sleep(self.command_latency)
+        self.page.tick()
+        run = (params or {}).get('run')
+        return {'value': run() if run is not None else None}
+
+    def run_command(self, driver_command, run):
+        return self.execute(driver_command, {'run': run})['value']
+
+    def reset_counts(self):
+        self.command_count = 0
+        self.command_counts.clear()
+
+    @property
+    def current_url(self):
+        return self.run_command(Command.GET_CURRENT_URL, lambda: self.page.url)
+
+    def get(self, url):
+        def get():
+            self.page.url = url
+        self.run_command(Command.GET, get)
+
+    def find_elements(self, by=By.ID, value=None):
+        nodes = self.run_command(Command.FIND_ELEMENTS, lambda: find_nodes(self.page.document, by, value))
+        return [FakeElement(self, node) for node in nodes]
+
+    def find_element(self, by=By.ID, value=None):
+        nodes = self.run_command(Command.FIND_ELEMENT, lambda: find_nodes(self.page.document, by, value))
+        if not nodes:
+            raise NoSuchElementException(f"Unable to locate element: {value}")
+        return FakeElement(self, nodes[0])
+
+    def execute_script(self, script, *args):
+        return self.run_command(Command.W3C_EXECUTE_SCRIPT, lambda: self._run_script(script, args))
+
+    def execute_async_script(self, script, *args):
+        return self.run_command(Command.W3C_EXECUTE_SCRIPT_ASYNC, lambda: self._run_script(script, args))
+
+    def _run_script(self, script, args):
+        handler = SCRIPT_HANDLERS.get(script)
+        if handler is not None:
+            return handler(self, *args)
+        if script.startswith(IGNORED_SCRIPT_PREFIXES):
+            return None
+        raise JavascriptException(f"Fake driver has no handler for script: {script[:60]!r}")
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        """Supports the input commands used to send responses, acting on the focused element."""
+        def run():
+            if cmd == "Input.insertText":
+                if self.active_element is not None:
+                    self.active_element.value += cmd_args['text']
+            elif cmd == "Input.dispatchKeyEvent":
+                if cmd_args.get('type') == "keyDown" and cmd_args.get('key') == "Enter" and self.active_element is not None:
+                    self.page.submit(self.active_element)
+            else:
+                raise JavascriptException(f"Fake driver does not support CDP command {cmd}")
+            return {}
+        return self.run_command("executeCdpCommand", run)
+
+    def quit(self):
+        pass
+
+
+def slack_driver(messages=100, variant="dm", arrival_rate=0.0, command_latency=0.0, node_latency=0.0):
+    return FakeDriver(SlackPage(messages, variant, arrival_rate), command_latency, node_latency)
+
+
+def instagram_driver(messages=100, arrival_rate=0.0, command_latency=0.0, node_latency=0.0):
+    return FakeDriver(InstagramPage(messages, arrival_rate), command_latency, node_latency)
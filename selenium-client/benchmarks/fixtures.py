@@ -0,0 +1,129 @@
+"""
+Generates the offline HTML fixtures used by the benchmarks: Slack DM, channel
+and thread views and Instagram message rows, at several sizes. The markup
+mirrors the selectors the clients rely on. Output is deterministic, so files
+are regenerated only when missing.
+"""
+import html
+import os
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SIZES = [10, 100, 1000, 5000]
+SLACK_VARIANTS = ["dm", "channel", "thread"]
+
+BASE_TS = 1700000000.0
+ME_EVERY = 7  # Every 7th message is from 'me'
+SENDERS = ["Alex Rivera", "Sam Chen", "Jordan Lee"]
+ME = "Pearl Hulbert"
+
+
+def _message_text(i):
+    return f"Message {i}: the quick brown fox jumps over the lazy dog"
+
+
+def slack_message_html(i, ts, sender, first_in_group, text=None):
+    # Slack only renders the sender on the first message of a group; the rest
+    # carry an offscreen label, like the real DOM.
+    if first_in_group:
+        sender_html = f'<button class="c-message__sender_button">{html.escape(sender)}</button>'
+    else:
+        sender_html = f'<span class="offscreen" data-qa="aria-labelledby-{i}">{html.escape(sender)}</span>'
+    return (
+        '<div class="c-message_kit__background">'
+        f'{sender_html}'
+        f'<a class="c-timestamp" data-ts="{ts:.6f}" href="#"><span>{i}</span></a>'
+        f'<div class="c-message_kit__blocks"><div class="p-rich_text_section">{html.escape(text if text is not None else _message_text(i))}</div></div>'
+        '</div>'
+    )
+
+
+def _slack_messages(count, item_class):
+    items = []
+    previous_sender = None
+    for i in range(count):
+        sender = ME if i % ME_EVERY == ME_EVERY - 1 else SENDERS[(i // 3) % len(SENDERS)]
+        ts = BASE_TS + i
+        items.append(
+            f'<div class="{item_class}">{slack_message_html(i, ts, sender, sender != previous_sender)}</div>'
+        )
+        previous_sender = sender
+    return "\n".join(items)
+
+
+def slack_fixture(count, variant):
+    if variant == "dm":
+        label = "Conversation with Alex Rivera"
+    else:
+        label = "Channel general"
+
+    if variant == "thread":
+        # Main pane with a short history, plus an open thread holding `count` messages
+        main = _slack_messages(min(count, 20), "c-virtual_list__item")
+        thread = (
+            '<div class="p-threads_view">'
+            f'{_slack_messages(count, "c-virtual_list__item c-virtual_list__item--thread")}'
+            '<div class="p-threads_footer__input"><div data-qa="message_input">'
+            '<div class="ql-editor" contenteditable="true"></div></div></div>'
+            '</div>'
+        )
+    else:
+        main = _slack_messages(count, "c-virtual_list__item")
+        thread = ""
+
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Slack fixture</title></head><body>"
+        f'<div class="p-view_contents p-view_contents--primary" aria-label="{label}">{main}</div>'
+        f"{thread}"
+        '<div data-qa="message_input"><div class="ql-editor" contenteditable="true"></div></div>'
+        "</body></html>"
+    )
+
+
+def instagram_row_html(i, sender, text=None):
+    return (
+        '<div role="row">'
+        f'<h5><span>{html.escape(sender)}</span></h5>'
+        f'<div dir="auto">{html.escape(text if text is not None else _message_text(i))}</div>'
+        '</div>'
+    )
+
+
+def instagram_fixture(count):
+    rows = []
+    for i in range(count):
+        sender = "You" if i % ME_EVERY == ME_EVERY - 1 else SENDERS[(i // 3) % len(SENDERS)]
+        rows.append(instagram_row_html(i, sender))
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Instagram fixture</title></head><body>"
+        f'<div role="grid">{"".join(rows)}</div>'
+        '<textarea aria-label="Message..."></textarea>'
+        "</body></html>"
+    )
+
+
+def fixture_path(name):
+    return os.path.join(FIXTURES_DIR, f"{name}.html")
+
+
+def ensure_fixtures(sizes=SIZES):
+    """Writes any missing fixture files and returns {name: path}."""
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    fixtures = {}
+    for count in sizes:
+        for variant in SLACK_VARIANTS:
+            fixtures[f"slack_{variant}_{count}"] = (lambda c=count, v=variant: slack_fixture(c, v))
+        fixtures[f"instagram_{count}"] = (lambda c=count: instagram_fixture(c))
+
+    paths = {}
+    for name, build in fixtures.items():
+        path = fixture_path(name)
+        if not os.path.exists(path):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(build())
+        paths[name] = path
+    return paths
+
+
+if __name__ == "__main__":
+    for name, path in ensure_fixtures().items():
+        print(f"{name}: {path}")
@@ -0,0 +1,159 @@
+"""
+Delivery throughput of the outbound spool against a back end that takes
+--latency-ms to ack each event: one emit awaiting its ack at a time (window 1,
+like a blocking emit) versus a pipelined window, each message in its own
+emit, and the batched flush of a backlog spooled while the back end was
+unreachable, timed from the connect.
+
+Runs a local stand-in for the backend's /messaging namespace whose handlers
+sleep for the latency and then ack.
+
+Usage: python benchmarks/outbound_benchmark.py [--messages 500] [--latency-ms 20] [--windows 1 16] [--batch-size 50]
+"""
+import argparse
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import socketio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outbound_spool import OutboundDelivery, OutboundSpool, idempotency_key  # noqa: E402
+
+USER_ID = "bench@easyspeak-aac.com"
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class SlowBackend:
+    """Local /messaging namespace that acks each event after `latency` seconds and counts distinct messages."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.sio = socketio.Server(async_mode="threading")
+        self.keys = set()
+        self.events = 0
+        self.expected = 0
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+        self.sio.on("newMessage", self._on_new_message, namespace="/messaging")
+        self.sio.on("newMessages", self._on_new_messages, namespace="/messaging")
+        app = socketio.WSGIApp(self.sio)
+        self.httpd = make_server("127.0.0.1", 0, app, ThreadingWSGIServer, QuietHandler)
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def reset(self, expected):
+        with self._lock:
+            self.keys = set()
+            self.events = 0
+            self.expected = expected
+            self.done.clear()
+
+    def _record(self, messages):
+        time.sleep(self.latency)
+        with self._lock:
+            self.events += 1
+            self.keys.update(message["idempotency_key"] for message in messages)
+            if len(self.keys) >= self.expected:
+                self.done.set()
+        return True
+
+    def _on_new_message(self, sid, data):
+        return self._record([data])
+
+    def _on_new_messages(self, sid, data):
+        return self._record(data["messages"])
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+def spool_messages(delivery, count):
+    for i in range(count):
+        payload = {
+            "content": f"Synthetic message number {i}",
+            "timestamp": 1700000000.0 + i,
+            "user_id": USER_ID,
+            "hashed_sender_name": f"{i % 5:064x}",
+        }
+        delivery.send("newMessage", payload, idempotency_key("bench", f"{i}"), time.time())
+
+
+def run_case(backend, messages, window, batch_size, backlog):
+    """Delivers `messages` with the given window; with `backlog`, spools them all before connecting."""
+    client = socketio.Client()
+    path = os.path.join(tempfile.mkdtemp(), "outbound.db")
+    delivery = OutboundDelivery(
+        lambda event, data, callback: client.emit(event, data, namespace="/messaging", callback=callback),
+        lambda: client.connected,
+        USER_ID,
+        spool=OutboundSpool(path),
+        window=window,
+        require_ack=True,
+        bulk_batch_size=batch_size,
+    )
+    client.on("connect", delivery.connected, namespace="/messaging")
+    client.on("disconnect", delivery.disconnected, namespace="/messaging")
+    delivery.start()
+    backend.reset(messages)
+
+    if backlog:
+        spool_messages(delivery, messages)
+        start = time.perf_counter()
+        client.connect(f"http://127.0.0.1:{backend.port}", namespaces=["/messaging"], transports=["polling"])
+    else:
+        client.connect(f"http://127.0.0.1:{backend.port}", namespaces=["/messaging"], transports=["polling"])
+        start = time.perf_counter()
+        spool_messages(delivery, messages)
+    completed = backend.done.wait(300)
+    elapsed = time.perf_counter() - start
+
+    # Let the last acks reach the client before reading the spool
+    deadline = time.monotonic() + 5
+    while len(delivery.spool) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    left = len(delivery.spool)
+    delivery.stop()
+    client.disconnect()
+
+    label = f"window {window}, batch {batch_size}" + (" (backlog)" if backlog else "")
+    print(
+        f"{label:<30} {'ok' if completed else 'TIMEOUT':>7} {elapsed:>8.2f}s {messages / elapsed:>10.1f} msg/s"
+        f" {backend.events:>7} events {left:>5} left in spool"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--windows", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--batch-size", type=int, default=50, help="Messages per batch when flushing a backlog")
+    args = parser.parse_args()
+
+    backend = SlowBackend(args.latency_ms / 1000)
+    print(f"{args.messages} messages, {args.latency_ms} ms per ack")
+    try:
+        # Batch size 1: every message is its own emit, so only the window pipelines
+        for window in args.windows:
+            run_case(backend, args.messages, window, 1, backlog=False)
+        run_case(backend, args.messages, max(args.windows), args.batch_size, backlog=True)
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import itertools
+import json
+import logging
+import os
+import threading
+import urllib.request
+
+import websocket  # websocket-client, installed alongside selenium
+
+logger = logging.getLogger(__name__)
+
+# Same Chrome instance Selenium attaches to through debuggerAddress
+DEBUGGER_ADDRESS = os.getenv("CHROME_DEBUGGER_ADDRESS", "localhost:9222")
+COMMAND_TIMEOUT = 10  # Seconds to wait for a CDP command result
+
+
+class CDPError(Exception):
+    """Raised when a CDP command fails or times out."""
+
+
+class CDPSession:
+    """
+    Minimal Chrome DevTools Protocol client for a single target.
+
+    Selenium's execute_cdp_cmd can send commands but cannot receive events, so
+    this opens its own websocket to the target and dispatches events to
+    listeners registered with on().
+    """
+
+    def __init__(self, websocket_url):
+        self.websocket_url = websocket_url
+        self._ws = None
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._listeners = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._reader = None
+
+    @property
+    def connected(self):
+        return self._ws is not None and self._ws.connected
+
+    def connect(self):
+        # Chrome rejects websocket clients that send an unexpected Origin header
+        self._ws = websocket.create_connection(self.websocket_url, suppress_origin=True)
+        self._reader = threading.Thread(target=self._read_loop, name="cdp-reader", daemon=True)
+        self._reader.start()
+        logger.info(f"Connected to CDP target: {self.websocket_url}")
+        return self
+
+    def close(self):
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            except Exception:
+                pass
+        self._ws = None
+
+    def on(self, method, callback):
+        """Registers `callback(params)` for CDP events named `method`."""
+        with self._lock:
+            self._listeners.setdefault(method, []).append(callback)
+
+    def off(self, method, callback):
+        with self._lock:
+            callbacks = self._listeners.get(method, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def send(self, method, params=None, timeout=COMMAND_TIMEOUT):
+        """Sends a CDP command and blocks until its result arrives."""
+        if not self.connected:
+            raise CDPError(f"CDP session is not connected (sending {method}).")
+
+        command_id = next(self._ids)
+        done = threading.Event()
+        slot = {'event': done, 'response': None}
+        with self._lock:
+            self._pending[command_id] = slot
+
+        try:
+            with self._send_lock:
+                self._ws.send(json.dumps({'id': command_id, 'method': method, 'params': params or {}}))
+            if not done.wait(timeout):
+                raise CDPError(f"Timed out waiting for {method}.")
+        finally:
+            with self._lock:
+                self._pending.pop(command_id, None)
+
+        response = slot['response']
+        if 'error' in response:
+            raise CDPError(f"{method} failed: {response['error'].get('message')}")
+        return response.get('result', {})
+
+    def _read_loop(self):
+        while self.connected:
+            try:
+                raw = self._ws.recv()
+            except Exception:
+                if self._ws is not None:
+                    logger.warning("CDP websocket closed.")
+                break
+            if not raw:
+                continue
+
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                logger.warning("Ignoring malformed CDP message.")
+                continue
+
+            if 'id' in message:
+                with self._lock:
+                    slot = self._pending.get(message['id'])
+                if slot is not None:
+                    slot['response'] = message
+                    slot['event'].set()
+                continue
+
+            with self._lock:
+                callbacks = list(self._listeners.get(message.get('method'), []))
+            for callback in callbacks:
+                try:
+                    callback(message.get('params', {}))
+                except Exception:
+                    logger.exception(f"Error in CDP listener for {message.get('method')}.")
+
+        self._ws = None
+
+
+def list_targets(debugger_address=DEBUGGER_ADDRESS):
+    """Returns the targets exposed by Chrome's remote debugging endpoint."""
+    with urllib.request.urlopen(f"http://{debugger_address}/json/list", timeout=COMMAND_TIMEOUT) as response:
+        return json.load(response)
+
+
+def connect_to_target(target_id, debugger_address=DEBUGGER_ADDRESS):
+    """Opens a CDP session to the target with the given id."""
+    for target in list_targets(debugger_address):
+        if target.get('id') == target_id:
+            return CDPSession(target['webSocketDebuggerUrl']).connect()
+    raise CDPError(f"No CDP target with id {target_id}.")
+
+
+def connect_to_driver_page(driver, debugger_address=DEBUGGER_ADDRESS):
+    """
+    Opens a CDP session to the page Selenium is currently driving.
+    Chrome window handles are CDP target ids, so the match is exact.
+    """
+    return connect_to_target(driver.current_window_handle, debugger_address)
+
+
+def connect_to_browser(debugger_address=DEBUGGER_ADDRESS):
+    """Opens a browser-level CDP session (for Target.* commands)."""
+    with urllib.request.urlopen(f"http://{debugger_address}/json/version", timeout=COMMAND_TIMEOUT) as response:
+        version = json.load(response)
+    return CDPSession(version['webSocketDebuggerUrl']).connect()
+
+
+def evaluate_function(session, function_body, *args):
+    """
+    Runs a WebDriver-style script body (which reads its inputs from `arguments`)
+    in the session's page and returns its JSON result by value.
+    """
+    expression = f"(function() {{\n{function_body}\n}}).apply(null, {json.dumps(list(args))})"
+    result = session.send("Runtime.evaluate", {'expression': expression, 'returnByValue': True})
+    if 'exceptionDetails' in result:
+        raise CDPError(f"Script failed: {result['exceptionDetails'].get('text')}")
+    return result.get('result', {}).get('value')
@@ -0,0 +1,78 @@
+import logging
+import os
+
+from driver_tracing import PHASE_CONTEXT, traced
+
+logger = logging.getLogger(__name__)
+
+# Set to 0 to run a full extraction every poll cycle
+CHANGE_DETECTION = os.getenv("CHANGE_DETECTION", "1") != "0"
+
+# Returns a short string that changes whenever a message is added or removed,
+# the chat changes, or the (visible) side pane's content changes:
+#   url | message node count | hash of the last node's key | hash of the pane text
+# arguments: message selector, key element selector within a message (null for
+# the message itself), key attribute (null for its text), pane selector (or null).
+FINGERPRINT_SCRIPT = """
+function hash(text) {
+    var h = 0;
+    for (var i = 0; i < text.length; i++) {
+        h = (h * 31 + text.charCodeAt(i)) | 0;
+    }
+    return h;
+}
+var nodes = document.querySelectorAll(arguments[0]);
+var last = nodes.length ? nodes[nodes.length - 1] : null;
+var keyElement = last && arguments[1] ? last.querySelector(arguments[1]) : last;
+var key = '';
+if (keyElement) {
+    key = (arguments[2] ? keyElement.getAttribute(arguments[2]) : keyElement.textContent) || '';
+}
+var pane = arguments[3] ? document.querySelector(arguments[3]) : null;
+var paneText = pane && pane.getClientRects().length > 0 ? pane.textContent : '';
+return [window.location.href, nodes.length, hash(key), hash(paneText)].join('|');
+"""
+
+
+class ChangeDetector:
+    """
+    Skips extraction on polls where nothing changed: changed() reads a cheap
+    fingerprint of the chat in one execute_script call and compares it with
+    the one from the last processed cycle. Call mark_processed() once the
+    cycle's messages were handled; until then the same state counts as changed,
+    so a failed cycle is retried.
+    """
+
+    script = FINGERPRINT_SCRIPT
+
+    def __init__(self, message_selector, key_selector=None, key_attribute=None, pane_selector=None,
+                 enabled=CHANGE_DETECTION):
+        self.args = (message_selector, key_selector, key_attribute, pane_selector)
+        self.enabled = enabled
+        self.processed = None
+        self.pending = None
+        self.skipped_cycles = 0
+
+    @traced(PHASE_CONTEXT)
+    def changed(self, driver):
+        """True if the chat may have changed since the last processed cycle."""
+        if not self.enabled:
+            return True
+        try:
+            self.pending = driver.execute_script(self.script, *self.args)
+        except Exception:
+            logger.exception("Error reading the change fingerprint.")
+            self.pending = None
+            return True
+        if self.pending is not None and self.pending == self.processed:
+            self.skipped_cycles += 1
+            logger.debug("Chat unchanged since the last poll; skipping extraction.")
+            return False
+        return True
+
+    def mark_processed(self):
+        self.processed = self.pending
+
+    def reset(self):
+        """Forces the next changed() call to return True."""
+        self.processed = None
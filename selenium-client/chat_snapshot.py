@@ -0,0 +1,34 @@
+import base64
+import json
+import os
+import zlib
+
+CHAT_SNAPSHOT_SIZE = int(os.getenv("CHAT_SNAPSHOT_SIZE", "50"))  # Messages in the 'chatSnapshot' sent on a chat change; 0 disables it
+CHAT_SNAPSHOT_ENCODING = "zlib+base64"  # How the messages field of a 'chatSnapshot' is encoded
+
+
+def encode_messages(messages):
+    """Compact JSON of `messages`, zlib-compressed and base64-encoded so it travels as a string with any serializer."""
+    data = json.dumps(messages, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.b64encode(zlib.compress(data)).decode('ascii')
+
+
+def decode_messages(encoded):
+    """The inverse of encode_messages, as the back end would decode a 'chatSnapshot'."""
+    return json.loads(zlib.decompress(base64.b64decode(encoded)).decode('utf-8'))
+
+
+def build_chat_snapshot(user_id, chat_id, messages, is_dm=None):
+    """
+    Builds the 'chatSnapshot' event payload for a newly opened chat.
+    `messages` are its latest messages, oldest first, each a dict with
+    message_id, content, timestamp, hashed_sender_name and from_me.
+    """
+    return {
+        "user_id": user_id,
+        "chat_id": chat_id,
+        "is_dm": is_dm,
+        "count": len(messages),
+        "encoding": CHAT_SNAPSHOT_ENCODING,
+        "messages": encode_messages(messages),
+    }
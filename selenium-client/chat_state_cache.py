@@ -0,0 +1,105 @@
+import collections
+import logging
+import os
+import threading
+import time
+
+from watermark_store import MAIN_PANE
+
+logger = logging.getLogger(__name__)
+
+CHAT_STATE_CACHE_SIZE = int(os.getenv("CHAT_STATE_CACHE_SIZE", "32"))  # Chats kept warm; 0 disables the cache
+CHAT_STATE_TTL = float(os.getenv("CHAT_STATE_TTL", "1800"))  # Seconds a chat stays warm after it was last visited
+
+
+class ChatState:
+    """
+    What the client learned about one chat (keyed by get_current_chat_id()):
+    whether it is a DM, the processed-message watermark and the ts of the
+    last message from 'me' per pane (MAIN_PANE or a thread's parent ts), and
+    its participants as raw sender text -> (hashed_sender_name, from_me).
+    """
+
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.is_dm = None
+        self.watermarks = {}
+        self.last_from_me = {}
+        self.participants = {}
+        self.visited_at = time.monotonic()
+
+    @property
+    def watermark(self):
+        """The main pane's watermark, or None."""
+        return self.watermarks.get(MAIN_PANE)
+
+    def record_watermark(self, thread_id, ts):
+        if ts is not None and (self.watermarks.get(thread_id) is None or ts > self.watermarks[thread_id]):
+            self.watermarks[thread_id] = ts
+
+    def record_from_me(self, thread_id, ts):
+        if ts is not None and (self.last_from_me.get(thread_id) is None or ts > self.last_from_me[thread_id]):
+            self.last_from_me[thread_id] = ts
+
+
+class ChatStateCache:
+    """
+    LRU of ChatState per chat, so returning to a recently visited chat resumes
+    from what is already known instead of rediscovering it. Holds at most
+    `max_entries` chats; a chat not visited for `ttl` seconds is dropped.
+    """
+
+    def __init__(self, max_entries=CHAT_STATE_CACHE_SIZE, ttl=CHAT_STATE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+        self._states = collections.OrderedDict()  # chat_id -> ChatState, least recently visited first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._states)
+
+    def get(self, chat_id, now=None):
+        """Returns the warm state of a chat, or None if it is unknown or expired."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._expire(now)
+            state = self._states.get(chat_id)
+            if state is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            return state
+
+    def visit(self, chat_id, now=None):
+        """Returns the state of a chat to update, creating it if needed, and marks it as just visited."""
+        if not self.max_entries or chat_id is None:
+            return ChatState(chat_id)
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._expire(now)
+            state = self._states.get(chat_id)
+            if state is None:
+                state = ChatState(chat_id)
+                self._states[chat_id] = state
+                while len(self._states) > self.max_entries:
+                    evicted, _ = self._states.popitem(last=False)
+                    self.stats['evictions'] += 1
+                    logger.debug(f"Dropped cached state of chat {evicted}.")
+            else:
+                self._states.move_to_end(chat_id)
+            state.visited_at = now
+            return state
+
+    def _expire(self, now):
+        # Least recently visited chats are at the front
+        while self._states:
+            chat_id, state = next(iter(self._states.items()))
+            if now - state.visited_at < self.ttl:
+                return
+            del self._states[chat_id]
+            self.stats['expirations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
@@ -0,0 +1,216 @@
+import http.server
+import logging
+import os
+import threading
+import time
+
+from driver_tracing import Histogram
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # Prometheus text endpoint on /metrics; 0 disables it
+CLIENT_STATS_INTERVAL = float(os.getenv("CLIENT_STATS_INTERVAL", "60"))  # Seconds between 'clientStats' events; 0 disables them
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+CYCLE_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+MESSAGE_COUNT_BUCKETS = [0, 1, 2, 5, 10, 25, 50, 100]
+SEND_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+RECOVERY_BUCKETS = [0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+
+METRIC_PREFIX = "easyspeak_"
+
+COUNTER_HELP = {
+    'messages_detected_total': "Messages detected in the browser",
+    'messages_emitted_total': "Messages emitted on /messaging",
+    'emit_failures_total': "Messages whose emit raised",
+    'reconnects_total': "Socket.IO reconnections after the first connect",
+    'cycles_total': "Completed poll cycles",
+    'outbound_dead_letters_total': "Spooled messages given up on after OUTBOUND_MAX_ATTEMPTS emits",
+}
+
+HISTOGRAM_HELP = {
+    'relay_latency_seconds': ("Time from detection in the browser to emit on /messaging", LATENCY_BUCKETS),
+    'cycle_duration_seconds': ("Duration of a poll cycle", CYCLE_BUCKETS),
+    'messages_per_cycle': ("Messages detected per poll cycle", MESSAGE_COUNT_BUCKETS),
+    'response_send_seconds': ("Time from starting to send a selected response until the composer clears", SEND_BUCKETS),
+    'socket_recovery_seconds': ("Time from losing the /messaging connection until it was reconnected", RECOVERY_BUCKETS),
+    'browser_recovery_seconds': ("Time from losing the browser session until it was reattached", RECOVERY_BUCKETS),
+}
+
+
+class ClientMetrics:
+    """
+    Counters, gauges and fixed-bucket histograms for the relay, so memory
+    stays constant however long the client runs. Thread-safe: detection,
+    Socket.IO handlers and the reporters all touch it.
+    """
+
+    def __init__(self):
+        self.counters = {name: 0 for name in COUNTER_HELP}
+        self.histograms = {name: Histogram(bounds) for name, (_, bounds) in HISTOGRAM_HELP.items()}
+        self.gauges = {}
+        self.started_at = time.time()
+        self._connections = 0
+        self._lock = threading.Lock()
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def message_detected(self, count=1):
+        self.increment('messages_detected_total', count)
+
+    def message_emitted(self, detected_at=None):
+        """Records one emitted message and its relay latency; returns the emit time."""
+        emitted_at = time.time()
+        with self._lock:
+            self.counters['messages_emitted_total'] += 1
+            if detected_at is not None:
+                self.histograms['relay_latency_seconds'].record(max(0.0, emitted_at - detected_at))
+        return emitted_at
+
+    def emit_failed(self, count=1):
+        self.increment('emit_failures_total', count)
+
+    def connected(self):
+        """Called from the Socket.IO connect handler; every connect after the first is a reconnect."""
+        with self._lock:
+            self._connections += 1
+            if self._connections > 1:
+                self.counters['reconnects_total'] += 1
+
+    def recovered(self, component, duration):
+        """Records the time to recover the 'socket' or 'browser' connection."""
+        with self._lock:
+            self.histograms[f'{component}_recovery_seconds'].record(duration)
+
+    def response_sent(self, duration):
+        with self._lock:
+            self.histograms['response_send_seconds'].record(duration)
+
+    def cycle_done(self, duration, message_count):
+        with self._lock:
+            self.counters['cycles_total'] += 1
+            self.histograms['cycle_duration_seconds'].record(duration)
+            self.histograms['messages_per_cycle'].record(message_count)
+
+    def snapshot(self):
+        """Plain-dict summary, sent as the 'clientStats' payload."""
+        with self._lock:
+            return {
+                'uptime_seconds': round(time.time() - self.started_at, 1),
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'histograms': {
+                    name: {
+                        'count': histogram.count,
+                        'mean': round(histogram.mean, 4),
+                        'p50': histogram.percentile(0.5),
+                        'p95': histogram.percentile(0.95),
+                        'max': round(histogram.max, 4),
+                    }
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+    def render_prometheus(self):
+        """Renders everything in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = METRIC_PREFIX + name
+                lines.append(f"# HELP {metric} {COUNTER_HELP.get(name, name)}")
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value}")
+            for name, value in sorted(self.gauges.items()):
+                metric = METRIC_PREFIX + name
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+            for name, histogram in sorted(self.histograms.items()):
+                metric = METRIC_PREFIX + name
+                lines.append(f"# HELP {metric} {HISTOGRAM_HELP[name][0]}")
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"{metric}_sum {histogram.total}")
+                lines.append(f"{metric}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide metrics
+metrics = ClientMetrics()
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serves /metrics on a daemon thread. Returns the server, or None if port is 0."""
+    if not port:
+        return None
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+class StatsReporter:
+    """Emits metrics.snapshot() as a 'clientStats' event every `interval` seconds while connected."""
+
+    def __init__(self, emit, is_connected, user_id, interval=CLIENT_STATS_INTERVAL):
+        self.emit = emit
+        self.is_connected = is_connected
+        self.user_id = user_id
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name="client-stats", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.is_connected():
+                continue
+            try:
+                payload = metrics.snapshot()
+                payload['user_id'] = self.user_id
+                self.emit("clientStats", payload)
+            except Exception as e:
+                logger.exception("Failed to emit 'clientStats'.")
+
+
+def start_reporting(sio, user_id, namespace="/messaging"):
+    """Starts the metrics endpoint and the 'clientStats' reporter for a threaded Socket.IO client, as configured."""
+    start_metrics_server()
+    if CLIENT_STATS_INTERVAL > 0:
+        StatsReporter(
+            lambda event, data: sio.emit(event, data, namespace=namespace),
+            lambda: sio.connected,
+            user_id,
+        ).start()
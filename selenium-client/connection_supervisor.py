@@ -0,0 +1,163 @@
+import logging
+import os
+import random
+import threading
+import time
+
+from client_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_BASE_DELAY = float(os.getenv("RECONNECT_BASE_DELAY", "0.5"))  # Seconds before the first retry
+RECONNECT_MAX_DELAY = float(os.getenv("RECONNECT_MAX_DELAY", "30"))  # Upper bound on the delay between retries
+BROWSER_CHECK_INTERVAL = float(os.getenv("BROWSER_CHECK_INTERVAL", "10"))  # Seconds between browser liveness probes
+SOCKET_CHECK_INTERVAL = 0.25  # Seconds between connection checks while connected
+
+
+def backoff_delays(base_delay=RECONNECT_BASE_DELAY, max_delay=RECONNECT_MAX_DELAY):
+    """
+    Endless exponential backoff with jitter: retry n waits between half and
+    all of min(max_delay, base_delay * 2**n), so clients that lost the same
+    server don't retry in lockstep.
+    """
+    attempt = 0
+    while True:
+        ceiling = min(max_delay, base_delay * 2 ** attempt)
+        yield random.uniform(ceiling / 2, ceiling)
+        attempt += 1
+
+
+class SocketSupervisor:
+    """
+    Keeps a threaded Socket.IO client connected: connects in the background,
+    retrying with jittered exponential backoff, and reconnects as soon as the
+    connection drops. The client should be created with reconnection=False
+    so the supervisor is the only one reconnecting. Call connected() and
+    disconnected() from the client's handlers; the time from a drop to the
+    next connect is recorded as socket_recovery_seconds.
+    """
+
+    def __init__(self, sio, url, namespaces=("/messaging",), base_delay=RECONNECT_BASE_DELAY,
+                 max_delay=RECONNECT_MAX_DELAY):
+        self.sio = sio
+        self.url = url
+        self.namespaces = list(namespaces)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._outage_started = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name="socket-supervisor", daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stops reconnecting, e.g. before a deliberate disconnect on shutdown."""
+        self._stop.set()
+        self._wake.set()
+
+    def connected(self):
+        if self._outage_started is not None:
+            duration = time.monotonic() - self._outage_started
+            self._outage_started = None
+            metrics.recovered('socket', duration)
+            logger.info(f"Reconnected to {self.url} after {duration:.2f}s.")
+
+    def disconnected(self):
+        if not self._stop.is_set() and self._outage_started is None:
+            self._outage_started = time.monotonic()
+        self._wake.set()
+
+    def _run(self):
+        delays = None
+        while not self._stop.is_set():
+            if self.sio.connected or self.sio.eio.state != 'disconnected':
+                # Connected, or the dropped transport is still shutting down
+                if self.sio.connected:
+                    delays = None
+                self._wake.wait(SOCKET_CHECK_INTERVAL)
+                self._wake.clear()
+                continue
+            try:
+                self.sio.connect(self.url, namespaces=self.namespaces)
+                logger.info(f"Connected to WebSocket server: {self.url}")
+            except Exception as e:
+                if delays is None:
+                    delays = backoff_delays(self.base_delay, self.max_delay)
+                delay = next(delays)
+                logger.warning(f"Connecting to {self.url} failed ({e}); retrying in {delay:.1f}s.")
+                self._stop.wait(delay)
+
+
+class BrowserSupervisor:
+    """
+    Reattaches to Chrome's debugger session when the browser (or chromedriver)
+    went away. ensure() probes the session at most every `check_interval`
+    seconds with one trivial script; when the probe fails, `initialize` (the
+    caller's initialize_selenium) is retried with jittered exponential backoff
+    until it returns a working driver. The outage is recorded as
+    browser_recovery_seconds.
+    """
+
+    def __init__(self, initialize, check_interval=BROWSER_CHECK_INTERVAL, base_delay=RECONNECT_BASE_DELAY,
+                 max_delay=RECONNECT_MAX_DELAY):
+        self.initialize = initialize
+        self.check_interval = check_interval
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._last_check = time.monotonic()
+
+    def alive(self, driver):
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def ensure(self, driver, force=False):
+        """
+        Returns `driver` if it still works, or a newly attached one. Only probes
+        when `check_interval` has passed, unless `force` (e.g. after an error).
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return driver
+        self._last_check = now
+        if self.alive(driver):
+            return driver
+        return self.reattach(driver)
+
+    def reattach(self, driver):
+        started = time.monotonic()
+        logger.warning("Lost the browser session; reattaching to the debugger.")
+        release_driver(driver)
+        for delay in backoff_delays(self.base_delay, self.max_delay):
+            try:
+                new_driver = self.initialize()
+                if self.alive(new_driver):
+                    duration = time.monotonic() - started
+                    metrics.recovered('browser', duration)
+                    logger.info(f"Reattached to the browser after {duration:.2f}s.")
+                    self._last_check = time.monotonic()
+                    return new_driver
+                release_driver(new_driver)
+            except Exception as e:
+                logger.warning(f"Reattaching to the browser failed ({e}); retrying in {delay:.1f}s.")
+            time.sleep(delay)
+
+
+def release_driver(driver):
+    """
+    Lets go of a dead session without quitting the browser: stops the
+    command thread and the chromedriver process this client started.
+    """
+    executor = getattr(driver, 'driver_executor', None)
+    if executor is not None:
+        executor.shutdown()
+    service = getattr(driver, 'service', None)
+    try:
+        if service is not None:
+            service.stop()
+    except Exception:
+        logger.debug("Stopping chromedriver failed.", exc_info=True)
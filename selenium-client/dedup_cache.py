@@ -0,0 +1,112 @@
+import collections
+import hashlib
+import math
+import os
+import threading
+import time
+
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "10000"))  # Exact entries kept across all chats
+DEDUP_TTL = float(os.getenv("DEDUP_TTL", str(24 * 3600)))  # Seconds an entry is remembered after it was last seen
+DEDUP_BLOOM_CAPACITY = int(os.getenv("DEDUP_BLOOM_CAPACITY", "0"))  # Entries pushed out of the LRU kept in a bloom filter; 0 disables it
+BLOOM_FALSE_POSITIVE_RATE = 0.001
+
+
+class BloomFilter:
+    """
+    Fixed-size bloom filter for `capacity` keys at `false_positive_rate`.
+    Once more than `capacity` keys were added it starts over, so its memory
+    and false-positive rate stay bounded.
+    """
+
+    def __init__(self, capacity, false_positive_rate=BLOOM_FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        if self.count >= self.capacity:
+            self.clear()
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def clear(self):
+        self.bits = bytearray(len(self.bits))
+        self.count = 0
+
+
+class DedupCache:
+    """
+    Remembers which messages were already relayed, per chat, in bounded memory.
+
+    Entries live in an LRU of at most `max_entries` (chat_id, key) pairs and
+    expire `ttl` seconds after they were last seen. With a bloom capacity,
+    entries pushed out of the LRU by size are kept in a bloom filter, so older
+    history is still recognized at the cost of rare false positives. Expired
+    entries are forgotten entirely.
+    """
+
+    def __init__(self, max_entries=DEDUP_MAX_ENTRIES, ttl=DEDUP_TTL, bloom_capacity=DEDUP_BLOOM_CAPACITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bloom = BloomFilter(bloom_capacity) if bloom_capacity else None
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'bloom_hits': 0}
+        self._entries = collections.OrderedDict()  # (chat_id, key) -> last seen, least recently seen first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def seen(self, chat_id, key, now=None):
+        """
+        Records (chat_id, key) as seen. Returns True if it already was, i.e. the
+        message is a duplicate.
+        """
+        now = time.monotonic() if now is None else now
+        entry = (chat_id, key)
+        with self._lock:
+            self._expire(now)
+            if entry in self._entries:
+                self._entries[entry] = now
+                self._entries.move_to_end(entry)
+                self.stats['hits'] += 1
+                return True
+
+            self._entries[entry] = now
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+                if self.bloom is not None:
+                    self.bloom.add(evicted)
+
+            if self.bloom is not None and entry in self.bloom:
+                self.stats['bloom_hits'] += 1
+                return True
+            self.stats['misses'] += 1
+            return False
+
+    def _expire(self, now):
+        # Least recently seen entries are at the front
+        while self._entries:
+            entry, last_seen = next(iter(self._entries.items()))
+            if now - last_seen < self.ttl:
+                return
+            del self._entries[entry]
+            self.stats['expirations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.bloom is not None:
+                self.bloom.clear()
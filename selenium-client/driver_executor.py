@@ -0,0 +1,115 @@
+import concurrent.futures
+import contextlib
+import itertools
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first
+PRIORITY_SEND = 0
+PRIORITY_SCAN = 10
+
+# Messages extracted per script call; a send waits for at most one chunk. 0 extracts everything in one call.
+SCAN_CHUNK_SIZE = int(os.getenv("SCAN_CHUNK_SIZE", "100"))
+
+_local = threading.local()
+
+
+def current_priority():
+    return getattr(_local, 'priority', PRIORITY_SCAN)
+
+
+@contextlib.contextmanager
+def priority(level):
+    """Runs WebDriver commands issued by this thread inside the block at `level`."""
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+class DriverExecutor:
+    """
+    Owns a WebDriver session: every command runs on one thread, taken from a
+    priority queue (FIFO within a priority).
+
+    install() routes the driver's execute(), which all commands (including
+    element commands) go through, via the queue, so callers on any thread are
+    serialized. A command issued inside priority(PRIORITY_SEND) jumps ahead
+    of queued scan commands; since scans are extracted in chunks (see
+    SCAN_CHUNK_SIZE), a send waits for at most the chunk in flight.
+    """
+
+    def __init__(self, name="webdriver"):
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, priority=None):
+        """Queues fn(*args) to run on the owner thread and returns a Future."""
+        if self._closed:
+            raise RuntimeError("DriverExecutor is shut down")
+        future = concurrent.futures.Future()
+        level = current_priority() if priority is None else priority
+        self._queue.put((level, next(self._sequence), fn, args, future))
+        return future
+
+    def call(self, fn, *args, priority=None):
+        """Runs fn(*args) on the owner thread and waits for its result."""
+        if threading.current_thread() is self._thread:
+            return fn(*args)
+        return self.submit(fn, *args, priority=priority).result()
+
+    def shutdown(self):
+        """Stops the owner thread; queued commands fail instead of waiting forever."""
+        self._closed = True
+        self._queue.put((float('-inf'), next(self._sequence), None, (), None))
+
+    def install(self, driver):
+        execute = driver.execute
+
+        def serialized_execute(driver_command, params=None):
+            return self.call(execute, driver_command, params)
+
+        driver.execute = serialized_execute
+        driver.driver_executor = self
+        return driver
+
+    def _run(self):
+        while True:
+            _, _, fn, args, future = self._queue.get()
+            if fn is None:
+                self._fail_queued()
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def _fail_queued(self):
+        while True:
+            try:
+                _, _, _, _, future = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if future is not None and future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("DriverExecutor is shut down"))
+
+
+def serialize_driver(driver):
+    """Installs a DriverExecutor on `driver` unless it already has one; returns the executor."""
+    executor = getattr(driver, 'driver_executor', None)
+    if executor is None:
+        executor = DriverExecutor()
+        executor.install(driver)
+        logger.info("WebDriver commands are serialized on a dedicated thread.")
+    return executor
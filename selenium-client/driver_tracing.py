@@ -0,0 +1,252 @@
+import contextlib
+import functools
+import logging
+import os
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+WEBDRIVER_TRACE = os.getenv("WEBDRIVER_TRACE", "0") == "1"  # Opt-in: wrap the driver with a DriverTracer
+TRACE_SUMMARY_INTERVAL = float(os.getenv("WEBDRIVER_TRACE_SUMMARY_INTERVAL", "60"))  # Seconds between summary log lines
+
+# Phases a WebDriver command can be attributed to
+PHASE_CHAT_ID = "chat_id"
+PHASE_CONTEXT = "context"  # DM/channel, open thread, thread parent
+PHASE_EXTRACTION = "extraction"
+PHASE_SENDING = "sending"
+PHASE_EMIT = "emit"  # Socket.IO emits; no WebDriver commands, only time
+PHASE_SCHEDULING = "scheduling"  # Tab visibility checks between cycles
+PHASE_OTHER = "other"
+
+# Upper bounds of the histogram buckets; the last bucket is open-ended
+MS_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+COUNT_BUCKETS = [0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+
+class Histogram:
+    """Fixed-bucket histogram: constant memory however many samples are recorded."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        index = len(self.bounds)
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples (max for the open bucket)."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def describe(self, unit=""):
+        return (
+            f"mean={self.mean:.1f}{unit} p50<={self.percentile(0.5):g}{unit} "
+            f"p95<={self.percentile(0.95):g}{unit} max={self.max:.1f}{unit}"
+        )
+
+
+class DriverTracer:
+    """
+    Counts and times every WebDriver command by wrapping the driver's
+    execute(), which every command (including element commands) goes through.
+
+    Commands are attributed to the innermost active phase on the calling
+    thread (see phase()); time spent inside a phase with no commands, such as
+    emits, is recorded too. end_cycle() folds the current cycle into per-phase
+    histograms and logs a summary line every `summary_interval` seconds.
+    """
+
+    def __init__(self, driver, summary_interval=TRACE_SUMMARY_INTERVAL):
+        self.driver = driver
+        self.summary_interval = summary_interval
+        self.commands = {}  # (phase, command) -> [count, total seconds, max seconds]
+        self.cycles = 0
+        self.cycle_ms = Histogram(MS_BUCKETS)
+        self.cycle_commands = Histogram(COUNT_BUCKETS)
+        self.phase_ms = {}
+        self.phase_commands = {}
+        self._cycle = {}  # phase -> [commands, seconds] for the cycle in progress
+        self._cycle_started = time.monotonic()
+        self._last_summary = time.monotonic()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        execute = driver.execute
+
+        def traced_execute(driver_command, params=None):
+            start = time.perf_counter()
+            try:
+                return execute(driver_command, params)
+            finally:
+                self._record_command(driver_command, time.perf_counter() - start)
+
+        driver.execute = traced_execute
+        self._original_execute = execute
+
+    def uninstall(self):
+        self.driver.execute = self._original_execute
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current_phase(self):
+        stack = self._stack()
+        return stack[-1][0] if stack else PHASE_OTHER
+
+    def _record_command(self, driver_command, seconds):
+        phase = self.current_phase()
+        with self._lock:
+            stats = self.commands.setdefault((phase, driver_command), [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            self._cycle.setdefault(phase, [0, 0.0])[0] += 1
+            if phase == PHASE_OTHER:
+                # Phase time is tracked by phase(); untagged commands only have their own
+                self._cycle[phase][1] += seconds
+
+    def _record_phase_time(self, phase, seconds):
+        with self._lock:
+            self._cycle.setdefault(phase, [0, 0.0])[1] += seconds
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Attributes commands issued inside the block to `name`; nested phases take precedence."""
+        stack = self._stack()
+        now = time.perf_counter()
+        if stack:
+            # Pause the enclosing phase so time is exclusive
+            self._record_phase_time(stack[-1][0], now - stack[-1][1])
+        stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._record_phase_time(name, now - stack.pop()[1])
+            if stack:
+                stack[-1][1] = now
+
+    def end_cycle(self):
+        """Closes the current poll cycle and logs a summary if one is due."""
+        now = time.monotonic()
+        with self._lock:
+            cycle, self._cycle = self._cycle, {}
+            self.cycles += 1
+            self.cycle_ms.record((now - self._cycle_started) * 1000)
+            self.cycle_commands.record(sum(commands for commands, _ in cycle.values()))
+            for phase, (commands, seconds) in cycle.items():
+                self.phase_commands.setdefault(phase, Histogram(COUNT_BUCKETS)).record(commands)
+                self.phase_ms.setdefault(phase, Histogram(MS_BUCKETS)).record(seconds * 1000)
+            self._cycle_started = now
+
+        if self.summary_interval and now - self._last_summary >= self.summary_interval:
+            self._last_summary = now
+            logger.info(self.summary())
+
+    def summary(self):
+        """One-line summary: cycle cost, then mean commands and time per cycle for each phase."""
+        with self._lock:
+            phases = " ".join(
+                f"{phase}={self.phase_commands[phase].mean:.1f}cmd/{self.phase_ms[phase].mean:.1f}ms"
+                for phase in sorted(self.phase_ms)
+            )
+            return (
+                f"WebDriver trace: cycles={self.cycles} cycle[{self.cycle_ms.describe('ms')}] "
+                f"commands/cycle[{self.cycle_commands.describe()}] {phases}"
+            )
+
+    def report(self):
+        """Multi-line report with per-phase histograms and per-command timings."""
+        with self._lock:
+            lines = [
+                f"WebDriver trace after {self.cycles} cycles",
+                f"  cycle time: {self.cycle_ms.describe('ms')}",
+                f"  commands per cycle: {self.cycle_commands.describe()}",
+            ]
+            for phase in sorted(self.phase_ms):
+                lines.append(
+                    f"  {phase}: time/cycle {self.phase_ms[phase].describe('ms')}; "
+                    f"commands/cycle {self.phase_commands[phase].describe()}"
+                )
+            for (phase, command), (count, total, longest) in sorted(self.commands.items(), key=lambda item: -item[1][1]):
+                lines.append(
+                    f"    {phase:<12} {command:<28} count={count} mean={total / count * 1000:.2f}ms "
+                    f"max={longest * 1000:.2f}ms total={total:.2f}s"
+                )
+            return "\n".join(lines)
+
+    def dump(self, *args):
+        logger.info(self.report())
+
+
+# The tracer for this process's driver, if tracing is enabled
+tracer = None
+
+
+def enable_tracing(driver, summary_interval=TRACE_SUMMARY_INTERVAL):
+    """Wraps `driver` with a DriverTracer and dumps its report on SIGUSR1."""
+    global tracer
+    tracer = DriverTracer(driver, summary_interval)
+    if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, tracer.dump)
+    logger.info("WebDriver command tracing enabled (send SIGUSR1 for a full report).")
+    return tracer
+
+
+def trace_if_enabled(driver):
+    """Enables tracing when WEBDRIVER_TRACE=1; returns the driver either way."""
+    if WEBDRIVER_TRACE:
+        enable_tracing(driver)
+    return driver
+
+
+def phase(name):
+    """Context manager tagging WebDriver commands with a phase; a no-op when tracing is off."""
+    if tracer is None:
+        return contextlib.nullcontext()
+    return tracer.phase(name)
+
+
+def traced(name):
+    """Decorator running the function inside phase(name)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if tracer is None:
+                return fn(*args, **kwargs)
+            with tracer.phase(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def end_cycle():
+    if tracer is not None:
+        tracer.end_cycle()
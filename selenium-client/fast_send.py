@@ -0,0 +1,118 @@
+import logging
+import time
+
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+
+from client_metrics import metrics
+from driver_executor import PRIORITY_SEND, priority
+
+logger = logging.getLogger(__name__)
+
+SEND_TIMEOUT = 5  # Seconds to wait for the editor to accept the text, and again for it to clear after Enter
+
+# Composer selectors, tried in order: an open thread's input first, then the main input
+SLACK_COMPOSER_SELECTORS = [
+    'div.p-threads_footer__input div[data-qa="message_input"] div.ql-editor',
+    'div[data-qa="message_input"] div.ql-editor',
+]
+INSTAGRAM_COMPOSER_SELECTORS = ["textarea[aria-label*='Message']"]
+
+# Focuses the first composer that exists and puts the caret at the end of it.
+# Returns the index of the selector that matched, or -1.
+FOCUS_COMPOSER_SCRIPT = """
+var selectors = arguments[0];
+for (var i = 0; i < selectors.length; i++) {
+    var editor = document.querySelector(selectors[i]);
+    if (!editor) {
+        continue;
+    }
+    editor.focus();
+    if (editor.isContentEditable) {
+        var range = document.createRange();
+        range.selectNodeContents(editor);
+        range.collapse(false);
+        var selection = window.getSelection();
+        selection.removeAllRanges();
+        selection.addRange(range);
+    }
+    return i;
+}
+return -1;
+"""
+
+# Async: resolves true as soon as the composer contains the expected text (or is
+# empty, when expected is ''), false once the timeout passes. Whitespace is
+# normalized because editors rewrite it.
+WAIT_FOR_COMPOSER_TEXT_SCRIPT = """
+var selector = arguments[0];
+var expected = arguments[1].replace(/\\s+/g, ' ').trim();
+var deadline = Date.now() + arguments[2];
+var done = arguments[arguments.length - 1];
+function composerText() {
+    var editor = document.querySelector(selector);
+    if (!editor) {
+        return '';
+    }
+    var text = editor.tagName === 'TEXTAREA' ? editor.value : editor.innerText;
+    return (text || '').replace(/\\s+/g, ' ').trim();
+}
+function check() {
+    var text = composerText();
+    if (expected === '' ? text === '' : text.indexOf(expected) !== -1) {
+        done(true);
+    } else if (Date.now() >= deadline) {
+        done(false);
+    } else {
+        setTimeout(check, 10);
+    }
+}
+check();
+"""
+
+ENTER_KEY_EVENT = {
+    'key': "Enter",
+    'code': "Enter",
+    'windowsVirtualKeyCode': 13,
+    'nativeVirtualKeyCode': 13,
+}
+
+
+def send_text(driver, selectors, text, timeout=SEND_TIMEOUT):
+    """
+    Sends `text` through the first composer matching `selectors`:
+    one script call focuses it, CDP Input.insertText inserts the whole text at
+    once, Enter is pressed as soon as the editor shows the text, and the send
+    is confirmed when the editor clears.
+
+    Returns the index of the selector that was used.
+    Raises NoSuchElementException if no composer exists, TimeoutException if
+    the editor does not accept the text.
+    """
+    # Every command below jumps ahead of queued scan chunks
+    with priority(PRIORITY_SEND):
+        return _send_text(driver, selectors, text, timeout)
+
+
+def _send_text(driver, selectors, text, timeout):
+    started = time.perf_counter()
+    index = driver.execute_script(FOCUS_COMPOSER_SCRIPT, selectors)
+    if index is None or index < 0:
+        raise NoSuchElementException(f"No message composer found for {selectors}")
+    selector = selectors[index]
+
+    driver.execute_cdp_cmd("Input.insertText", {'text': text})
+    if not driver.execute_async_script(WAIT_FOR_COMPOSER_TEXT_SCRIPT, selector, text, int(timeout * 1000)):
+        raise TimeoutException("Message composer did not accept the inserted text.")
+
+    driver.execute_cdp_cmd("Input.dispatchKeyEvent", dict(ENTER_KEY_EVENT, type="keyDown", text="\r"))
+    driver.execute_cdp_cmd("Input.dispatchKeyEvent", dict(ENTER_KEY_EVENT, type="keyUp"))
+
+    # The composer is emptied once the app has taken the message
+    sent = driver.execute_async_script(WAIT_FOR_COMPOSER_TEXT_SCRIPT, selector, "", int(timeout * 1000))
+    elapsed = time.perf_counter() - started
+    metrics.response_sent(elapsed)
+    if sent:
+        logger.info(f"Response sent in {elapsed * 1000:.0f} ms.")
+    else:
+        logger.warning(f"Composer not cleared {elapsed:.1f}s after Enter; the response may not have been sent.")
+    return index
@@ -1,48 +1,95 @@
-from selenium.common.exceptions import NoSuchElementException
-from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException, ElementNotInteractableException
 import time
 import logging
-import urllib.parse
 from messaging_client_base import MessagingClientBase
+from fast_send import INSTAGRAM_COMPOSER_SELECTORS, send_text
+from sender_identity import hash_sender
+from instagram_extraction import (
+    ME_SENDERS,
+    InstagramCursor,
+    chat_id_from_url,
+    extract_latest_rows,
+    instagram_change_detector,
+)
+from driver_tracing import PHASE_CHAT_ID, PHASE_SENDING, traced
 
 logger = logging.getLogger(__name__)
 
 class InstagramClient(MessagingClientBase):
+    MESSAGE_SELECTOR = "div[role='row']"
+
     def __init__(self, driver):
         super().__init__(driver)
+        # Polls where the fingerprint is unchanged skip extraction
+        self.change_detector = instagram_change_detector()
+        # Remembers the last row seen per chat, so each poll returns only new rows
+        self.cursor = InstagramCursor()
         logger.info("Initialized InstagramClient")
 
+    chat_id_from_url = staticmethod(chat_id_from_url)
+
+    @traced(PHASE_CHAT_ID)
     def get_current_chat_id(self):
         """Returns Instagram chat ID from the URL."""
         try:
-            current_url = self.driver.current_url
-            parts = urllib.parse.urlparse(current_url).path.strip('/').split('/')
-            return parts[2] if len(parts) >= 3 and parts[0] == 'direct' else None
+            return self.chat_id_from_url(self.driver.current_url)
         except Exception as e:
             logger.exception("Error getting Instagram chat ID.")
             return None
 
     def collect_messages_after(self, last_message_from_me_ts_float):
-        """Collects new Instagram messages."""
-        message_elements = self.driver.find_elements(By.CSS_SELECTOR, "div[role='row']")
-        collected_messages = []
-
-        for message in message_elements:
-            try:
-                sender = message.find_element(By.XPATH, './/h5/span').text.strip()
-                content = message.find_element(By.XPATH, './/div[@dir="auto"]').text.strip()
-                timestamp = time.time()  # No timestamp available, use system time
-
-                collected_messages.append({
-                    'message_id': str(timestamp),
-                    'content': content,
-                    'timestamp': timestamp,
-                    'hashed_sender_name': sender
-                })
-            except NoSuchElementException:
-                continue
-        
-        return collected_messages
+        """
+        Collects the Instagram messages rendered since the last poll of this chat
+        (on a first visit, those after the last message from 'You'). Position is
+        tracked by the row cursor; rows have no comparable ts, so the argument is unused.
+        """
+        rows = self.cursor.new_rows(self.driver)
+        detected_at = time.time()
+        return [
+            {
+                'message_id': row['key'],
+                'content': row['content'],
+                'timestamp': row['timestamp'] if row['timestamp'] is not None else detected_at,
+                'hashed_sender_name': hash_sender(row['sender_name']),
+                'detected_at': detected_at,
+            }
+            for row in rows
+            if row['content'] and row['sender_name'] not in ME_SENDERS
+        ]
+
+    def collect_recent_messages(self, count):
+        """The last `count` rows of the open chat, in one extraction call; rows without a time get None."""
+        return [
+            {
+                'message_id': row['key'],
+                'content': row['content'],
+                'timestamp': row['timestamp'],
+                'sender_name': row['sender_name'],
+            }
+            for row in extract_latest_rows(self.driver, count)
+            if row['content']
+        ]
+
+    def is_from_me(self, sender_name):
+        """Instagram labels 'me' with one of ME_SENDERS."""
+        return sender_name in ME_SENDERS
 
     def detect_new_messages(self, last_processed_ts_float):
-        return self.collect_messages_after(last_processed_ts_float)
+        if not self.change_detector.changed(self.driver):
+            return []
+        messages = self.collect_messages_after(last_processed_ts_float)
+        self.change_detector.mark_processed()
+        return messages
+
+    @traced(PHASE_SENDING)
+    def send_response(self, response):
+        """Inserts the response into the Instagram message box and sends it."""
+        try:
+            send_text(self.driver, INSTAGRAM_COMPOSER_SELECTORS, response)
+            logger.info(f"Sent response to Instagram: {response}")
+        except NoSuchElementException:
+            logger.exception("Failed to locate Instagram message input.")
+        except ElementNotInteractableException:
+            logger.exception("Instagram message input not interactable.")
+        except Exception as e:
+            logger.exception("Failed to send response to Instagram.")
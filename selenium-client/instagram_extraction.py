@@ -0,0 +1,249 @@
+import collections
+import logging
+import urllib.parse
+
+from change_detector import ChangeDetector
+from driver_executor import SCAN_CHUNK_SIZE
+from driver_tracing import PHASE_EXTRACTION, traced
+
+logger = logging.getLogger(__name__)
+
+# Instagram renders each message as a row
+ROW_SELECTOR = "div[role='row']"
+
+# Senders Instagram uses for the user's own messages
+ME_SENDERS = ['You', 'You sent']
+
+MAX_REMEMBERED_KEYS = 1000  # Row keys kept per chat, to filter repeats after losing the anchor
+MAX_TRACKED_CHATS = 32  # Least recently visited chats are forgotten beyond this
+
+# Returns the rows after the row whose key is arguments[1] (all rows if it is null
+# or no longer rendered), scanning back from the newest row. Rows have no id in
+# the DOM, so a row's key hashes its sender and text with those of the nearest
+# different row before it and the number of identical rows in between, plus the
+# time of its group (the nearest row above it with a timestamp) and how often
+# the same context occurred earlier in that group. Keys stay stable when older
+# history loads above, and a pair like "thanks" / "ok" posted again later gets
+# new keys. A poll costs O(rows in the newest group), as every key in a group
+# is computed in one pass. `timestamp` comes from a <time datetime>
+# element in the row when Instagram renders one. Optional arguments[2] /
+# arguments[3] (start, count) limit it to a chunk of those rows, start
+# counting from the first row after the anchor (a negative start counts back
+# from the newest row).
+ROWS_AFTER_SCRIPT = """
+var rows = document.querySelectorAll(arguments[0]);
+var anchor = arguments[1];
+var data = new Array(rows.length);
+function hash(text) {
+    var h = 0;
+    for (var i = 0; i < text.length; i++) {
+        h = (h * 31 + text.charCodeAt(i)) | 0;
+    }
+    return (h >>> 0).toString(16);
+}
+function row(i) {
+    if (!data[i]) {
+        var senderElement = rows[i].querySelector('h5 span');
+        var textElement = null;
+        var candidates = rows[i].querySelectorAll('div[dir="auto"]');
+        for (var j = 0; j < candidates.length; j++) {
+            if (!candidates[j].closest('h5')) {
+                textElement = candidates[j];
+                break;
+            }
+        }
+        var timeElement = rows[i].querySelector('time[datetime]');
+        var time = timeElement ? Date.parse(timeElement.getAttribute('datetime')) : NaN;
+        data[i] = {
+            sender_name: senderElement ? senderElement.innerText : null,
+            content: textElement ? textElement.innerText : '',
+            timestamp: isNaN(time) ? null : time / 1000
+        };
+    }
+    return data[i];
+}
+function context(i) {
+    var current = row(i);
+    var repeats = 0;
+    while (i - repeats > 0 && row(i - repeats - 1).sender_name === current.sender_name
+           && row(i - repeats - 1).content === current.content) {
+        repeats++;
+    }
+    var previous = i - repeats > 0 ? row(i - repeats - 1) : {sender_name: '', content: ''};
+    return [current.sender_name, current.content, previous.sender_name, previous.content, repeats].join('\u0000');
+}
+var keys = new Array(rows.length);
+var groups = new Array(rows.length);
+function key(i) {
+    if (keys[i] === undefined) {
+        var start = i;
+        while (start > 0 && row(start).timestamp === null && groups[start - 1] === undefined) {
+            start--;
+        }
+        var group = start > 0 && row(start).timestamp === null ? groups[start - 1]
+            : {next: start, time: row(start).timestamp, occurrences: {}};
+        for (; group.next <= i; group.next++) {
+            var c = context(group.next);
+            group.occurrences[c] = (group.occurrences[c] || 0) + 1;
+            keys[group.next] = hash([c, group.time, group.occurrences[c]].join('\u0000'));
+            groups[group.next] = group;
+        }
+    }
+    return keys[i];
+}
+var start = 0;
+var found = false;
+if (anchor) {
+    for (var i = rows.length - 1; i >= 0; i--) {
+        if (key(i) === anchor) {
+            start = i + 1;
+            found = true;
+            break;
+        }
+    }
+}
+var offset = arguments[2] || 0;
+start = offset < 0 ? Math.max(start, rows.length + offset) : start + offset;
+var end = arguments[3] ? Math.min(rows.length, start + arguments[3]) : rows.length;
+var records = [];
+for (var i = start; i < end; i++) {
+    var record = row(i);
+    record.key = key(i);
+    records.push(record);
+}
+return {url: window.location.href, found: found, rows: records};
+"""
+
+
+def chat_id_from_url(url):
+    """Returns the Instagram thread ID for a /direct/t/<id>/ URL, or None."""
+    parts = urllib.parse.urlparse(url).path.strip('/').split('/')
+    return parts[2] if len(parts) >= 3 and parts[0] == 'direct' else None
+
+
+def instagram_change_detector():
+    """A ChangeDetector keyed on the row count and the last row's text (rows carry no id)."""
+    return ChangeDetector(ROW_SELECTOR)
+
+
+def normalize_rows(records):
+    """Strips the raw values returned by ROWS_AFTER_SCRIPT; a missing sender becomes 'Unknown'."""
+    for record in records:
+        sender_name = record.get('sender_name')
+        record['sender_name'] = sender_name.strip() if sender_name is not None else "Unknown"
+        record['content'] = (record.get('content') or "").strip()
+    return records
+
+
+@traced(PHASE_EXTRACTION)
+def extract_latest_rows(driver, count):
+    """The last `count` rows of the open chat, oldest first, in one execute_script call (see extract_rows_after)."""
+    result = driver.execute_script(ROWS_AFTER_SCRIPT, ROW_SELECTOR, None, -count) or {}
+    return normalize_rows(result.get('rows') or [])
+
+
+@traced(PHASE_EXTRACTION)
+def extract_rows_after(driver, anchor, chunk_size=SCAN_CHUNK_SIZE):
+    """
+    Runs ROWS_AFTER_SCRIPT for the rows after the row keyed `anchor` (all rows
+    if it is None or no longer rendered), `chunk_size` rows per execute_script
+    call (all in one call if chunk_size is 0). Chunking bounds how long a
+    queued send waits behind a scan, e.g. the full scan of a first visit.
+    Returns:
+        A dict with url, found (whether the anchor was rendered) and rows
+        (oldest to newest, with key, sender_name, content and timestamp).
+    """
+    if not chunk_size:
+        return driver.execute_script(ROWS_AFTER_SCRIPT, ROW_SELECTOR, anchor) or {}
+    result = driver.execute_script(ROWS_AFTER_SCRIPT, ROW_SELECTOR, anchor, 0, chunk_size) or {}
+    rows = list(result.get('rows') or [])
+    seen_keys = {row.get('key') for row in rows}
+    chunk = rows
+    while len(chunk) >= chunk_size:
+        chunk = (driver.execute_script(ROWS_AFTER_SCRIPT, ROW_SELECTOR, anchor, len(rows), chunk_size) or {}).get('rows') or []
+        for row in chunk:
+            # Older history rendered between chunks shifts the rows; skip repeats
+            if row.get('key') in seen_keys:
+                continue
+            seen_keys.add(row.get('key'))
+            rows.append(row)
+    result['rows'] = rows
+    return result
+
+
+class _ChatPosition:
+    def __init__(self, max_keys):
+        self.anchor = None
+        self.max_keys = max_keys
+        self.recent_keys = collections.OrderedDict()
+
+    def remember(self, rows):
+        for row in rows:
+            self.recent_keys[row['key']] = True
+            self.recent_keys.move_to_end(row['key'])
+        while len(self.recent_keys) > self.max_keys:
+            self.recent_keys.popitem(last=False)
+        if rows:
+            self.anchor = rows[-1]['key']
+
+
+class InstagramCursor:
+    """
+    Incremental reader for Instagram chats: remembers the key of the last row
+    seen in each chat and reads only the rows after it (see ROWS_AFTER_SCRIPT).
+
+    On the first visit to a chat, rows after the last message from 'You' are
+    new. If the anchor row is no longer rendered, the rows are filtered against
+    the keys seen recently instead.
+    """
+
+    def __init__(self, max_chats=MAX_TRACKED_CHATS, max_keys=MAX_REMEMBERED_KEYS):
+        self.max_chats = max_chats
+        self.max_keys = max_keys
+        self.chat_id = None
+        self._positions = collections.OrderedDict()
+
+    def _anchor(self, chat_id):
+        position = self._positions.get(chat_id)
+        return position.anchor if position is not None else None
+
+    def _position(self, chat_id):
+        position = self._positions.get(chat_id)
+        if position is None:
+            position = _ChatPosition(self.max_keys)
+            self._positions[chat_id] = position
+            if len(self._positions) > self.max_chats:
+                self._positions.popitem(last=False)
+        else:
+            self._positions.move_to_end(chat_id)
+        return position
+
+    @traced(PHASE_EXTRACTION)
+    def new_rows(self, driver):
+        """
+        Returns the rows added to the current chat since the last call for it,
+        oldest first, as dicts with key, sender_name, content and timestamp
+        (None unless the DOM exposes one).
+        """
+        anchor = self._anchor(self.chat_id)
+        result = extract_rows_after(driver, anchor)
+        chat_id = chat_id_from_url(result.get('url') or "")
+        if chat_id != self.chat_id:
+            # The chat changed since the last poll; read again from its own anchor
+            self.chat_id = chat_id
+            if self._anchor(chat_id) != anchor:
+                anchor = self._anchor(chat_id)
+                result = extract_rows_after(driver, anchor)
+
+        rows = normalize_rows(result.get('rows') or [])
+        position = self._position(chat_id)
+        if anchor is None:
+            last_you = max((i for i, row in enumerate(rows) if row['sender_name'] in ME_SENDERS), default=-1)
+            new_rows = rows[last_you + 1:]
+        elif result.get('found'):
+            new_rows = rows
+        else:
+            logger.info(f"Lost position in Instagram chat {chat_id}; filtering by recently seen rows.")
+            new_rows = [row for row in rows if row['key'] not in position.recent_keys]
+        position.remember(rows)
+        return new_rows
@@ -0,0 +1,78 @@
+import logging
+import threading
+
+from client_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BATCH_WINDOW = 0.25  # Seconds to wait for more messages before emitting a batch
+MAX_BATCH_SIZE = 50  # A full batch is emitted immediately
+
+
+class MessageBatcher:
+    """
+    Coalesces 'newMessage' payloads into a single 'newMessages' event.
+
+    A batch is emitted when it reaches max_batch_size, when `window` seconds
+    have passed since its first message, or when flush() is called (e.g. at
+    the end of a poll cycle).
+    """
+
+    def __init__(self, emit, user_id, window=BATCH_WINDOW, max_batch_size=MAX_BATCH_SIZE):
+        self.emit = emit
+        self.user_id = user_id
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.events_emitted = 0
+        self.messages_emitted = 0
+        self._pending = []
+        self._detected_at = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, payload, detected_at=None):
+        """Queues one 'newMessage' payload. detected_at is used for the relay latency metric once emitted."""
+        # user_id is sent once per batch rather than once per message
+        message = {key: value for key, value in payload.items() if key != "user_id"}
+        with self._lock:
+            self._pending.append(message)
+            self._detected_at.append(detected_at)
+            full = len(self._pending) >= self.max_batch_size
+            if not full and self._timer is None and self.window > 0:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def cycle_done(self):
+        """
+        Called at the end of a poll cycle. With a window of 0 batches are scoped
+        to a cycle and are emitted here; timed batches flush on their own.
+        """
+        if self.window <= 0:
+            self.flush()
+
+    def flush(self):
+        """Emits all pending messages as one 'newMessages' event."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            messages = self._pending
+            detected_at = self._detected_at
+            self._pending = []
+            self._detected_at = []
+        if not messages:
+            return
+
+        try:
+            self.emit("newMessages", {"user_id": self.user_id, "messages": messages})
+            self.events_emitted += 1
+            self.messages_emitted += len(messages)
+            for message_detected_at in detected_at:
+                metrics.message_emitted(message_detected_at)
+            logger.info(f"Sent batch of {len(messages)} messages via WebSocket.")
+        except Exception as e:
+            metrics.emit_failed(len(messages))
+            logger.exception(f"Failed to send batch of {len(messages)} messages via WebSocket.")
@@ -0,0 +1,72 @@
+import bisect
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_INDEXED_MESSAGES = 500  # Per chat pane
+MAX_INDEXED_PANES = 32  # Least recently used panes are dropped beyond this
+
+
+class MessageIndex:
+    """
+    Bounded index of recently seen messages for one chat pane, sorted by ts.
+
+    Inserts keep the ts list sorted with bisect; when the index is full the
+    oldest messages are dropped. The latest ts of a message from 'me' is
+    tracked incrementally as messages are added.
+    """
+
+    def __init__(self, max_size=MAX_INDEXED_MESSAGES):
+        self.max_size = max_size
+        self.last_from_me_ts = None
+        self._ts = []
+        self._messages = {}
+
+    def __len__(self):
+        return len(self._ts)
+
+    def add(self, ts, message, from_me):
+        """Adds (or refreshes) a message. Messages without a ts are not indexed."""
+        if ts is None:
+            return
+        if ts not in self._messages:
+            bisect.insort(self._ts, ts)
+        self._messages[ts] = message
+        if from_me and (self.last_from_me_ts is None or ts > self.last_from_me_ts):
+            self.last_from_me_ts = ts
+
+        excess = len(self._ts) - self.max_size
+        if excess > 0:
+            for oldest in self._ts[:excess]:
+                del self._messages[oldest]
+            del self._ts[:excess]
+
+    def messages(self):
+        """All indexed messages, oldest first."""
+        return [self._messages[ts] for ts in self._ts]
+
+
+class MessageIndexRegistry:
+    """
+    Message indexes keyed by (chat_id, pane); the least recently used are
+    dropped beyond `max_panes`.
+    """
+
+    def __init__(self, max_panes=MAX_INDEXED_PANES, max_size=MAX_INDEXED_MESSAGES):
+        self.max_panes = max_panes
+        self.max_size = max_size
+        self._indexes = collections.OrderedDict()
+
+    def get(self, chat_id, pane):
+        key = (chat_id, pane)
+        index = self._indexes.get(key)
+        if index is None:
+            index = MessageIndex(self.max_size)
+            self._indexes[key] = index
+            if len(self._indexes) > self.max_panes:
+                evicted, _ = self._indexes.popitem(last=False)
+                logger.debug(f"Dropped message index for {evicted}.")
+        else:
+            self._indexes.move_to_end(key)
+        return index
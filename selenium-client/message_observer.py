@@ -0,0 +1,138 @@
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+BINDING_NAME = "easyspeakMessagesAdded"
+FLUSH_DELAY_MS = 50  # Coalesce bursts of added nodes into one binding call
+
+# Injected into the page: watches for message nodes being added and forwards
+# them to Python through the Runtime.addBinding callback.
+OBSERVER_SCRIPT_TEMPLATE = """
+(function(selector, bindingName, flushDelay) {
+    if (window.__easyspeakObserver) {
+        window.__easyspeakObserver.disconnect();
+    }
+    var pending = [];
+    var scheduled = false;
+
+    function flush() {
+        scheduled = false;
+        if (pending.length && typeof window[bindingName] === 'function') {
+            window[bindingName](JSON.stringify(pending));
+        }
+        pending = [];
+    }
+
+    function collect(node) {
+        if (node.nodeType !== 1) {
+            return;
+        }
+        var matches = Array.prototype.slice.call(node.querySelectorAll(selector));
+        if (node.matches(selector)) {
+            matches.unshift(node);
+        }
+        for (var i = 0; i < matches.length; i++) {
+            var keyElement = matches[i].querySelector('[data-ts]');
+            pending.push({
+                key: keyElement ? keyElement.getAttribute('data-ts') : null,
+                text: (matches[i].innerText || '').slice(0, 200)
+            });
+        }
+    }
+
+    var observer = new MutationObserver(function(mutations) {
+        for (var i = 0; i < mutations.length; i++) {
+            var added = mutations[i].addedNodes;
+            for (var j = 0; j < added.length; j++) {
+                collect(added[j]);
+            }
+        }
+        if (pending.length && !scheduled) {
+            scheduled = true;
+            setTimeout(flush, flushDelay);
+        }
+    });
+
+    function start() {
+        observer.observe(document.body, {childList: true, subtree: true});
+    }
+    if (document.body) {
+        start();
+    } else {
+        document.addEventListener('DOMContentLoaded', start);
+    }
+    window.__easyspeakObserver = observer;
+})(%s, %s, %d);
+"""
+
+
+class MessageObserver:
+    """
+    Push-based message detection: a MutationObserver in the page reports new
+    message nodes over CDP, so the poll loop can sleep until something arrives.
+    """
+
+    def __init__(self, session, message_selector):
+        self.session = session
+        self.message_selector = message_selector
+        self._activity = threading.Event()
+        self._lock = threading.Lock()
+        self._pending_nodes = []
+        self._script_identifier = None
+
+    def start(self):
+        """Registers the binding and injects the observer into the current and future documents."""
+        source = OBSERVER_SCRIPT_TEMPLATE % (
+            json.dumps(self.message_selector),
+            json.dumps(BINDING_NAME),
+            FLUSH_DELAY_MS,
+        )
+        self.session.on("Runtime.bindingCalled", self._on_binding_called)
+        self.session.send("Runtime.enable")
+        self.session.send("Runtime.addBinding", {'name': BINDING_NAME})
+        result = self.session.send("Page.addScriptToEvaluateOnNewDocument", {'source': source})
+        self._script_identifier = result.get('identifier')
+        self.session.send("Runtime.evaluate", {'expression': source})
+        logger.info(f"Message observer started for selector {self.message_selector!r}.")
+
+    def stop(self):
+        self.session.off("Runtime.bindingCalled", self._on_binding_called)
+        if not self.session.connected:
+            return
+        try:
+            if self._script_identifier:
+                self.session.send("Page.removeScriptToEvaluateOnNewDocument", {'identifier': self._script_identifier})
+            self.session.send("Runtime.evaluate", {
+                'expression': "window.__easyspeakObserver && window.__easyspeakObserver.disconnect();"
+            })
+            self.session.send("Runtime.removeBinding", {'name': BINDING_NAME})
+        except Exception:
+            logger.exception("Error stopping message observer.")
+
+    def wait(self, timeout):
+        """
+        Blocks until the observer reports new message nodes or `timeout` seconds pass.
+        Returns:
+            The list of reported nodes ({key, text} dicts); empty on timeout.
+        """
+        self._activity.wait(timeout)
+        with self._lock:
+            nodes = self._pending_nodes
+            self._pending_nodes = []
+            self._activity.clear()
+        return nodes
+
+    def _on_binding_called(self, params):
+        if params.get('name') != BINDING_NAME:
+            return
+        try:
+            nodes = json.loads(params.get('payload') or "[]")
+        except ValueError:
+            logger.warning("Ignoring malformed message observer payload.")
+            return
+        with self._lock:
+            self._pending_nodes.extend(nodes)
+            self._activity.set()
+        logger.debug(f"Message observer reported {len(nodes)} new nodes.")
@@ -1,8 +1,18 @@
 from selenium import webdriver
 from slack_client import SlackClient
 from instagram_client import InstagramClient
+from messaging_client_base import POLL_INTERVAL, PUSH_SAFETY_POLL_INTERVAL, USER_ID, sio, supervise_connection
+from outbound_spool import OUTBOUND_SPOOL_PATH, start_outbound_delivery
+from watermark_store import WatermarkStore
+from async_engine import AsyncMessagingEngine
+from poll_scheduler import AdaptivePollScheduler, MAX_POLL_INTERVAL, is_tab_hidden
+from multi_chat_monitor import MONITORED_CHAT_URLS, MultiChatMonitor
+from driver_executor import serialize_driver
+from connection_supervisor import BrowserSupervisor
+from driver_tracing import trace_if_enabled
+from client_metrics import metrics, start_reporting
 import argparse
-import time
+import asyncio
 import logging
 from selenium.webdriver.chrome.options import Options
 
@@ -14,34 +24,147 @@ def initialize_selenium():
     chrome_options = Options()
     chrome_options.add_experimental_option("debuggerAddress", "localhost:9222")
     driver = webdriver.Chrome(options=chrome_options)
-    return driver
+    # One thread owns the session: polling and sending threads queue their commands, sends first
+    serialize_driver(driver)
+    # WEBDRIVER_TRACE=1 counts and times every command by phase
+    return trace_if_enabled(driver)
 
-def messaging_client(mode='slack'):
+def relay_new_messages(client, chat_id, new_messages, watermark_store, last_processed_ts_float):
+    """
+    Sends the messages detected in the open chat, oldest first, and advances
+    the chat's watermark past each one. The chat ID goes into each message's
+    idempotency key, so equal message IDs in different chats (e.g. Instagram
+    row keys) do not collide. Returns the new watermark.
+    """
+    for message in new_messages:
+        message['emitted_at'] = client.send_message_via_websocket(
+            message['content'], message['timestamp'], message['hashed_sender_name'], chat_id,
+            detected_at=message.get('detected_at'), message_id=message.get('message_id'),
+        )
+        last_processed_ts_float = client.watermark_ts(message)
+        watermark_store.set(chat_id, last_processed_ts_float)
+    return last_processed_ts_float
+
+def messaging_client(mode='slack', detection='poll', source='dom', runtime='threaded', batch_window=None,
+                     monitored_urls=None):
     driver = initialize_selenium()
     client = SlackClient(driver) if mode == 'slack' else InstagramClient(driver)
+    if batch_window is not None:
+        client.enable_batching(batch_window)
+    elif runtime == 'threaded' and OUTBOUND_SPOOL_PATH:
+        # Messages survive a slow or unreachable back end; OUTBOUND_SPOOL_PATH="" emits directly
+        client.enable_outbound_spool(start_outbound_delivery(sio, USER_ID))
+
+    if runtime == 'threaded':
+        # Connects in the background and reconnects with backoff; messages are spooled meanwhile
+        supervise_connection()
+
+    poll_interval = POLL_INTERVAL
+    if source == 'websocket' and mode == 'slack':
+        try:
+            client.enable_websocket_source()
+            # Events wake the loop; polling stays on only as a slow safety net
+            poll_interval = PUSH_SAFETY_POLL_INTERVAL
+        except Exception as e:
+            logger.exception("Failed to enable Slack websocket source; falling back to DOM scraping.")
+    elif detection == 'push':
+        try:
+            client.enable_push_detection()
+            # Polling stays on only as a slow safety net
+            poll_interval = PUSH_SAFETY_POLL_INTERVAL
+        except Exception as e:
+            logger.exception("Failed to enable push detection; falling back to polling.")
+
+    # Resume from the stored watermark instead of rescanning the chat
+    watermark_store = WatermarkStore()
+
+    # Adapts the interval to chat activity and tab visibility; poll_interval is the settled rate
+    scheduler = AdaptivePollScheduler(base_interval=poll_interval, max_interval=max(MAX_POLL_INTERVAL, poll_interval))
+
+    if runtime == 'asyncio':
+        # The engine emits monitored chats' messages through its own (async) socket
+        engine = AsyncMessagingEngine(
+            client, scheduler=scheduler, watermark_store=watermark_store,
+            browser_supervisor=BrowserSupervisor(initialize_selenium), monitored_urls=monitored_urls,
+        )
+        asyncio.run(engine.run())
+        return
 
     previous_chat_id = client.get_current_chat_id()
-    last_processed_ts_float = 0
+    last_processed_ts_float = watermark_store.get(previous_chat_id) or 0
+
+    # Relay messages from other configured chats, each scanned in its own background tab
+    monitor = None
+    if monitored_urls:
+        monitor = MultiChatMonitor(
+            monitored_urls,
+            lambda chat_id, message: client.send_message_via_websocket(
+                message['content'], message['timestamp'], message['hashed_sender_name'], chat_id,
+                detected_at=message.get('detected_at'), message_id=message.get('message_id'),
+            ),
+            watermark_store=watermark_store,
+        )
+        # The loop below relays the open chat; the monitor leaves it alone
+        monitor.set_foreground_chat(previous_chat_id)
+        monitor.start()
 
+    # Prometheus endpoint (METRICS_PORT) and periodic 'clientStats' events
+    start_reporting(sio, USER_ID)
+
+    browser_supervisor = BrowserSupervisor(initialize_selenium)
+    cycle_failed = False
     while True:
+        # Reattach if Chrome (or chromedriver) went away; detection resumes from the watermark, without a rescan
+        new_driver = browser_supervisor.ensure(driver, force=cycle_failed)
+        if new_driver is not driver:
+            driver = new_driver
+            client.attach_driver(driver)
+        cycle_failed = False
+
         try:
-            current_chat_id = client.get_current_chat_id()
-            if current_chat_id != previous_chat_id:
-                client.notify_chat_changed(current_chat_id)
-                previous_chat_id = current_chat_id
-                last_processed_ts_float = 0
-
-            new_messages = client.detect_new_messages(last_processed_ts_float)
-            for message in new_messages:
-                client.send_message_via_websocket(message['content'], message['timestamp'], message['hashed_sender_name'])
-                last_processed_ts_float = float(message['message_id'])
-
-            time.sleep(5)
+            # While the tab is hidden the scheduler pauses scanning and only re-checks visibility
+            if scheduler.should_poll():
+                client.start_cycle()
+                current_chat_id = client.get_current_chat_id()
+                if current_chat_id != previous_chat_id:
+                    client.notify_chat_changed(current_chat_id)
+                    previous_chat_id = current_chat_id
+                    if monitor is not None:
+                        monitor.set_foreground_chat(current_chat_id)
+                    last_processed_ts_float = watermark_store.get(current_chat_id) or 0
+                    scheduler.record_activity()
+
+                new_messages = client.detect_new_messages(last_processed_ts_float)
+                if new_messages:
+                    scheduler.record_activity()
+                last_processed_ts_float = relay_new_messages(
+                    client, current_chat_id, new_messages, watermark_store, last_processed_ts_float
+                )
+
+                # Commit watermark updates in batches
+                watermark_store.flush_if_due()
+                client.end_cycle(len(new_messages))
+
         except Exception as e:
             logger.exception("Error in main loop.")
+            cycle_failed = True
+
+        interval = scheduler.next_interval(is_tab_hidden(driver))
+        metrics.set_gauge('poll_interval_seconds', interval)
+        client.wait_for_new_messages(interval)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--mode', choices=['slack', 'instagram'], default='slack')
+    parser.add_argument('--detection', choices=['poll', 'push'], default='poll')
+    parser.add_argument('--source', choices=['dom', 'websocket'], default='dom')
+    parser.add_argument('--runtime', choices=['threaded', 'asyncio'], default='threaded')
+    parser.add_argument('--batch-window', type=float, default=None,
+                        help="Emit 'newMessages' batches; seconds to coalesce (0 = per poll cycle)")
+    parser.add_argument('--monitor', action='append', default=list(MONITORED_CHAT_URLS), metavar='URL',
+                        help="Chat URL to monitor in a background tab (repeatable)")
     args = parser.parse_args()
-    messaging_client(args.mode)
+    if args.runtime == 'asyncio' and args.batch_window is not None:
+        # The async engine emits each queued event on its own; it has no batcher
+        parser.error("--batch-window is only supported with --runtime threaded")
+    messaging_client(args.mode, args.detection, args.source, args.runtime, args.batch_window, args.monitor)
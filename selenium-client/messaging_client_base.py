@@ -2,9 +2,16 @@ import logging
 import socketio
 import os
 import time
-import urllib.parse
-import hmac
-import hashlib
+from cdp_session import connect_to_driver_page
+from message_observer import MessageObserver
+from message_batcher import MessageBatcher
+import driver_tracing
+from driver_tracing import PHASE_EMIT, traced
+from client_metrics import metrics
+from outbound_spool import message_idempotency_key
+from chat_snapshot import CHAT_SNAPSHOT_SIZE, build_chat_snapshot
+from sender_identity import hash_sender
+from connection_supervisor import SocketSupervisor
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -12,20 +19,49 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 WEBSOCKET_SERVER_URL = os.getenv("WEBSOCKET_SERVER_URL", "http://localhost:3000")
 USER_ID = os.getenv("USER_ID", "pearl@easyspeak-aac.com")
 POLL_INTERVAL = 5  # Polling interval in seconds
-PEPPER = os.getenv("PEPPER", "SuperSecretPepperValue")
+PUSH_SAFETY_POLL_INTERVAL = 30  # Safety-net polling interval when push detection is enabled
+SOCKETIO_SERIALIZER = os.getenv("SOCKETIO_SERIALIZER", "default")  # "default" (JSON) or "msgpack"
 
-# Initialize WebSocket Client
-sio = socketio.Client()
+# Initialize WebSocket Client; reconnecting is left to a SocketSupervisor (see supervise_connection)
+sio = socketio.Client(serializer=SOCKETIO_SERIALIZER, reconnection=False)
+socket_supervisor = None
 
-def hash_sender_name(sender_name, pepper):
-    """Hashes the sender's name using HMAC with SHA-256."""
-    return hmac.new(pepper.encode('utf-8'), sender_name.encode('utf-8'), hashlib.sha256).hexdigest()
+# Disk-backed, ack-windowed delivery of 'newMessage' events (see enable_outbound_spool)
+outbound = None
+
+@sio.event(namespace="/messaging")
+def connect():
+    metrics.connected()
+    if socket_supervisor is not None:
+        socket_supervisor.connected()
+    if outbound is not None:
+        outbound.connected()
+
+@sio.event(namespace="/messaging")
+def disconnect():
+    if socket_supervisor is not None:
+        socket_supervisor.disconnected()
+    if outbound is not None:
+        outbound.disconnected()
+
+def supervise_connection():
+    """Connects sio in the background and keeps it connected, retrying with jittered backoff."""
+    global socket_supervisor
+    socket_supervisor = SocketSupervisor(sio, f"{WEBSOCKET_SERVER_URL}/messaging").start()
+    return socket_supervisor
 
 class MessagingClientBase:
+    # CSS selector for message nodes; watched by push-based detection
+    MESSAGE_SELECTOR = None
+
     def __init__(self, driver):
         self.driver = driver
         self.previous_chat_id = None
         self.last_processed_ts_float = 0
+        self.message_observer = None
+        self.message_batcher = None
+        self.change_detector = None
+        self.cycle_started = time.monotonic()
         logger.info("Initialized MessagingClientBase")
 
     def get_current_chat_id(self):
@@ -44,28 +80,163 @@ class MessagingClientBase:
         """Should be implemented by subclasses."""
         raise NotImplementedError
 
-    def send_message_via_websocket(self, content, timestamp, sender_name):
-        """Sends the new message to the backend via WebSocket."""
+    def send_response(self, response):
+        """Should be implemented by subclasses."""
+        raise NotImplementedError
+
+    def watermark_ts(self, message):
+        """The ts a detected message advances the chat's watermark to."""
+        return message['timestamp']
+
+    def collect_recent_messages(self, count):
+        """
+        Should be implemented by subclasses: the last `count` messages of the open
+        chat, oldest first, as dicts with message_id, content, timestamp and
+        sender_name (raw sender text).
+        """
+        raise NotImplementedError
+
+    def is_from_me(self, sender_name):
+        """Should be implemented by subclasses."""
+        raise NotImplementedError
+
+    def enable_push_detection(self):
+        """Injects a MutationObserver that reports new message nodes over CDP."""
+        session = connect_to_driver_page(self.driver)
+        self.message_observer = MessageObserver(session, self.MESSAGE_SELECTOR)
+        self.message_observer.start()
+        logger.info("Push-based message detection enabled.")
+
+    def wait_for_new_messages(self, timeout):
+        """
+        Waits until new message nodes are reported or `timeout` seconds pass.
+        Without push detection this is a plain sleep. Returns True if nodes were reported.
+        """
+        if self.message_observer is None:
+            time.sleep(timeout)
+            return False
+        return bool(self.message_observer.wait(timeout))
+
+    def enable_batching(self, window):
+        """Coalesces messages into 'newMessages' events; a window of 0 batches per poll cycle."""
+        self.message_batcher = MessageBatcher(
+            lambda event, data: sio.emit(event, data, namespace="/messaging"), USER_ID, window
+        )
+        logger.info(f"Message batching enabled (window: {window}s).")
+
+    def enable_outbound_spool(self, delivery):
+        """Spools 'newMessage' events to disk and delivers them through `delivery` (an OutboundDelivery)."""
+        global outbound
+        outbound = delivery
+        logger.info(f"Outbound spool enabled ({len(delivery.spool)} messages pending, window: {delivery.window}).")
+
+    def attach_driver(self, driver):
+        """
+        Switches to a reattached WebDriver session (see BrowserSupervisor). The
+        fingerprint is read afresh and push detection is set up on the new page.
+        """
+        self.driver = driver
+        if self.change_detector is not None:
+            self.change_detector.reset()
+        if self.message_observer is not None:
+            try:
+                self.message_observer.stop()
+                self.enable_push_detection()
+            except Exception as e:
+                logger.exception("Failed to re-enable push detection; falling back to polling.")
+                self.message_observer = None
+
+    def start_cycle(self):
+        """Called at the start of each poll cycle."""
+        self.cycle_started = time.monotonic()
+
+    def end_cycle(self, message_count=0):
+        """Called at the end of each poll cycle with the number of messages it detected."""
+        if self.message_batcher is not None:
+            self.message_batcher.cycle_done()
+        metrics.message_detected(message_count)
+        metrics.cycle_done(time.monotonic() - self.cycle_started, message_count)
+        driver_tracing.end_cycle()
+
+    def build_message_payload(self, content, timestamp, hashed_sender_name, chat_id=None):
+        """
+        Builds the 'newMessage' event payload. Senders are hashed where messages are
+        collected (see sender_identity.hash_sender). chat_id is the chat the message
+        was read from, when known.
+        """
+        payload = {
+            "content": content,
+            "timestamp": timestamp,
+            "user_id": USER_ID,
+            "hashed_sender_name": hashed_sender_name,
+        }
+        if chat_id is not None:
+            payload["chat_id"] = chat_id
+        return payload
+
+    @traced(PHASE_EMIT)
+    def send_message_via_websocket(self, content, timestamp, hashed_sender_name, chat_id=None, detected_at=None,
+                                   message_id=None):
+        """
+        Sends the new message to the backend via WebSocket.
+        Returns the emit time, or None if the emit failed or the message was queued in a batch or the outbound spool.
+        """
         try:
-            hashed_sender_name = hash_sender_name(sender_name, PEPPER)
-            sio.emit(
-                "newMessage",
-                {
-                    "content": content,
-                    "timestamp": timestamp,
-                    "user_id": USER_ID,
-                    "hashed_sender_name": hashed_sender_name,
-                },
-                namespace="/messaging",
-            )
-            logger.info(f'Sent message via WebSocket: "{content}" at {timestamp}, Sender: {hashed_sender_name}')
+            payload = self.build_message_payload(content, timestamp, hashed_sender_name, chat_id)
+            if self.message_batcher is not None:
+                self.message_batcher.add(payload, detected_at)
+                return None
+            if outbound is not None:
+                # Delivered (and counted as emitted) once the back end acks it
+                key = message_idempotency_key(chat_id, message_id, timestamp, hashed_sender_name, content)
+                outbound.send("newMessage", payload, key, detected_at)
+                return None
+            sio.emit("newMessage", payload, namespace="/messaging")
+            logger.info(f'Sent message via WebSocket: "{content}" at {timestamp}, Sender: {payload["hashed_sender_name"]}')
+            return metrics.message_emitted(detected_at)
         except Exception as e:
+            metrics.emit_failed()
             logger.exception("Failed to send message via WebSocket.")
+            return None
 
+    def build_chat_snapshot(self, chat_id):
+        """
+        Builds the 'chatSnapshot' payload for a newly opened chat: its latest
+        CHAT_SNAPSHOT_SIZE messages with hashed senders and 'me' flags,
+        compressed (see chat_snapshot). Returns None if snapshots are disabled
+        or the messages could not be read.
+        """
+        if not CHAT_SNAPSHOT_SIZE:
+            return None
+        try:
+            messages = [
+                {
+                    'message_id': message['message_id'],
+                    'content': message['content'],
+                    'timestamp': message['timestamp'],
+                    'hashed_sender_name': hash_sender(message['sender_name']),
+                    'from_me': self.is_from_me(message['sender_name']),
+                }
+                for message in self.collect_recent_messages(CHAT_SNAPSHOT_SIZE)
+            ]
+            return build_chat_snapshot(USER_ID, chat_id, messages)
+        except Exception as e:
+            logger.exception("Failed to read the messages for a 'chatSnapshot' event.")
+            return None
+
+    @traced(PHASE_EMIT)
     def notify_chat_changed(self, new_chat_id):
-        """Notify backend of chat change."""
+        """Notify backend of chat change, followed by a 'chatSnapshot' of the new chat."""
         try:
             sio.emit("chatChanged", {"new_chat_id": new_chat_id}, namespace="/messaging")
             logger.info(f"Emitted 'chatChanged' event with new_chat_id: {new_chat_id}")
         except Exception as e:
-            logger.exception("Failed to emit 'chatChanged' event.")
\ No newline at end of file
+            logger.exception("Failed to emit 'chatChanged' event.")
+        payload = self.build_chat_snapshot(new_chat_id)
+        if payload is None:
+            return
+        try:
+            sio.emit("chatSnapshot", payload, namespace="/messaging")
+            logger.info(f"Emitted 'chatSnapshot' event with {payload['count']} messages of chat {new_chat_id}")
+        except Exception as e:
+            logger.exception("Failed to emit 'chatSnapshot' event.")
\ No newline at end of file
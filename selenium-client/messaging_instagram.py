@@ -1,21 +1,25 @@
 import time
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys  # For simulating key presses
 from selenium.common.exceptions import (
     NoSuchElementException,
     ElementNotInteractableException,
-    TimeoutException,
 )
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 import os
 import logging
 import signal
 import sys
 import urllib.parse  # For parsing URLs
 import socketio  # For WebSocket communication
+from poll_scheduler import AdaptivePollScheduler, is_tab_hidden
+from dedup_cache import DedupCache
+from sender_identity import hash_sender
+from instagram_extraction import extract_rows_after, normalize_rows
+import driver_tracing
+from fast_send import INSTAGRAM_COMPOSER_SELECTORS, send_text
+from driver_executor import serialize_driver
+from connection_supervisor import BrowserSupervisor, SocketSupervisor
+from driver_tracing import PHASE_CHAT_ID, PHASE_EXTRACTION, PHASE_SENDING, trace_if_enabled, traced
 
 # Setup Logging with INFO level for concise output
 logging.basicConfig(
@@ -27,15 +31,20 @@ logger = logging.getLogger(__name__)
 USER_ID = os.getenv("USER_ID", "pearl@easyspeak-aac.com")  # Replace with your actual user ID or email
 WEBSOCKET_SERVER_URL = os.getenv("WEBSOCKET_SERVER_URL", "http://localhost:5000")  # Replace with your backend URL
 
-# Initialize a set to keep track of seen messages to avoid duplicates
-seen_messages = set()
+# Messages already collected, per chat; bounded by DEDUP_MAX_ENTRIES / DEDUP_TTL
+seen_messages = DedupCache()
 
-# Initialize Socket.IO client
-sio = socketio.Client()
+# Initialize Socket.IO client; socket_supervisor does the reconnecting
+sio = socketio.Client(reconnection=False)
+socket_supervisor = SocketSupervisor(sio, WEBSOCKET_SERVER_URL, namespaces=["/"])
+
+# Chooses the interval between polls from chat activity and tab visibility
+poll_scheduler = None
 
 @sio.event
 def connect():
     logger.info("Connected to WebSocket server.")
+    socket_supervisor.connected()
 
 @sio.event
 def connect_error(data):
@@ -44,10 +53,12 @@ def connect_error(data):
 @sio.event
 def disconnect():
     logger.info("Disconnected from WebSocket server.")
+    socket_supervisor.disconnected()
 
 def signal_handler(sig, frame):
     logger.info("Shutting down messaging client...")
     try:
+        socket_supervisor.stop()
         sio.disconnect()
         driver.quit()
     except Exception:
@@ -68,68 +79,34 @@ def initialize_selenium():
     
     # Initialize the WebDriver
     driver = webdriver.Chrome(options=chrome_options)
-    return driver
+    # One thread owns the session: polling and sending threads queue their commands, sends first
+    serialize_driver(driver)
+    # WEBDRIVER_TRACE=1 counts and times every command by phase
+    return trace_if_enabled(driver)
 
-def extract_sender_name_instagram(message):
-    """
-    Extract the sender's name from a message element.
-    """
+@traced(PHASE_EXTRACTION)
+def collect_new_messages_instagram(driver, chat_id=None):
+    """Collect messages from the current chat that were not collected before"""
     try:
-        sender_element = message.find_element(By.XPATH, './/h5/span')
-        sender_name = sender_element.text.strip()
-        logger.info(f"Extracted sender name: {sender_name}")
-    except NoSuchElementException:
-        sender_name = "Unknown"
-        logger.info("Sender name not found; defaulting to 'Unknown'.")
-    except Exception as e:
-        logger.exception("Unexpected error while extracting sender name.")
-        sender_name = "Unknown"
-    return sender_name
-
-def extract_message_text_instagram(message):
-    """
-    Extract the message text from a message element.
-    """
-    try:
-        # This XPath finds divs with dir="auto" that are not ancestors of h5 (i.e., not the sender's name)
-        text_element = message.find_element(By.XPATH, './/div[@dir="auto" and not(ancestor::h5)]')
-        message_text = text_element.text.strip()
-        logger.info(f"Extracted message text: {message_text}")
-    except NoSuchElementException:
-        message_text = ""
-        logger.info("Message text not found.")
-    except Exception as e:
-        logger.exception("Unexpected error while extracting message text.")
-        message_text = ""
-    return message_text
-
-def collect_new_messages_instagram(driver):
-    """Collect all messages from current chat"""
-    try:
-        # Messages are within div elements with role='row'
-        message_elements = driver.find_elements(By.CSS_SELECTOR, "div[role='row']")
+        # Every row with its stable key (see ROWS_AFTER_SCRIPT), read in chunks
+        result = extract_rows_after(driver, None)
         messages = []
-        
-        for index, element in enumerate(message_elements, start=1):
-            try:
-                sender = extract_sender_name_instagram(element)
-                content = extract_message_text_instagram(element)
-                if sender != "You" and content and (sender, content) not in seen_messages:
-                    messages.append({
-                        'sender_name': sender,
-                        'content': content
-                    })
-                    seen_messages.add((sender, content))
-            except Exception as e:
-                logger.info(f"Skipped message element {index}: {str(e)}")
-                continue
 
-        
+        for row in normalize_rows(result.get('rows') or []):
+            sender = row['sender_name']
+            content = row['content']
+            # The key tells a repeated "ok" apart from the one already relayed
+            if sender != "You" and content and not seen_messages.seen(chat_id, row['key']):
+                messages.append({
+                    'sender_name': sender,
+                    'content': content
+                })
+
         logger.info(f"Collected {len(messages)} new messages.")
         print(messages)
-                
+
         return messages
-        
+
     except Exception as e:
         logger.error(f"Error collecting messages: {str(e)}")
         return []
@@ -140,6 +117,7 @@ def send_message_via_print(sender_name, content):
     """
     logger.info(f'New message received: "{content}" from {sender_name}')
 
+@traced(PHASE_CHAT_ID)
 def get_current_chat_id_instagram(driver):
     """
     Extract the chat ID from the current URL.
@@ -189,11 +167,11 @@ def process_new_messages_instagram(messages):
         
         if sender_name == "Unknown":
             # Assume it's not 'You' and send it
-            sio.emit('newMessage', {'content': content, 'user_id': USER_ID})
+            sio.emit('newMessage', {'content': content, 'user_id': USER_ID, 'hashed_sender_name': hash_sender(sender_name)})
             logger.info(f'Message from "Unknown" sent to back end via WebSocket: "{content}"')
         elif sender_name not in ['You', 'You sent']:
             # It's a message from someone else, send via WebSocket
-            sio.emit('newMessage', {'content': content, 'user_id': USER_ID})
+            sio.emit('newMessage', {'content': content, 'user_id': USER_ID, 'hashed_sender_name': hash_sender(sender_name)})
             logger.info(f'Message from "{sender_name}" sent to back end via WebSocket: "{content}"')
         else:
             # It's a message from 'You', skip
@@ -231,21 +209,17 @@ def handle_response_to_send_instagram(data):
     except Exception as e:
         logger.exception("Error handling response to send.")
 
+@traced(PHASE_SENDING)
 def send_response_to_instagram(response):
     """
     Send the response message to Instagram.
     """
     try:
-        wait = WebDriverWait(driver, 10)
-        message_input = wait.until(
-            EC.presence_of_element_located(
-                (By.XPATH, "//textarea[contains(@aria-label,'Message')]")
-            )
-        )
-        message_input.click()
-        message_input.send_keys(response)
-        message_input.send_keys(Keys.ENTER)
+        # One script call finds and focuses the composer; the text is inserted in one go
+        send_text(driver, INSTAGRAM_COMPOSER_SELECTORS, response)
         logger.info(f"Sent response to Instagram: {response}")
+        if poll_scheduler is not None:
+            poll_scheduler.record_activity()
     except NoSuchElementException:
         logger.exception("Failed to locate Instagram message input.")
     except ElementNotInteractableException:
@@ -254,31 +228,48 @@ def send_response_to_instagram(response):
         logger.exception("Failed to send response to Instagram.")
 
 def main():
-    global driver
+    global driver, poll_scheduler
     try:
         # Initialize Selenium WebDriver
         driver = initialize_selenium()
         logger.info("Selenium WebDriver initialized.")
-        
-        # Connect to WebSocket server
-        sio.connect(WEBSOCKET_SERVER_URL)
-        logger.info(f"Connected to WebSocket server at {WEBSOCKET_SERVER_URL}")
-        
+        browser_supervisor = BrowserSupervisor(initialize_selenium)
+
+        # Connect to WebSocket server in the background, reconnecting with backoff whenever it drops
+        socket_supervisor.start()
+
         # Allow some time for the page to load
         time.sleep(5)
-        
-        # Continuously collect and send messages until WebSocket connection is broken
-        while sio.connected:
-            current_chat_id = get_current_chat_id_instagram(driver)
-            if current_chat_id:
-                notify_chat_changed_instagram(current_chat_id)
-            messages = collect_new_messages_instagram(driver)
-            process_new_messages_instagram(messages)
-            time.sleep(5)  # Adjust the sleep time as needed
-        
+
+        poll_scheduler = AdaptivePollScheduler()
+
+        # Continuously collect and send messages, riding out back end and browser restarts
+        cycle_failed = False
+        while True:
+            # Reattach if Chrome (or chromedriver) went away; seen_messages carries over, so nothing is relayed twice
+            driver = browser_supervisor.ensure(driver, force=cycle_failed)
+            cycle_failed = False
+
+            # Messages are left on the page while disconnected and collected once the connection is back
+            if sio.connected and poll_scheduler.should_poll():
+                try:
+                    current_chat_id = get_current_chat_id_instagram(driver)
+                    if current_chat_id:
+                        notify_chat_changed_instagram(current_chat_id)
+                    messages = collect_new_messages_instagram(driver, current_chat_id)
+                    if messages:
+                        poll_scheduler.record_activity()
+                    process_new_messages_instagram(messages)
+                    driver_tracing.end_cycle()
+                except Exception as e:
+                    logger.exception("Error in poll cycle.")
+                    cycle_failed = True
+            time.sleep(poll_scheduler.next_interval(is_tab_hidden(driver)))
+
     except Exception as e:
         logger.exception("Error in main loop.")
     finally:
+        socket_supervisor.stop()
         if 'driver' in locals():
             driver.quit()
         if sio.connected:
@@ -3,22 +3,41 @@ import socketio  # For WebSocket communication
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys  # For simulating key presses
 from selenium.common.exceptions import (
     NoSuchElementException,
     ElementNotInteractableException,
-    TimeoutException,
 )
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 import os
 import logging
 import signal
 import sys
 import uuid
-import hmac
-import hashlib
 import urllib.parse  # For parsing URLs
+from slack_extraction import (
+    MESSAGE_SELECTOR,
+    PANE_MAIN,
+    PANE_THREAD,
+    extract_recent_messages,
+    parse_message_ts,
+    slack_change_detector,
+    take_slack_snapshot,
+)
+from watermark_store import MAIN_PANE, WatermarkStore
+from message_index import MessageIndexRegistry
+from chat_state_cache import ChatStateCache
+from chat_snapshot import CHAT_SNAPSHOT_SIZE, build_chat_snapshot
+from message_batcher import MessageBatcher
+from poll_scheduler import AdaptivePollScheduler, MAX_POLL_INTERVAL, is_tab_hidden
+from cdp_session import connect_to_driver_page
+from message_observer import MessageObserver
+from fast_send import SLACK_COMPOSER_SELECTORS, send_text
+from sender_identity import hash_sender, normalized_sender
+import driver_tracing
+from driver_executor import serialize_driver
+from driver_tracing import PHASE_CHAT_ID, PHASE_CONTEXT, PHASE_EMIT, PHASE_SENDING, trace_if_enabled, traced
+from client_metrics import metrics, start_reporting
+from outbound_spool import OUTBOUND_SPOOL_PATH, message_idempotency_key, start_outbound_delivery
+from connection_supervisor import BrowserSupervisor, SocketSupervisor
 
 # Setup Logging
 logging.basicConfig(
@@ -31,11 +50,42 @@ WEBSOCKET_SERVER_URL = os.getenv("WEBSOCKET_SERVER_URL", "http://localhost:3000"
 USER_ID = os.getenv(
     "USER_ID", "pearl@easyspeak-aac.com"
 )  # Replace with your actual user ID or email
-PEPPER = os.getenv('PEPPER', 'SuperSecretPepperValue')  # Securely store this in production
 POLL_INTERVAL = 5  # Seconds between polling requests
+SOCKETIO_SERIALIZER = os.getenv("SOCKETIO_SERIALIZER", "default")  # "default" (JSON) or "msgpack"
+BATCH_WINDOW = os.getenv("BATCH_WINDOW")  # If set, emit 'newMessages' batches (seconds; 0 = per poll cycle)
+DETECTION_MODE = os.getenv("DETECTION_MODE", "poll")  # "poll" or "push" (MutationObserver over CDP)
+PUSH_SAFETY_POLL_INTERVAL = 30  # Seconds between safety-net polls in push mode
+
+# Initialize Socket.IO client; socket_supervisor does the reconnecting
+sio = socketio.Client(serializer=SOCKETIO_SERIALIZER, reconnection=False)
+socket_supervisor = SocketSupervisor(sio, f"{WEBSOCKET_SERVER_URL}/messaging")
+
+# Coalesces messages into 'newMessages' events when BATCH_WINDOW is set
+message_batcher = None
+if BATCH_WINDOW is not None:
+    message_batcher = MessageBatcher(
+        lambda event, data: sio.emit(event, data, namespace="/messaging"), USER_ID, float(BATCH_WINDOW)
+    )
+
+# Disk-backed, ack-windowed delivery of 'newMessage' events, unless batching or OUTBOUND_SPOOL_PATH=""
+outbound = None
+
+# Processed-message watermarks, persisted across restarts
+watermark_store = None
 
-# Initialize Socket.IO client
-sio = socketio.Client()
+# Chooses the interval between polls from chat activity and tab visibility
+poll_scheduler = None
+
+# Recently seen messages per (chat, thread), so repeated lookups within a poll cycle stay in-process;
+# the main pane is thread MAIN_PANE, a thread is keyed by its parent message's ts
+message_indexes = MessageIndexRegistry()
+
+# Fingerprint of the chat at the last processed poll, so unchanged polls skip extraction
+change_detector = slack_change_detector()
+
+# Watermarks, last message from 'me', participants and DM flag of recently visited chats,
+# so switching back to one only reads what arrived since
+chat_states = ChatStateCache()
 
 # Flag to control the main loop
 running = True
@@ -44,7 +94,10 @@ def signal_handler(sig, frame):
     global running
     logger.info("Shutting down messaging client...")
     running = False
+    socket_supervisor.stop()
     sio.disconnect()
+    if watermark_store is not None:
+        watermark_store.close()
     try:
         driver.quit()
     except Exception:
@@ -56,7 +109,11 @@ signal.signal(signal.SIGTERM, signal_handler)
 
 @sio.event(namespace="/messaging")
 def connect():
+    metrics.connected()
     logger.info("Connected to WebSocket server.")
+    socket_supervisor.connected()
+    if outbound is not None:
+        outbound.connected()
 
 @sio.event(namespace="/messaging")
 def connect_error(data):
@@ -65,13 +122,20 @@ def connect_error(data):
 @sio.event(namespace="/messaging")
 def disconnect():
     logger.info("Disconnected from WebSocket server.")
+    socket_supervisor.disconnected()
+    if outbound is not None:
+        outbound.disconnected()
 
 def initialize_selenium():
     chrome_options = Options()
     chrome_options.add_experimental_option("debuggerAddress", "localhost:9222")
     driver = webdriver.Chrome(options=chrome_options)
-    return driver
+    # One thread owns the session: polling and sending threads queue their commands, sends first
+    serialize_driver(driver)
+    # WEBDRIVER_TRACE=1 counts and times every command by phase
+    return trace_if_enabled(driver)
 
+@traced(PHASE_CONTEXT)
 def is_dm(driver):
     """
     Determines if the current chat is a DM or a channel based on the aria-label attribute.
@@ -88,6 +152,7 @@ def is_dm(driver):
     except NoSuchElementException:
         return False
 
+@traced(PHASE_CONTEXT)
 def is_thread_open(driver):
     """
     Determines if a thread is open by checking for the presence of the thread pane.
@@ -102,72 +167,11 @@ def is_thread_open(driver):
     except NoSuchElementException:
         return False
 
-def derive_salt(sender_name, pepper):
-    """
-    Derives a deterministic salt based on the sender's name and a secret pepper.
-    """
-    return hmac.new(
-        key=pepper.encode('utf-8'),
-        msg=sender_name.encode('utf-8'),
-        digestmod=hashlib.sha256
-    ).digest()[:16]  # Use the first 16 bytes as the salt
-
-def hash_sender_name(sender_name, salt, pepper):
+def extract_sender_name_from_record(record):
     """
-    Hashes the sender's name using SHA-256 with a derived salt and pepper.
+    Returns the normalized sender name of a message record from extract_slack_messages.
     """
-    hasher = hashlib.sha256()
-    hasher.update(sender_name.encode('utf-8') + salt + pepper.encode('utf-8'))
-    return hasher.hexdigest()
-
-def extract_sender_name(message):
-    sender_name = "Unknown"
-
-    possible_selectors = [
-        "a.c-message__sender_link",
-        "button.c-message__sender_button",
-        "span.c-message__sender",
-        "span.offscreen[data-qa^='aria-labelledby']",
-    ]
-
-    for selector in possible_selectors:
-        try:
-            sender_element = message.find_element(By.CSS_SELECTOR, selector)
-            sender_name = sender_element.text.strip()
-            break
-        except NoSuchElementException:
-            continue
-
-    sender_name = normalize_sender_name(sender_name)
-
-    if sender_name == "Unknown":
-        logger.warning("Could not extract sender name for a message.")
-
-    return sender_name
-
-def normalize_sender_name(sender_name):
-    # Remove leading/trailing whitespace
-    sender_name = sender_name.strip()
-
-    # Convert to lowercase
-    sender_name = sender_name.lower()
-
-    # Replace multiple spaces with a single space
-    sender_name = ' '.join(sender_name.split())
-
-    # Remove zero-width spaces and other invisible characters if needed
-    # sender_name = sender_name.replace('\u200b', '')
-
-    return sender_name
-
-
-def extract_message_text(message):
-    try:
-        message_text_element = message.find_element(By.CSS_SELECTOR, "div.c-message_kit__blocks")
-        message_text = message_text_element.text.strip()
-    except NoSuchElementException:
-        message_text = ""
-    return message_text
+    return normalized_sender(record['sender_name'])
 
 def extract_timestamp(message_id):
     try:
@@ -177,220 +181,171 @@ def extract_timestamp(message_id):
         timestamp = None
     return timestamp
 
-def hash_sender_name_with_salt(sender_name):
-    # Derive the salt for this sender
-    salt = derive_salt(sender_name, PEPPER)
-    # Hash the sender's name
-    hashed_sender_name = hash_sender_name(sender_name, salt, PEPPER)
-    return hashed_sender_name
-
-def find_last_message_from_me(driver):
+def is_message_from_me(message):
     """
-    Finds the last message sent by 'me' (pearl) in Slack.
-    Returns:
-        last_message_from_me_ts_float: The timestamp (as float) of the last message sent by 'me'.
+    Checks whether a message record was sent by 'me' (pearl).
     """
-    try:
-        # Locate message elements
-        messages = driver.find_elements(By.CSS_SELECTOR, "div.c-message_kit__background")
-
-        # Go through messages from newest to oldest
-        for message in reversed(messages):
-            logger.info(f"Message: {extract_message_text(message)}")
-            # Extract sender name
-            sender_name = extract_sender_name(message)
-            logger.info(f"Sender name: {sender_name}")
-            # Check if the sender is 'me'
-            if "pearl" in sender_name.lower():
-                # Extract message ID (timestamp)
-                try:
-                    timestamp_element = message.find_element(By.CSS_SELECTOR, "a.c-timestamp")
-                    message_id = timestamp_element.get_attribute("data-ts")
-                    message_ts_float = float(message_id)
-                except (NoSuchElementException, ValueError):
-                    message_id = None
-                    message_ts_float = None
+    return "pearl" in extract_sender_name_from_record(message).lower()
 
-                logger.info(f"Found last message from 'me' with ID: {message_id}")
-                return message_ts_float
+def chat_participant(chat_state, raw_sender_name):
+    """
+    Returns (hashed_sender_name, from_me) for a sender of the chat, classified
+    once per chat and kept in its cached state.
+    """
+    participant = chat_state.participants.get(raw_sender_name)
+    if participant is None:
+        participant = (hash_sender(raw_sender_name), "pearl" in normalized_sender(raw_sender_name).lower())
+        chat_state.participants[raw_sender_name] = participant
+    return participant
+
+def index_pane(chat_state, chat_id, thread_id, messages):
+    index = message_indexes.get(chat_id, thread_id)
+    # An index dropped from the registry still knows the last message from 'me' through the chat's state
+    cached_from_me_ts = chat_state.last_from_me.get(thread_id)
+    if cached_from_me_ts is not None and (index.last_from_me_ts is None or cached_from_me_ts > index.last_from_me_ts):
+        index.last_from_me_ts = cached_from_me_ts
+    for message in messages:
+        index.add(message['message_ts_float'], message, chat_participant(chat_state, message['sender_name'])[1])
+    chat_state.record_from_me(thread_id, index.last_from_me_ts)
 
-        # If no message from 'me' is found
-        logger.info("No previous message from 'me' found.")
-        return None
+def index_snapshot(snapshot, chat_id):
+    """
+    Adds a snapshot's messages to the chat's message indexes, which track the
+    latest message from 'me' per pane across poll cycles. Each thread has its
+    own index, so reopening a thread finds it again. The chat's cached state
+    is updated along the way.
+    """
+    chat_state = chat_states.visit(chat_id)
+    chat_state.is_dm = snapshot.is_dm
+    if PANE_MAIN in snapshot.panes:
+        index_pane(chat_state, chat_id, MAIN_PANE, snapshot.main_messages)
 
-    except Exception as e:
-        logger.exception("Error finding last message from 'me'.")
-        return None
+    if PANE_THREAD in snapshot.panes and snapshot.thread_ts:
+        index_pane(chat_state, chat_id, snapshot.thread_ts, snapshot.thread_messages)
 
-def find_last_message_from_me_in_thread(driver):
+def find_last_message_from_me(driver, chat_id=None, snapshot=None, pane=MAIN_PANE):
     """
-    Finds the last message sent by 'me' (pearl) in the current thread.
+    Finds the last message sent by 'me' (pearl) in Slack's main pane, or in the
+    open thread if pane is that thread's parent ts.
+    When chat_id is given, the snapshot must already have been added with index_snapshot.
     Returns:
-        last_message_from_me_ts_float: The timestamp (as float) of the last message sent by 'me' in the thread.
+        last_message_from_me_ts_float: The timestamp (as float) of the last message sent by 'me'.
     """
     try:
-        # Locate message elements in the thread
-        messages = driver.find_elements(By.CSS_SELECTOR, "div.c-virtual_list__item--thread div.c-message_kit__background")
-
+        if snapshot is None:
+            snapshot = take_slack_snapshot(driver)
+        if chat_id is not None:
+            # The index tracks the latest message from 'me' incrementally
+            last_from_me_ts = message_indexes.get(chat_id, pane).last_from_me_ts
+            logger.info(f"Found last message from 'me' (thread: {pane or 'none'}) with ts: {last_from_me_ts}")
+            return last_from_me_ts
+
+        messages = snapshot.main_messages if pane == MAIN_PANE else snapshot.thread_messages
         # Go through messages from newest to oldest
         for message in reversed(messages):
-            # Extract sender name
-            sender_name = extract_sender_name(message)
+            if is_message_from_me(message):
+                logger.info(f"Found last message from 'me' (thread: {pane or 'none'}) with ID: {message['message_id']}")
+                return message['message_ts_float']
 
-            # Check if the sender is 'me'
-            if "pearl" in sender_name.lower():
-                # Extract message ID (timestamp)
-                try:
-                    timestamp_element = message.find_element(By.CSS_SELECTOR, "a.c-timestamp")
-                    message_id = timestamp_element.get_attribute("data-ts")
-                    message_ts_float = float(message_id)
-                except (NoSuchElementException, ValueError):
-                    message_id = None
-                    message_ts_float = None
-
-                logger.info(f"Found last message from 'me' in thread with ID: {message_id}")
-                return message_ts_float
-
-        # If no message from 'me' is found in the thread
-        logger.info("No previous message from 'me' found in thread.")
+        # If no message from 'me' is found
+        logger.info(f"No previous message from 'me' found (thread: {pane or 'none'}).")
         return None
 
     except Exception as e:
-        logger.exception("Error finding last message from 'me' in thread.")
+        logger.exception("Error finding last message from 'me'.")
         return None
 
-def collect_messages_from_elements(messages, last_message_from_me_ts_float, last_message_from_me_ts_float_in_thread=None):
+def messages_from_records(messages, after_ts_float, before_ts_float=None, detected_at=None):
     """
-    Collect messages sent after the last message from 'me' (or up to last message from 'me' in thread), based on timestamps.
+    Selects the messages to relay from message records (see extract_slack_messages),
+    oldest first: those after `after_ts_float` (all if None) and, for threads,
+    before `before_ts_float` (the last message from 'me' in the thread).
+    Messages from 'me' are skipped to prevent feedback loops.
     """
     messages_list = []
+    if detected_at is None:
+        detected_at = time.time()
 
     # Go through messages from oldest to newest
     for message in messages:
-        # Extract message ID (timestamp)
-        try:
-            timestamp_element = message.find_element(By.CSS_SELECTOR, "a.c-timestamp")
-            message_id = timestamp_element.get_attribute("data-ts")
-            message_ts_float = float(message_id)
-        except (NoSuchElementException, ValueError):
+        # Message ID (timestamp)
+        message_ts_float = message['message_ts_float']
+        if message_ts_float is not None:
+            message_id = message['message_id']
+        else:
             message_id = str(uuid.uuid4())  # Fallback to UUID if timestamp not found
-            message_ts_float = None
 
-        # For threads, stop collecting if message_ts_float >= last_message_from_me_ts_float_in_thread
-        if last_message_from_me_ts_float_in_thread is not None and message_ts_float is not None:
-            if message_ts_float >= last_message_from_me_ts_float_in_thread:
+        # For threads, stop collecting if message_ts_float >= before_ts_float
+        if before_ts_float is not None and message_ts_float is not None:
+            if message_ts_float >= before_ts_float:
                 break  # Stop collecting further messages
 
-        # For DMs, skip messages <= last_message_from_me_ts_float
-        if last_message_from_me_ts_float is not None and message_ts_float is not None:
-            if message_ts_float <= last_message_from_me_ts_float:
+        # Skip messages before or equal to after_ts_float
+        if after_ts_float is not None and message_ts_float is not None:
+            if message_ts_float <= after_ts_float:
                 continue
 
         # Extract sender name
-        sender_name = extract_sender_name(message)
+        sender_name = extract_sender_name_from_record(message)
         # Skip messages sent by 'me' to prevent feedback loops
         if "pearl" in sender_name.lower():
             continue
-        # Extract message content
-        message_text = extract_message_text(message)
-        # Extract timestamp
-        timestamp = extract_timestamp(message_id)
-        # Hash the sender's name
-        hashed_sender_name = hash_sender_name_with_salt(sender_name)
         # Add message to the list
         messages_list.append({
             'message_id': message_id,
-            'content': message_text,
-            'timestamp': timestamp,
-            'hashed_sender_name': hashed_sender_name,
+            'content': message['content'],
+            'timestamp': extract_timestamp(message_id),
+            'hashed_sender_name': hash_sender(message['sender_name']),
+            'detected_at': detected_at,
         })
 
     return messages_list
 
-def collect_messages_after(driver, last_message_from_me_ts_float):
+def snapshot_thread_id(snapshot):
+    """The pane a single-pane caller works on: the open thread's parent ts, else MAIN_PANE."""
+    return snapshot.thread_ts if snapshot.thread_open and snapshot.thread_ts else MAIN_PANE
+
+def messages_from_snapshot(snapshot, after_ts_float, chat_id=None, thread_id=None):
     """
-    Collects messages based on the current context: DM, channel, or thread.
+    Selects new messages from one pane of the snapshot: the thread `thread_id`
+    (messages up to the last message from 'me' in it), or the main DM or
+    channel pane (messages after `after_ts_float`, none if it is None).
+    Without a thread_id the open thread is used, if any.
     """
-    try:
-        # Determine context
-        in_dm = is_dm(driver)
-        thread_open = is_thread_open(driver)
-        messages_list = []
-
-        if thread_open:
-            logger.info("Thread is open. Collecting messages in thread up to last message from 'me'.")
-            # Find the last message from 'me' in the thread
-            last_message_from_me_in_thread_ts_float = find_last_message_from_me_in_thread(driver)
-
-            # Collect messages in the thread
-            messages = driver.find_elements(By.CSS_SELECTOR, "div.c-virtual_list__item--thread div.c-message_kit__background")
-
-            # Use the timestamp of the last message from 'me' in the thread
-            messages_list = collect_messages_from_elements(messages, None, last_message_from_me_in_thread_ts_float)
-        elif in_dm:
-            if last_message_from_me_ts_float is None:
-                logger.info("No previous message from 'me' found in DM. Not collecting any messages.")
-                messages_list = []
-            else:
-                logger.info("In a DM. Collecting messages sent after last message from 'me'.")
-                # Collect messages in the DM
-                messages = driver.find_elements(By.CSS_SELECTOR, "div.c-message_kit__background")
-                messages_list = collect_messages_from_elements(messages, last_message_from_me_ts_float)
-        else:
-            if last_message_from_me_ts_float is None:
-                logger.info("No previous message from 'me' found in channel. Not collecting any messages.")
-                messages_list = []
-            else:
-                logger.info("In a channel. Collecting messages sent after last message from 'me'.")
-                # Collect messages in the channel
-                messages = driver.find_elements(By.CSS_SELECTOR, "div.c-message_kit__background")
-                messages_list = collect_messages_from_elements(messages, last_message_from_me_ts_float)
-
-        return messages_list
+    if thread_id is None:
+        thread_id = snapshot_thread_id(snapshot)
+    if thread_id != MAIN_PANE:
+        logger.info("Detecting new messages in thread up to last message from 'me'.")
+        last_message_from_me_in_thread_ts_float = find_last_message_from_me(None, chat_id, snapshot, thread_id)
+        return messages_from_records(
+            snapshot.thread_messages, after_ts_float, last_message_from_me_in_thread_ts_float, snapshot.detected_at
+        )
 
-    except Exception as e:
-        logger.exception("Error collecting messages.")
+    context = "DM" if snapshot.is_dm else "channel"
+    if after_ts_float is None:
+        logger.info(f"No previous message from 'me' found in {context}. Not detecting new messages.")
         return []
+    logger.info(f"In a {context}. Detecting new messages.")
+    return messages_from_records(snapshot.main_messages, after_ts_float, detected_at=snapshot.detected_at)
 
-def detect_new_messages(driver, last_processed_ts_float):
+def detect_new_messages(driver, last_processed_ts_float, chat_id=None, snapshot=None):
     """
     Detects new messages based on the current context: DM, channel, or thread.
+    Takes a snapshot of the tab unless one from this poll cycle is passed in;
+    without one, nothing is extracted if the chat's fingerprint is unchanged.
     """
     try:
-        # Determine context
-        in_dm = is_dm(driver)
-        thread_open = is_thread_open(driver)
-        new_messages = []
-
-        if thread_open:
-            logger.info("Thread is open. Detecting new messages in thread up to last message from 'me'.")
-            # Find the last message from 'me' in the thread
-            last_message_from_me_in_thread_ts_float = find_last_message_from_me_in_thread(driver)
-
-            # Collect messages in the thread
-            messages = driver.find_elements(By.CSS_SELECTOR, "div.c-virtual_list__item--thread div.c-message_kit__background")
-
-            # Use the timestamp of the last message from 'me' in the thread
-            new_messages = detect_new_messages_from_elements(messages, last_processed_ts_float, last_message_from_me_in_thread_ts_float)
-        elif in_dm:
-            if last_processed_ts_float is None:
-                logger.info("No previous message from 'me' found in DM. Not detecting new messages.")
-                new_messages = []
-            else:
-                logger.info("In a DM. Detecting new messages.")
-                # Collect messages in the DM
-                messages = driver.find_elements(By.CSS_SELECTOR, "div.c-message_kit__background")
-                new_messages = detect_new_messages_from_elements(messages, last_processed_ts_float)
-        else:
-            if last_processed_ts_float is None:
-                logger.info("No previous message from 'me' found in channel. Not detecting new messages.")
-                new_messages = []
-            else:
-                logger.info("In a channel. Detecting new messages.")
-                # Collect messages in the channel
-                messages = driver.find_elements(By.CSS_SELECTOR, "div.c-message_kit__background")
-                new_messages = detect_new_messages_from_elements(messages, last_processed_ts_float)
-
+        if snapshot is not None:
+            return messages_from_snapshot(snapshot, last_processed_ts_float, chat_id)
+
+        # Skip extraction while the fingerprint matches the last processed poll
+        if not change_detector.changed(driver):
+            return []
+        snapshot = take_slack_snapshot(driver)
+        if chat_id is not None:
+            index_snapshot(snapshot, chat_id)
+        new_messages = messages_from_snapshot(snapshot, last_processed_ts_float, chat_id)
+        change_detector.mark_processed()
         return new_messages
 
     except Exception as e:
@@ -398,128 +353,52 @@ def detect_new_messages(driver, last_processed_ts_float):
         return []
 
 
-def detect_new_messages_from_elements(messages, last_processed_ts_float, last_message_from_me_ts_float_in_thread=None):
-    """
-    Detects new messages from given message elements after last_processed_ts_float and before last_message_from_me_ts_float_in_thread.
-    """
-    new_messages = []
-
-    # Go through messages from oldest to newest
-    for message in messages:
-        # Extract message ID (timestamp)
-        try:
-            timestamp_element = message.find_element(By.CSS_SELECTOR, "a.c-timestamp")
-            message_id = timestamp_element.get_attribute("data-ts")
-            message_ts_float = float(message_id)
-        except (NoSuchElementException, ValueError):
-            message_id = str(uuid.uuid4())  # Fallback to UUID if timestamp not found
-            message_ts_float = None
-
-        # For threads, stop collecting if message_ts_float >= last_message_from_me_ts_float_in_thread
-        if last_message_from_me_ts_float_in_thread is not None and message_ts_float is not None:
-            if message_ts_float >= last_message_from_me_ts_float_in_thread:
-                break  # Stop collecting further messages
-
-        # Skip messages before or equal to last_processed_ts_float
-        if last_processed_ts_float is not None and message_ts_float is not None:
-            if message_ts_float <= last_processed_ts_float:
-                continue
-
-        # Extract sender name
-        sender_name = extract_sender_name(message)
-        # Skip messages sent by 'me' to prevent feedback loops
-        if "pearl" in sender_name.lower():
-            continue
-        # Extract message content
-        message_text = extract_message_text(message)
-        # Extract timestamp
-        timestamp = extract_timestamp(message_id)
-        # Hash the sender's name
-        hashed_sender_name = hash_sender_name_with_salt(sender_name)
-        # Add message to the list
-        new_messages.append({
-            'message_id': message_id,
-            'content': message_text,
-            'timestamp': timestamp,
-            'hashed_sender_name': hashed_sender_name,
-        })
-
-    # Return new messages sorted by timestamp
-    new_messages.sort(key=lambda x: float(x['message_id']))
-    return new_messages
-
-
-def send_message_via_websocket(content, timestamp, hashed_sender_name):
+@traced(PHASE_EMIT)
+def send_message_via_websocket(content, timestamp, hashed_sender_name, detected_at=None, message_id=None, chat_id=None):
     """
-    Sends the new message to the back end via WebSocket.
+    Sends the new message to the back end via WebSocket. message_id and chat_id
+    make up its idempotency key when it goes through the outbound spool.
+    Returns the emit time, or None if the emit failed or the message was queued in a batch or the outbound spool.
     """
     try:
+        payload = {
+            "content": content,
+            "timestamp": timestamp,
+            "user_id": USER_ID,
+            "hashed_sender_name": hashed_sender_name,
+        }
+        if message_batcher is not None:
+            # Emitted together with the rest of this cycle's messages
+            message_batcher.add(payload, detected_at)
+            return None
+        if outbound is not None:
+            # Spooled on disk; delivered (and counted as emitted) once the back end acks it
+            key = message_idempotency_key(chat_id, message_id, timestamp, hashed_sender_name, content)
+            outbound.send("newMessage", payload, key, detected_at)
+            return None
+
         # Send the content, timestamp, and hashed sender's name
-        sio.emit(
-            "newMessage",
-            {
-                "content": content,
-                "timestamp": timestamp,
-                "user_id": USER_ID,
-                "hashed_sender_name": hashed_sender_name,
-            },
-            namespace="/messaging",
-        )
+        sio.emit("newMessage", payload, namespace="/messaging")
         logger.info(f'Sent message via WebSocket: "{content}" at {timestamp}')
+        return metrics.message_emitted(detected_at)
     except Exception as e:
+        metrics.emit_failed()
         logger.exception("Failed to send message via WebSocket.")
+        return None
 
+@traced(PHASE_SENDING)
 def send_response_to_slack(response):
     """
     Uses Selenium to send the selected response to Slack.
     """
     try:
-        # Wait for the message input to be available
-        wait = WebDriverWait(driver, 10)
-
-        # Check if a thread is open by looking for the thread input box
-        try:
-            # Locate the thread input box
-            message_input = wait.until(
-                EC.presence_of_element_located(
-                    (
-                        By.CSS_SELECTOR,
-                        'div.p-threads_footer__input div[data-qa="message_input"] div.ql-editor',
-                    )
-                )
-            )
-            logger.info("Thread input box found. Sending response to thread.")
-        except (TimeoutException, NoSuchElementException):
-            # If thread input box is not found, use the main message input box
-            message_input = wait.until(
-                EC.presence_of_element_located(
-                    (
-                        By.CSS_SELECTOR,
-                        'div[data-qa="message_input"] div.ql-editor',
-                    )
-                )
-            )
-            logger.info("Thread input box not found. Sending response to main chat.")
-
-        # Click to focus
-        message_input.click()
-
-        # Type the response
-        message_input.send_keys(response)
-
-        # Manually trigger input events (if necessary)
-        driver.execute_script(
-            "arguments[0].dispatchEvent(new Event('input', { bubbles: true }));", message_input
-        )
-        driver.execute_script(
-            "arguments[0].dispatchEvent(new Event('keyup', { bubbles: true }));", message_input
-        )
-
-        # Wait a moment for the input to be processed
-        time.sleep(0.5)
-
-        # Simulate pressing Enter to send the message
-        message_input.send_keys(Keys.ENTER)
+        # Focus the thread input box if a thread is open, else the main one, in a single
+        # script call; the response is inserted in one go and sent once Slack has accepted it
+        composer = send_text(driver, SLACK_COMPOSER_SELECTORS, response)
+        if composer == 0:
+            logger.info("Thread input box found. Sent response to thread.")
+        else:
+            logger.info("Thread input box not found. Sent response to main chat.")
 
         logger.info(f"Sent response to Slack: {response}")
 
@@ -536,9 +415,12 @@ def on_send_selected_response(data):
     if selected_response:
         logger.info(f"Received selected response: {selected_response}")
         send_response_to_slack(selected_response)
+        if poll_scheduler is not None:
+            poll_scheduler.record_activity()
     else:
         logger.error("Received sendSelectedResponse event without selected_response")
 
+@traced(PHASE_CHAT_ID)
 def get_current_chat_id(driver):
     """
     Returns a unique identifier for the current chat, based on the URL.
@@ -564,6 +446,7 @@ def get_current_chat_id(driver):
         logger.exception("Error getting current chat ID.")
         return None
 
+@traced(PHASE_EMIT)
 def notify_chat_changed(new_chat_id):
     """
     Emits a 'chatChanged' event to the back-end via WebSocket.
@@ -581,124 +464,253 @@ def notify_chat_changed(new_chat_id):
     except Exception as e:
         logger.exception("Failed to emit 'chatChanged' event.")
 
-def messaging_client():
-    global driver
-
-    # Connect to WebSocket server
+def recent_chat_messages(driver, snapshot, chat_id, count):
+    """
+    The latest `count` main pane message records of the chat, oldest first:
+    from the snapshot if it read the whole pane, else from the chat's message
+    index, or, if that holds fewer, with one extraction call.
+    """
+    if snapshot.after_ts is None and PANE_MAIN in snapshot.panes:
+        return snapshot.main_messages[-count:]
+    indexed = message_indexes.get(chat_id, MAIN_PANE).messages()
+    if len(indexed) >= count:
+        return indexed[-count:]
+    return extract_recent_messages(driver, count)
+
+@traced(PHASE_EMIT)
+def send_chat_snapshot(driver, snapshot, chat_id):
+    """
+    Emits a 'chatSnapshot' event with the latest CHAT_SNAPSHOT_SIZE messages of
+    a newly opened chat, with hashed senders and 'me' flags, compressed (see
+    chat_snapshot), so the back end can prime its context in one event.
+    """
+    if not CHAT_SNAPSHOT_SIZE:
+        return
     try:
-        sio.connect(f"{WEBSOCKET_SERVER_URL}/messaging", namespaces=["/messaging"])
-        logger.info(f"Connecting to WebSocket server: {WEBSOCKET_SERVER_URL}/messaging")
+        chat_state = chat_states.visit(chat_id)
+        messages = []
+        for record in recent_chat_messages(driver, snapshot, chat_id, CHAT_SNAPSHOT_SIZE):
+            hashed_sender_name, from_me = chat_participant(chat_state, record['sender_name'])
+            message_ts_float = record['message_ts_float']
+            messages.append({
+                'message_id': record['message_id'],
+                'content': record['content'],
+                'timestamp': int(message_ts_float * 1000) if message_ts_float is not None else None,
+                'hashed_sender_name': hashed_sender_name,
+                'from_me': from_me,
+            })
+        payload = build_chat_snapshot(USER_ID, chat_id, messages, snapshot.is_dm)
+        sio.emit("chatSnapshot", payload, namespace="/messaging")
+        logger.info(f"Emitted 'chatSnapshot' event with {len(messages)} messages of chat {chat_id}")
     except Exception as e:
-        logger.exception("Failed to connect to WebSocket server.")
-        sys.exit(1)
+        logger.exception("Failed to emit 'chatSnapshot' event.")
+
+def snapshot_panes(snapshot):
+    """The (watermark) thread ids of the panes the snapshot holds: MAIN_PANE and the open thread's parent ts."""
+    thread_ids = []
+    if PANE_MAIN in snapshot.panes:
+        thread_ids.append(MAIN_PANE)
+    if PANE_THREAD in snapshot.panes and snapshot.thread_open and snapshot.thread_ts:
+        thread_ids.append(snapshot.thread_ts)
+    return thread_ids
+
+def detect_pane_messages(snapshot, chat_id, thread_id):
+    """
+    Detects new messages in one pane of the chat against that pane's own
+    watermark, keyed by (chat_id, thread_id). A pane without a stored watermark
+    starts at the last message from 'me' (in a thread: collecting up to it).
+    Returns:
+        (last_processed_ts_float, new_messages)
+    """
+    stored_ts_float = watermark_store.get(chat_id, thread_id)
+    if stored_ts_float is not None:
+        last_processed_ts_float = stored_ts_float
+        new_messages = messages_from_snapshot(snapshot, stored_ts_float, chat_id, thread_id)
+    else:
+        logger.info(f"No watermark for chat {chat_id} (thread: {thread_id or 'none'}); starting at the last message from 'me'.")
+        last_processed_ts_float = find_last_message_from_me(None, chat_id, snapshot, thread_id)
+        after_ts_float = last_processed_ts_float if thread_id == MAIN_PANE else None
+        new_messages = messages_from_snapshot(snapshot, after_ts_float, chat_id, thread_id)
+
+    for message in new_messages:
+        message_ts_float = parse_message_ts(message['message_id'])
+        if message_ts_float is not None and (last_processed_ts_float is None or message_ts_float > last_processed_ts_float):
+            last_processed_ts_float = message_ts_float
+    return last_processed_ts_float, new_messages
+
+def relay_snapshot(snapshot, chat_id):
+    """
+    Relays the new messages of every pane the snapshot holds, each pane against
+    its own watermark, so opening, closing or switching threads only scans and
+    relays what is new in the pane that changed.
+    Returns the number of messages relayed.
+    """
+    relayed = 0
+    chat_state = chat_states.visit(chat_id)
+    for thread_id in snapshot_panes(snapshot):
+        last_processed_ts_float, new_messages = detect_pane_messages(snapshot, chat_id, thread_id)
+        for message in new_messages:
+            logger.info(
+                f'New message detected: "{message["content"]}" at {message["timestamp"]} '
+                f'(ID: {message["message_id"]}, thread: {thread_id or "none"})'
+            )
+            # Send the message to the back end via WebSocket
+            message['emitted_at'] = send_message_via_websocket(
+                message['content'], message['timestamp'], message['hashed_sender_name'],
+                message.get('detected_at'), message['message_id'], chat_id,
+            )
+        watermark_store.set(chat_id, last_processed_ts_float, thread_id)
+        chat_state.record_watermark(thread_id, last_processed_ts_float)
+        relayed += len(new_messages)
+    return relayed
+
+def take_cycle_snapshot(driver, panes, previous_chat_id):
+    """
+    Snapshots the panes that changed. When the chat changed to one with warm
+    cached state, only the messages after its watermark are read.
+    """
+    chat_id = change_detector.pending_chat_id()
+    chat_state = None
+    if chat_id is not None and chat_id != previous_chat_id:
+        chat_state = chat_states.get(chat_id)
+    if chat_state is None or chat_state.watermark is None:
+        return take_slack_snapshot(driver, panes=panes)
+
+    logger.info(f"Returning to chat {chat_id}; reading messages after {chat_state.watermark}.")
+    snapshot = take_slack_snapshot(driver, panes=panes, after_ts=chat_state.watermark)
+    if snapshot.chat_id != chat_id:
+        # The chat changed again since the fingerprint was read
+        snapshot = take_slack_snapshot(driver, panes=panes)
+    return snapshot
+
+def poll_chat(driver, previous_chat_id):
+    """
+    Detection for one poll cycle: reads the chat's fingerprint and, when a pane
+    changed, snapshots it and relays its new messages, notifying the back end
+    first if the chat changed.
+    Returns:
+        (current_chat_id, number of messages relayed)
+    """
+    # Idle polls stop at one cheap fingerprint read; the cycle only runs when something changed
+    changed_panes = change_detector.changed_panes() if change_detector.changed(driver) else None
+    if changed_panes == set():
+        # Closing a thread changes nothing to relay
+        change_detector.mark_processed()
+        return previous_chat_id, 0
+    if not changed_panes:
+        return previous_chat_id, 0
+
+    # One round trip reads the chat ID, thread state and the messages of the panes that changed
+    snapshot = take_cycle_snapshot(driver, changed_panes, previous_chat_id)
+    current_chat_id = snapshot.chat_id
+
+    # Opening, closing or switching a thread only touches that thread's own watermark
+    index_snapshot(snapshot, current_chat_id)
+
+    if current_chat_id != previous_chat_id:
+        logger.info(f"Chat changed to {current_chat_id}.")
+        # Emit the 'chatChanged' event to notify the back-end, with the chat's latest messages as context
+        notify_chat_changed(current_chat_id)
+        send_chat_snapshot(driver, snapshot, current_chat_id)
+        if poll_scheduler is not None:
+            poll_scheduler.record_activity()
+
+    message_count = relay_snapshot(snapshot, current_chat_id)
+    if not message_count:
+        logger.debug("No new messages detected.")
+    change_detector.mark_processed()
+    return current_chat_id, message_count
+
+def messaging_client():
+    global driver, watermark_store, poll_scheduler, outbound
+
+    # Started before connecting, so the connect handler flushes what an earlier run left behind
+    if message_batcher is None and OUTBOUND_SPOOL_PATH:
+        outbound = start_outbound_delivery(sio, USER_ID)
+
+    # Connect to WebSocket server in the background, retrying with backoff until it is reachable
+    socket_supervisor.start()
+
+    # Prometheus endpoint (METRICS_PORT) and periodic 'clientStats' events
+    start_reporting(sio, USER_ID)
 
     # Initialize Selenium WebDriver
     driver = initialize_selenium()
     logger.info("Selenium WebDriver initialized and connected to Chrome.")
+    browser_supervisor = BrowserSupervisor(initialize_selenium)
 
-    # Get initial chat ID and thread state
-    previous_chat_id = get_current_chat_id(driver)
-    previous_thread_open = is_thread_open(driver)
-
-    # Initialize last_message_from_me_ts_float and last_processed_ts_float
-    last_message_from_me_ts_float = find_last_message_from_me(driver)
-    last_processed_ts_float = last_message_from_me_ts_float
-
-    # Collect messages after last message from 'me'
-    if previous_thread_open:
-        # For thread, find last message from 'me' in thread
-        last_message_from_me_in_thread_ts_float = find_last_message_from_me_in_thread(driver)
-        messages_to_process = collect_messages_after(driver, None)
-        # Update last_processed_ts_float
-        if messages_to_process:
-            last_processed_ts_float = float(messages_to_process[-1]['message_id'])
-    else:
-        messages_to_process = collect_messages_after(driver, last_message_from_me_ts_float)
-        # Update last_processed_ts_float
-        if messages_to_process:
-            last_processed_ts_float = float(messages_to_process[-1]['message_id'])
-
-    # Process messages
-    for message in messages_to_process:
-        message_id = message['message_id']
-        content = message['content']
-        timestamp = message['timestamp']
-        hashed_sender_name = message['hashed_sender_name']
-
-        logger.info(f'Processing message: "{content}" at {timestamp} (ID: {message_id}) from {hashed_sender_name}')
-        # Send the message to the back end via WebSocket
-        send_message_via_websocket(content, timestamp, hashed_sender_name)
+    watermark_store = WatermarkStore()
 
-    # Main loop
-    while running:
+    # Optionally wake up on new message nodes instead of polling on a fixed interval
+    message_observer = None
+    poll_interval = POLL_INTERVAL
+    if DETECTION_MODE == "push":
         try:
-            # Check current chat ID and thread state
-            current_chat_id = get_current_chat_id(driver)
-            current_thread_open = is_thread_open(driver)
-
-            # If chat ID or thread state has changed, reset state
-            if current_chat_id != previous_chat_id or current_thread_open != previous_thread_open:
-                logger.info(f"Chat or thread state changed. Resetting state.")
-                previous_chat_id = current_chat_id
-
-                # Emit the 'chatChanged' event to notify the back-end
-                notify_chat_changed(current_chat_id)
-
-                # Reset state variables
-                last_message_from_me_ts_float = find_last_message_from_me(driver)
-                last_processed_ts_float = last_message_from_me_ts_float
-
-                # Collect messages after last message from 'me'
-                if current_thread_open:
-                    last_message_from_me_in_thread_ts_float = find_last_message_from_me_in_thread(driver)
-                    messages_to_process = collect_messages_after(driver, None)
-                    # Update last_processed_ts_float
-                    if messages_to_process:
-                        last_processed_ts_float = float(messages_to_process[-1]['message_id'])
-                else:
-                    messages_to_process = collect_messages_after(driver, last_message_from_me_ts_float)
-                    # Update last_processed_ts_float
-                    if messages_to_process:
-                        last_processed_ts_float = float(messages_to_process[-1]['message_id'])
-
-                # Process messages
-                for message in messages_to_process:
-                    message_id = message['message_id']
-                    content = message['content']
-                    timestamp = message['timestamp']
-                    hashed_sender_name = message['hashed_sender_name']
-
-                    logger.info(f'Processing message: "{content}" at {timestamp} (ID: {message_id})')
-                    # Send the message to the back end via WebSocket
-                    send_message_via_websocket(content, timestamp, hashed_sender_name)
-            else:
-                # Detect new messages after last_processed_ts_float
-                new_messages = detect_new_messages(driver, last_processed_ts_float)
-                if new_messages:
-                    for message in new_messages:
-                        message_id = message['message_id']
-                        content = message['content']
-                        timestamp = message['timestamp']
-                        hashed_sender_name = message['hashed_sender_name']
+            message_observer = MessageObserver(connect_to_driver_page(driver), MESSAGE_SELECTOR)
+            message_observer.start()
+            poll_interval = PUSH_SAFETY_POLL_INTERVAL
+        except Exception as e:
+            logger.exception("Failed to enable push detection; falling back to polling.")
+            message_observer = None
 
-                        logger.info(f'New message detected: "{content}" at {timestamp} (ID: {message_id})')
+    # poll_interval is the settled rate; activity shortens it and idleness backs it off
+    poll_scheduler = AdaptivePollScheduler(base_interval=poll_interval, max_interval=max(MAX_POLL_INTERVAL, poll_interval))
 
-                        # Send the message to the back end via WebSocket
-                        send_message_via_websocket(content, timestamp, hashed_sender_name)
+    # Get initial chat ID, thread state and messages in one snapshot
+    snapshot = take_slack_snapshot(driver)
+    previous_chat_id = snapshot.chat_id
+    index_snapshot(snapshot, previous_chat_id)
 
-                        # Update the last_processed_ts_float
-                        last_processed_ts_float = float(message_id)
-                else:
-                    logger.debug("No new messages detected.")
+    # Each pane (main, and the open thread) resumes from its stored watermark, or after the last message from 'me'
+    relay_snapshot(snapshot, previous_chat_id)
+    if message_batcher is not None:
+        message_batcher.cycle_done()
+
+    # Main loop
+    cycle_failed = False
+    while running:
+        # Reattach if Chrome (or chromedriver) went away; the loop state and watermark carry over, so no rescan
+        new_driver = browser_supervisor.ensure(driver, force=cycle_failed)
+        if new_driver is not driver:
+            driver = new_driver
+            change_detector.reset()
+            if message_observer is not None:
+                try:
+                    message_observer.stop()
+                    message_observer = MessageObserver(connect_to_driver_page(driver), MESSAGE_SELECTOR)
+                    message_observer.start()
+                except Exception as e:
+                    logger.exception("Failed to re-enable push detection; falling back to polling.")
+                    message_observer = None
+        cycle_failed = False
 
-            # Update previous_thread_open
-            previous_thread_open = current_thread_open
+        try:
+            # While the tab is hidden the scheduler pauses scanning and only re-checks visibility
+            if poll_scheduler.should_poll():
+                cycle_started = time.monotonic()
+                previous_chat_id, cycle_message_count = poll_chat(driver, previous_chat_id)
+                if cycle_message_count:
+                    poll_scheduler.record_activity()
+
+                # Commit watermark updates in batches
+                watermark_store.flush_if_due()
+                if message_batcher is not None:
+                    message_batcher.cycle_done()
+                metrics.message_detected(cycle_message_count)
+                metrics.cycle_done(time.monotonic() - cycle_started, cycle_message_count)
+                driver_tracing.end_cycle()
 
         except Exception as e:
             logger.exception("Error in main loop.")
+            cycle_failed = True
 
-        # Poll every POLL_INTERVAL seconds
-        time.sleep(POLL_INTERVAL)
+        # Wait for the scheduler's interval, waking early if the observer reports new messages
+        interval = poll_scheduler.next_interval(is_tab_hidden(driver))
+        metrics.set_gauge('poll_interval_seconds', interval)
+        if message_observer is not None:
+            message_observer.wait(interval)
+        else:
+            time.sleep(interval)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,260 @@
+import logging
+import os
+import threading
+import time
+import urllib.parse
+
+from cdp_session import DEBUGGER_ADDRESS, connect_to_browser, connect_to_target, evaluate_function
+from instagram_client import InstagramClient
+from instagram_extraction import ME_SENDERS, InstagramCursor, instagram_change_detector
+from poll_scheduler import AdaptivePollScheduler
+from sender_identity import hash_sender
+from slack_client import SlackClient
+from slack_extraction import (
+    EXTRACT_MESSAGES_SCRIPT,
+    MESSAGE_SELECTOR,
+    SENDER_SELECTORS,
+    parse_message_ts,
+    slack_change_detector,
+)
+from watermark_store import MAIN_PANE
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated Slack channel / Instagram thread URLs to monitor in background tabs
+MONITORED_CHAT_URLS = [url.strip() for url in os.getenv("MONITORED_CHAT_URLS", "").split(",") if url.strip()]
+
+
+def platform_for_url(url):
+    host = urllib.parse.urlparse(url).netloc
+    if host.endswith("slack.com"):
+        return "slack"
+    if host.endswith("instagram.com"):
+        return "instagram"
+    raise ValueError(f"Unsupported chat URL: {url}")
+
+
+class SessionScripts:
+    """
+    Runs WebDriver-style scripts over a background tab's CDP session, so
+    readers written against driver.execute_script (e.g. InstagramCursor) work there too.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    def execute_script(self, script, *args):
+        return evaluate_function(self.session, script, *args)
+
+
+class MonitoredChat:
+    """One chat kept open in a dedicated background tab (CDP target)."""
+
+    def __init__(self, url, target_id, session):
+        self.url = url
+        self.platform = platform_for_url(url)
+        self.target_id = target_id
+        self.session = session
+        if self.platform == "slack":
+            self.chat_id = SlackClient.chat_id_from_url(url)
+            self.change_detector = slack_change_detector()
+        else:
+            self.chat_id = InstagramClient.chat_id_from_url(url)
+            self.change_detector = instagram_change_detector()
+        self.last_processed_ts_float = None
+        # Instagram rows carry no id; the cursor tracks position by row key, like InstagramClient
+        self.cursor = InstagramCursor(max_chats=1) if self.platform == "instagram" else None
+
+
+class MultiChatMonitor:
+    """
+    Relays messages from a configured set of chats that are not the one the
+    user has open. Each chat lives in a background tab that is scanned over its
+    own CDP session with its own watermark, under one shared scheduler. The
+    chat open in the foreground tab (see set_foreground_chat) is left to the
+    foreground loop.
+
+    Chrome only keeps background tabs' timers fully live when started with
+    --disable-background-timer-throttling --disable-renderer-backgrounding
+    --disable-backgrounding-occluded-windows (see README); each tab is also
+    kept in the 'active' lifecycle state with focus emulation.
+    """
+
+    def __init__(self, urls, on_message, watermark_store=None, scheduler=None, debugger_address=DEBUGGER_ADDRESS):
+        self.urls = urls
+        self.on_message = on_message
+        self.watermark_store = watermark_store
+        self.scheduler = scheduler or AdaptivePollScheduler()
+        self.debugger_address = debugger_address
+        self.chats = []
+        self.foreground_chat_id = None
+        self.browser = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Opens a background tab per configured chat and starts scanning them on a thread."""
+        self.browser = connect_to_browser(self.debugger_address)
+        for url in self.urls:
+            try:
+                self.chats.append(self._open_chat(url))
+            except Exception as e:
+                logger.exception(f"Failed to open monitored chat: {url}")
+        self._thread = threading.Thread(target=self._run, name="multi-chat-monitor", daemon=True)
+        self._thread.start()
+        logger.info(f"Monitoring {len(self.chats)} chats in background tabs.")
+
+    def stop(self):
+        self._stop.set()
+        for chat in self.chats:
+            chat.session.close()
+            try:
+                self.browser.send("Target.closeTarget", {'targetId': chat.target_id})
+            except Exception:
+                logger.exception(f"Failed to close background tab for {chat.url}")
+        if self.browser is not None:
+            self.browser.close()
+
+    def set_foreground_chat(self, chat_id):
+        """Records the chat open in the foreground tab; the foreground loop relays its messages."""
+        self.foreground_chat_id = chat_id
+
+    def _open_chat(self, url):
+        target_id = self.browser.send("Target.createTarget", {'url': url, 'background': True})['targetId']
+        session = connect_to_target(target_id, self.debugger_address)
+        # Keep the background tab's page alive and behaving as if it had focus
+        session.send("Page.enable")
+        session.send("Page.setWebLifecycleState", {'state': 'active'})
+        session.send("Emulation.setFocusEmulationEnabled", {'enabled': True})
+        chat = MonitoredChat(url, target_id, session)
+        if self.watermark_store is not None:
+            chat.last_processed_ts_float = self.watermark_store.get(chat.chat_id, MAIN_PANE)
+        logger.info(f"Opened background tab for {chat.platform} chat {chat.chat_id}.")
+        return chat
+
+    def _reopen(self, chat):
+        """
+        Opens a new background tab for a chat whose CDP session died, e.g. after
+        Chrome restarted, reconnecting to the browser first if that connection
+        is gone too. Position in the chat carries over. Returns the new chat.
+        """
+        chat.session.close()
+        if self.browser is None or not self.browser.connected:
+            self.browser = connect_to_browser(self.debugger_address)
+        else:
+            try:
+                self.browser.send("Target.closeTarget", {'targetId': chat.target_id})
+            except Exception:
+                logger.debug(f"Background tab for {chat.url} is already gone.")
+        reopened = self._open_chat(chat.url)
+        reopened.cursor = chat.cursor
+        if chat.last_processed_ts_float is not None:
+            reopened.last_processed_ts_float = max(reopened.last_processed_ts_float or 0, chat.last_processed_ts_float)
+        return reopened
+
+    def _run(self):
+        while not self._stop.is_set():
+            found_messages = False
+            for i, chat in enumerate(self.chats):
+                if not chat.session.connected:
+                    try:
+                        chat = self.chats[i] = self._reopen(chat)
+                    except Exception as e:
+                        logger.warning(f"Reopening monitored chat {chat.chat_id} failed ({e}); retrying next cycle.")
+                        continue
+                try:
+                    messages = self.scan(chat)
+                except Exception as e:
+                    logger.exception(f"Error scanning monitored chat {chat.chat_id}.")
+                    continue
+                for message in messages:
+                    found_messages = True
+                    self.on_message(chat.chat_id, message)
+
+            if found_messages:
+                self.scheduler.record_activity()
+            if self.watermark_store is not None:
+                self.watermark_store.flush_if_due()
+            # Background tabs are never 'visible', so visibility does not pause this loop
+            self._stop.wait(self.scheduler.next_interval())
+
+    def scan(self, chat):
+        """
+        Returns the new messages in a monitored chat, oldest first. Idle chats
+        cost one fingerprint read, as in the foreground loop.
+        """
+        in_foreground = chat.chat_id == self.foreground_chat_id
+        if in_foreground and chat.platform == "slack":
+            # The foreground loop relays it and keeps its watermark in the shared store
+            return []
+        if not chat.change_detector.changed(SessionScripts(chat.session)):
+            return []
+        if chat.platform == "slack":
+            messages = self._scan_slack(chat)
+        else:
+            messages = self._scan_instagram(chat)
+            if in_foreground:
+                # Rows have no ts to share through the store; the cursor keeps up without relaying
+                messages = []
+        chat.change_detector.mark_processed()
+        return messages
+
+    def _scan_slack(self, chat):
+        if self.watermark_store is not None:
+            # Advanced by the foreground loop while the chat was open there
+            stored_ts_float = self.watermark_store.get(chat.chat_id, MAIN_PANE)
+            if stored_ts_float is not None and stored_ts_float > (chat.last_processed_ts_float or 0):
+                chat.last_processed_ts_float = stored_ts_float
+        records = evaluate_function(chat.session, EXTRACT_MESSAGES_SCRIPT, MESSAGE_SELECTOR, SENDER_SELECTORS) or []
+        detected_at = time.time()
+        messages = []
+        for record in records:
+            ts_float = parse_message_ts(record.get('message_id'))
+            if ts_float is None:
+                continue
+            sender_name = (record.get('sender_name') or "Unknown").strip()
+            messages.append((ts_float, record['message_id'], sender_name, (record.get('content') or "").strip()))
+
+        if chat.last_processed_ts_float is None:
+            # First visit: start after the last message from 'me', like the foreground client
+            from_me = [ts for ts, _, sender, _ in messages if "pearl" in sender.lower()]
+            if not from_me:
+                if messages:
+                    chat.last_processed_ts_float = messages[-1][0]
+                return []
+            chat.last_processed_ts_float = from_me[-1]
+
+        new_messages = []
+        for ts_float, message_id, sender_name, content in messages:
+            if ts_float <= chat.last_processed_ts_float:
+                continue
+            chat.last_processed_ts_float = ts_float
+            if "pearl" in sender_name.lower():
+                continue
+            new_messages.append({
+                'message_id': message_id,
+                'content': content,
+                'timestamp': ts_float,
+                'hashed_sender_name': hash_sender(sender_name),
+                'detected_at': detected_at,
+            })
+
+        if self.watermark_store is not None:
+            self.watermark_store.set(chat.chat_id, chat.last_processed_ts_float, MAIN_PANE)
+        return new_messages
+
+    def _scan_instagram(self, chat):
+        # Keyed rows (see ROWS_AFTER_SCRIPT): a repeated "ok" is a new row, not the anchor again
+        rows = chat.cursor.new_rows(SessionScripts(chat.session))
+        detected_at = time.time()
+        return [
+            {
+                'message_id': row['key'],
+                'content': row['content'],
+                'timestamp': row['timestamp'] if row['timestamp'] is not None else detected_at,
+                'hashed_sender_name': hash_sender(row['sender_name']),
+                'detected_at': detected_at,
+            }
+            for row in rows
+            if row['content'] and row['sender_name'] not in ME_SENDERS
+        ]
@@ -0,0 +1,325 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from client_metrics import metrics
+from watermark_store import WATERMARK_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_SPOOL_PATH = os.getenv(
+    "OUTBOUND_SPOOL_PATH", os.path.join(os.path.dirname(os.path.abspath(WATERMARK_DB_PATH)), "outbound.db")
+)  # Next to the watermark store by default; empty: emit directly, without a spool
+OUTBOUND_WINDOW = int(os.getenv("OUTBOUND_WINDOW", "16"))  # Emits awaiting an ack at once
+OUTBOUND_ACK_TIMEOUT = float(os.getenv("OUTBOUND_ACK_TIMEOUT", "10"))  # Seconds before an unacked emit is resent
+OUTBOUND_REQUIRE_ACK = os.getenv("OUTBOUND_REQUIRE_ACK", "0") == "1"  # 1 once the back end acks; 0: delivered once emit() returns
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "10"))  # Emits before a message is moved to the dead letters
+BULK_BATCH_SIZE = 50  # Messages per 'newMessages' event when flushing a backlog
+
+
+def idempotency_key(chat_id, message_id, content=None):
+    """
+    Key the back end can use to drop redelivered messages: the chat and
+    message_id, or a hash of the content when there is no message_id.
+    """
+    if message_id is None:
+        message_id = "content:" + hashlib.sha256((content or "").encode('utf-8')).hexdigest()[:16]
+    return f"{chat_id or ''}:{message_id}"
+
+
+def message_idempotency_key(chat_id, message_id, timestamp, hashed_sender_name, content):
+    """idempotency_key for a 'newMessage'; without a message_id its timestamp, sender and content are hashed."""
+    return idempotency_key(chat_id, message_id, f"{timestamp}|{hashed_sender_name}|{content}")
+
+
+class OutboundSpool:
+    """
+    Disk-backed queue of outbound events (sqlite, like the watermark store),
+    so messages detected while the back end is down or slow survive until
+    they are acknowledged, across restarts too.
+    """
+
+    def __init__(self, path=OUTBOUND_SPOOL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS outbound ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " idempotency_key TEXT NOT NULL UNIQUE,"
+            " event TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " detected_at REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL)"
+        )
+        # Messages that were never acked after max_attempts emits, kept for inspection
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS outbound_dead ("
+            " id INTEGER PRIMARY KEY,"
+            " idempotency_key TEXT NOT NULL,"
+            " event TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " detected_at REAL,"
+            " attempts INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " failed_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+        logger.info(f"Opened outbound spool at {path}")
+
+    def add(self, event, payload, key, detected_at=None):
+        """Queues an event; returns False if one with the same idempotency key is already queued."""
+        payload = dict(payload, idempotency_key=key)
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO outbound (idempotency_key, event, payload, detected_at, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, event, json.dumps(payload), detected_at, time.time()),
+            )
+            self._connection.commit()
+            return cursor.rowcount > 0
+
+    def pending(self, limit, exclude=()):
+        """Oldest queued entries as (id, event, payload, detected_at), skipping ids in `exclude`."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, event, payload, detected_at FROM outbound ORDER BY id LIMIT ?",
+                (limit + len(exclude),),
+            ).fetchall()
+        return [
+            (entry_id, event, json.loads(payload), detected_at)
+            for entry_id, event, payload, detected_at in rows
+            if entry_id not in exclude
+        ][:limit]
+
+    def mark_attempted(self, entry_ids):
+        with self._lock:
+            self._connection.executemany("UPDATE outbound SET attempts = attempts + 1 WHERE id = ?", [(i,) for i in entry_ids])
+            self._connection.commit()
+
+    def remove(self, entry_ids):
+        with self._lock:
+            self._connection.executemany("DELETE FROM outbound WHERE id = ?", [(i,) for i in entry_ids])
+            self._connection.commit()
+
+    def dead_letter(self, entry_ids, max_attempts):
+        """
+        Moves the entries among `entry_ids` that were emitted `max_attempts`
+        times or more to the dead letters. Returns their idempotency keys.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT id, idempotency_key FROM outbound WHERE attempts >= ? AND id IN ({','.join('?' * len(entry_ids))})",
+                (max_attempts, *entry_ids),
+            ).fetchall() if entry_ids else []
+            if not rows:
+                return []
+            dead_ids = [(entry_id,) for entry_id, _ in rows]
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO outbound_dead"
+                    " (id, idempotency_key, event, payload, detected_at, attempts, created_at, failed_at)"
+                    " SELECT id, idempotency_key, event, payload, detected_at, attempts, created_at, ?"
+                    " FROM outbound WHERE id = ?",
+                    [(time.time(), entry_id) for (entry_id,) in dead_ids],
+                )
+                self._connection.executemany("DELETE FROM outbound WHERE id = ?", dead_ids)
+            return [key for _, key in rows]
+
+    def dead_letter_count(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM outbound_dead").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM outbound").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class OutboundDelivery:
+    """
+    Delivers spooled events over Socket.IO with up to `window` emits awaiting
+    an ack at once, so a slow back end is pipelined instead of blocking each
+    message. An event leaves the spool when the server acks it (or, with
+    require_ack off, once emit() returns); unacked emits are resent after
+    ack_timeout, up to max_attempts emits in all, after which the event is
+    moved to the spool's dead letters. When more is pending than the window
+    has room for, e.g. the backlog after a reconnect, it is flushed in
+    'newMessages' batches. Every payload carries its idempotency_key, so
+    redeliveries can be dropped by the back end.
+
+    `emit(event, data, callback)` sends on the client's namespace;
+    `is_connected()` reports the connection state. Call connected() from the
+    client's connect handler and disconnected() from its disconnect handler.
+    """
+
+    def __init__(self, emit, is_connected, user_id, spool=None, window=OUTBOUND_WINDOW,
+                 ack_timeout=OUTBOUND_ACK_TIMEOUT, require_ack=OUTBOUND_REQUIRE_ACK, bulk_batch_size=BULK_BATCH_SIZE,
+                 max_attempts=OUTBOUND_MAX_ATTEMPTS):
+        self.emit = emit
+        self.is_connected = is_connected
+        self.user_id = user_id
+        self.spool = spool if spool is not None else OutboundSpool()
+        self.window = window
+        self.ack_timeout = ack_timeout
+        self.require_ack = require_ack
+        self.bulk_batch_size = bulk_batch_size
+        self.max_attempts = max_attempts
+        self._in_flight = {}  # emit sequence -> (entry ids, sent at, detected_at values)
+        self._sequence = 0
+        self._wake = threading.Condition()
+        self._stopped = False
+
+    def start(self):
+        threading.Thread(target=self._run, name="outbound-delivery", daemon=True).start()
+        return self
+
+    def stop(self):
+        with self._wake:
+            self._stopped = True
+            self._wake.notify_all()
+
+    def send(self, event, payload, key, detected_at=None):
+        """Spools an event for delivery. Returns False if it was already spooled (same key)."""
+        added = self.spool.add(event, payload, key, detected_at)
+        if not added:
+            logger.debug(f"Skipping already spooled message {key}.")
+        with self._wake:
+            self._wake.notify_all()
+        return added
+
+    def connected(self):
+        """The connection is (re)established: start flushing the spool."""
+        with self._wake:
+            self._wake.notify_all()
+
+    def disconnected(self):
+        """Acks for in-flight emits will never arrive; they are resent after reconnecting."""
+        with self._wake:
+            self._in_flight.clear()
+            self._wake.notify_all()
+
+    def in_flight(self):
+        with self._wake:
+            return sum(len(entry_ids) for entry_ids, _, _ in self._in_flight.values())
+
+    def _run(self):
+        while True:
+            with self._wake:
+                if self._stopped:
+                    return
+                self._expire_in_flight()
+                if not self.is_connected() or len(self._in_flight) >= self.window:
+                    self._wake.wait(timeout=1.0)
+                    continue
+                exclude = {entry_id for entry_ids, _, _ in self._in_flight.values() for entry_id in entry_ids}
+                slots = self.window - len(self._in_flight)
+
+            entries = self.spool.pending(slots * self.bulk_batch_size, exclude)
+            if not entries:
+                with self._wake:
+                    if not self._stopped:
+                        self._wake.wait(timeout=1.0)
+                continue
+
+            # More pending than free slots is a backlog (e.g. after a reconnect): send it in batches
+            units = self._batches(entries) if len(entries) > slots else [[entry] for entry in entries]
+            for unit in units[:slots]:
+                if not self._emit(unit):
+                    # Back off briefly instead of spinning while the connection is failing
+                    with self._wake:
+                        self._wake.wait(timeout=1.0)
+                    break
+
+    def _batches(self, entries):
+        """Groups runs of 'newMessage' entries into batches; other events go on their own."""
+        units = []
+        for entry in entries:
+            if (
+                entry[1] == "newMessage" and units and units[-1][0][1] == "newMessage"
+                and len(units[-1]) < self.bulk_batch_size
+            ):
+                units[-1].append(entry)
+            else:
+                units.append([entry])
+        return units
+
+    def _emit(self, unit):
+        entry_ids = [entry_id for entry_id, _, _, _ in unit]
+        detected_at = [entry_detected_at for _, _, _, entry_detected_at in unit]
+        if len(unit) == 1:
+            event, data = unit[0][1], unit[0][2]
+        else:
+            messages = [{key: value for key, value in payload.items() if key != "user_id"} for _, _, payload, _ in unit]
+            event, data = "newMessages", {"user_id": self.user_id, "messages": messages}
+
+        with self._wake:
+            self._sequence += 1
+            sequence = self._sequence
+            self._in_flight[sequence] = (entry_ids, time.monotonic(), detected_at)
+        self.spool.mark_attempted(entry_ids)
+        try:
+            if self.require_ack:
+                self.emit(event, data, lambda *args: self._acked(sequence))
+            else:
+                self.emit(event, data, None)
+                self._acked(sequence)
+            return True
+        except Exception as e:
+            with self._wake:
+                self._in_flight.pop(sequence, None)
+            metrics.emit_failed(len(unit))
+            logger.warning(f"Emit of {len(unit)} spooled messages failed ({e}); will retry.")
+            self._dead_letter_exhausted(entry_ids)
+            return False
+
+    def _acked(self, sequence):
+        with self._wake:
+            unit = self._in_flight.pop(sequence, None)
+            if unit is None:
+                return  # Timed out already; the resend is acked (and dropped by key) as well
+            # Removed while still holding the lock, so the delivery thread can't pick the entries up again
+            entry_ids, _, detected_at = unit
+            self.spool.remove(entry_ids)
+            self._wake.notify_all()
+        for entry_detected_at in detected_at:
+            metrics.message_emitted(entry_detected_at)
+
+    def _expire_in_flight(self):
+        now = time.monotonic()
+        for sequence, (entry_ids, sent_at, _) in list(self._in_flight.items()):
+            if now - sent_at > self.ack_timeout:
+                logger.warning(f"No ack for {len(entry_ids)} messages after {self.ack_timeout}s; resending.")
+                del self._in_flight[sequence]
+                self._dead_letter_exhausted(entry_ids)
+
+    def _dead_letter_exhausted(self, entry_ids):
+        """Stops retrying the entries that reached max_attempts."""
+        if not self.max_attempts:
+            return
+        dead_keys = self.spool.dead_letter(entry_ids, self.max_attempts)
+        if dead_keys:
+            metrics.increment('outbound_dead_letters_total', len(dead_keys))
+            logger.error(
+                f"Gave up on {len(dead_keys)} messages after {self.max_attempts} emits without an ack; "
+                f"moved to the dead letters in {self.spool.path}: {', '.join(dead_keys)}"
+            )
+
+
+def start_outbound_delivery(sio, user_id, namespace="/messaging"):
+    """Opens the spool and starts delivering it over a threaded Socket.IO client."""
+    return OutboundDelivery(
+        lambda event, data, callback: sio.emit(event, data, namespace=namespace, callback=callback),
+        lambda: sio.connected,
+        user_id,
+    ).start()
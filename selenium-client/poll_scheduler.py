@@ -0,0 +1,100 @@
+import logging
+import os
+
+from driver_tracing import PHASE_SCHEDULING, traced
+
+logger = logging.getLogger(__name__)
+
+MIN_POLL_INTERVAL = float(os.getenv("MIN_POLL_INTERVAL", "1"))  # Right after activity
+BASE_POLL_INTERVAL = float(os.getenv("BASE_POLL_INTERVAL", "5"))  # Once the conversation settles
+MAX_POLL_INTERVAL = float(os.getenv("MAX_POLL_INTERVAL", "60"))  # Long idle
+HIDDEN_POLL_INTERVAL = float(os.getenv("HIDDEN_POLL_INTERVAL", "30"))  # Paused: only checks visibility
+ACTIVE_CYCLES = 6  # Idle cycles spent at MIN_POLL_INTERVAL after activity
+BACKOFF_FACTOR = 1.5
+
+VISIBILITY_SCRIPT = "return document.visibilityState;"
+
+
+@traced(PHASE_SCHEDULING)
+def is_tab_hidden(driver):
+    """True if the page reports itself hidden (another tab is in front, or the window is minimized)."""
+    try:
+        return driver.execute_script(VISIBILITY_SCRIPT) == "hidden"
+    except Exception:
+        logger.exception("Error checking tab visibility.")
+        return False
+
+
+class AdaptivePollScheduler:
+    """
+    Chooses the interval before the next poll cycle.
+
+    A detected message or a sent response drops the interval to min_interval
+    for a few cycles; after that it returns to base_interval and then backs off
+    exponentially up to max_interval while nothing happens. While the tab is
+    hidden, polling is paused and the tab is re-checked every hidden_interval.
+    """
+
+    def __init__(
+        self,
+        min_interval=MIN_POLL_INTERVAL,
+        base_interval=BASE_POLL_INTERVAL,
+        max_interval=MAX_POLL_INTERVAL,
+        hidden_interval=HIDDEN_POLL_INTERVAL,
+        active_cycles=ACTIVE_CYCLES,
+        backoff_factor=BACKOFF_FACTOR,
+    ):
+        self.min_interval = min_interval
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.hidden_interval = hidden_interval
+        self.active_cycles = active_cycles
+        self.backoff_factor = backoff_factor
+        self.idle_cycles = active_cycles  # Start settled, not active
+        self.paused = False
+        self.current_interval = base_interval
+        self.stats = {
+            "cycles": 0,
+            "activity_events": 0,
+            "paused_cycles": 0,
+            "last_interval": base_interval,
+        }
+
+    def record_activity(self):
+        """Call when a message was detected or a response was sent."""
+        self.idle_cycles = 0
+        self.stats["activity_events"] += 1
+
+    def should_poll(self):
+        """False while paused on a hidden tab; the caller then only waits."""
+        return not self.paused
+
+    def next_interval(self, tab_hidden=False):
+        """Returns the seconds to wait before the next cycle and logs changes."""
+        self.stats["cycles"] += 1
+
+        if tab_hidden:
+            interval = self.hidden_interval
+            if not self.paused:
+                logger.info("Tab is hidden; pausing polling.")
+            self.paused = True
+            self.stats["paused_cycles"] += 1
+        else:
+            if self.paused:
+                logger.info("Tab is visible again; resuming polling.")
+                # Catch up promptly after the user comes back
+                self.idle_cycles = 0
+            self.paused = False
+
+            if self.idle_cycles < self.active_cycles:
+                interval = self.min_interval
+            else:
+                backoff_steps = self.idle_cycles - self.active_cycles
+                interval = min(self.base_interval * (self.backoff_factor ** backoff_steps), self.max_interval)
+            self.idle_cycles += 1
+
+        if interval != self.current_interval:
+            logger.info(f"Poll interval changed: {self.current_interval:.2f}s -> {interval:.2f}s")
+        self.current_interval = interval
+        self.stats["last_interval"] = interval
+        return interval
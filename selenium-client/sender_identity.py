@@ -0,0 +1,51 @@
+import functools
+import hashlib
+import hmac
+import os
+
+PEPPER = os.getenv("PEPPER", "SuperSecretPepperValue")  # Securely store this in production
+SENDER_CACHE_SIZE = int(os.getenv("SENDER_CACHE_SIZE", "1024"))  # Distinct raw sender names memoized
+
+UNKNOWN_SENDER = "Unknown"
+
+
+def derive_salt(sender_name, pepper):
+    """
+    Derives a deterministic salt based on the sender's name and a secret pepper.
+    """
+    return hmac.new(
+        key=pepper.encode('utf-8'),
+        msg=sender_name.encode('utf-8'),
+        digestmod=hashlib.sha256
+    ).digest()[:16]  # Use the first 16 bytes as the salt
+
+
+def hash_sender_name(sender_name, salt, pepper):
+    """
+    Hashes the sender's name using SHA-256 with a derived salt and pepper.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(sender_name.encode('utf-8') + salt + pepper.encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def normalize_sender_name(sender_name):
+    """Strips, lowercases and collapses whitespace in a sender name."""
+    return ' '.join(sender_name.split()).lower()
+
+
+@functools.lru_cache(maxsize=SENDER_CACHE_SIZE)
+def normalized_sender(raw_sender_name):
+    """Normalized sender name for raw sender text as extracted from the page (None if missing)."""
+    return normalize_sender_name(raw_sender_name if raw_sender_name is not None else UNKNOWN_SENDER)
+
+
+@functools.lru_cache(maxsize=SENDER_CACHE_SIZE)
+def hash_sender(raw_sender_name):
+    """
+    The hashed_sender_name sent to the back end for raw sender text: the
+    normalized name, hashed with its derived salt and the pepper. Memoized, so
+    each participant of a chat is hashed once.
+    """
+    sender_name = normalized_sender(raw_sender_name)
+    return hash_sender_name(sender_name, derive_salt(sender_name, PEPPER), PEPPER)
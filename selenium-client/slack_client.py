@@ -1,31 +1,65 @@
-from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    ElementNotInteractableException,
+)
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 import time
-import uuid
-import urllib.parse
 import logging
 from messaging_client_base import MessagingClientBase
+from slack_extraction import (
+    MESSAGE_SELECTOR,
+    chat_id_from_url,
+    extract_recent_messages,
+    extract_slack_messages,
+    parse_message_ts,
+    slack_change_detector,
+)
+from slack_websocket_source import SlackWebSocketSource
+from cdp_session import connect_to_driver_page
+from fast_send import SLACK_COMPOSER_SELECTORS, send_text
+from sender_identity import hash_sender, normalized_sender
+from driver_tracing import PHASE_CHAT_ID, PHASE_CONTEXT, PHASE_SENDING, traced
 
 logger = logging.getLogger(__name__)
 
 class SlackClient(MessagingClientBase):
+    MESSAGE_SELECTOR = MESSAGE_SELECTOR
+
     def __init__(self, driver):
         super().__init__(driver)
+        self.message_source = None
+        # Polls where the fingerprint is unchanged skip extraction
+        self.change_detector = slack_change_detector()
         logger.info("Initialized SlackClient")
 
+    def enable_websocket_source(self):
+        """Reads messages from Slack's websocket via CDP; Selenium is then only used for sending."""
+        self.message_source = SlackWebSocketSource(connect_to_driver_page(self.driver))
+        self.message_source.start()
+        logger.info("Slack websocket message source enabled.")
+
+    def attach_driver(self, driver):
+        super().attach_driver(driver)
+        if self.message_source is not None:
+            try:
+                self.message_source.stop()
+                self.enable_websocket_source()
+            except Exception as e:
+                logger.exception("Failed to re-enable Slack websocket source; falling back to DOM scraping.")
+                self.message_source = None
+
+    chat_id_from_url = staticmethod(chat_id_from_url)
+
+    @traced(PHASE_CHAT_ID)
     def get_current_chat_id(self):
         """Returns Slack chat ID from the URL."""
         try:
-            current_url = self.driver.current_url
-            parsed_url = urllib.parse.urlparse(current_url)
-            channel_id = urllib.parse.parse_qs(parsed_url.query).get('channel', [None])[0]
-            return channel_id or parsed_url.path
+            return self.chat_id_from_url(self.driver.current_url)
         except Exception as e:
             logger.exception("Error getting Slack chat ID.")
             return None
 
+    @traced(PHASE_CONTEXT)
     def is_thread_open(self):
         """Checks if a Slack thread is open."""
         try:
@@ -36,31 +70,73 @@ class SlackClient(MessagingClientBase):
 
     def collect_messages_after(self, last_message_from_me_ts_float):
         """Collects Slack messages after the last message from 'me'."""
-        messages = self.driver.find_elements(By.CSS_SELECTOR, "div.c-message_kit__background")
+        messages = extract_slack_messages(self.driver, MESSAGE_SELECTOR)
+        detected_at = time.time()
         collected_messages = []
 
         for message in messages:
-            try:
-                timestamp_element = message.find_element(By.CSS_SELECTOR, "a.c-timestamp")
-                message_id = timestamp_element.get_attribute("data-ts")
-                message_ts_float = float(message_id)
-
-                if message_ts_float <= last_message_from_me_ts_float:
-                    continue
-
-                sender_name = message.find_element(By.CSS_SELECTOR, "span.c-message__sender").text
-                content = message.find_element(By.CSS_SELECTOR, "div.c-message_kit__blocks").text.strip()
-
-                collected_messages.append({
-                    'message_id': message_id,
-                    'content': content,
-                    'timestamp': message_ts_float,
-                    'hashed_sender_name': sender_name
-                })
-            except NoSuchElementException:
+            message_ts_float = message['message_ts_float']
+            if message_ts_float is None or message['sender_name'] is None:
+                continue
+
+            if message_ts_float <= last_message_from_me_ts_float:
                 continue
-        
+
+            collected_messages.append({
+                'message_id': message['message_id'],
+                'content': message['content'],
+                'timestamp': message_ts_float,
+                'hashed_sender_name': hash_sender(message['sender_name']),
+                'detected_at': detected_at,
+            })
+
         return collected_messages
 
+    def watermark_ts(self, message):
+        """The message's Slack ts, parsed from its id (the data-ts value), rather than the emitted timestamp."""
+        ts_float = parse_message_ts(message.get('message_id'))
+        return ts_float if ts_float is not None else message['timestamp']
+
+    def collect_recent_messages(self, count):
+        """The last `count` messages of Slack's main pane, in one extraction call."""
+        return [
+            {
+                'message_id': message['message_id'],
+                'content': message['content'],
+                'timestamp': message['message_ts_float'],
+                'sender_name': message['sender_name'],
+            }
+            for message in extract_recent_messages(self.driver, count)
+        ]
+
+    def is_from_me(self, sender_name):
+        """Whether a Slack sender is 'me' (pearl), as messaging_slack decides it."""
+        return "pearl" in normalized_sender(sender_name).lower()
+
     def detect_new_messages(self, last_processed_ts_float):
-        return self.collect_messages_after(last_processed_ts_float)
+        if self.message_source is not None:
+            return self.message_source.drain_messages(self.get_current_chat_id(), last_processed_ts_float)
+        if not self.change_detector.changed(self.driver):
+            return []
+        messages = self.collect_messages_after(last_processed_ts_float)
+        self.change_detector.mark_processed()
+        return messages
+
+    @traced(PHASE_SENDING)
+    def send_response(self, response):
+        """Sends the response through the open thread's input box, or the main input box."""
+        try:
+            composer = send_text(self.driver, SLACK_COMPOSER_SELECTORS, response)
+            target = "thread" if composer == 0 else "main chat"
+            logger.info(f"Sent response to Slack ({target}): {response}")
+        except NoSuchElementException:
+            logger.exception("Failed to locate Slack message input.")
+        except ElementNotInteractableException:
+            logger.exception("Slack message input not interactable.")
+        except Exception as e:
+            logger.exception("Failed to send response to Slack.")
+
+    def wait_for_new_messages(self, timeout):
+        if self.message_source is not None:
+            return self.message_source.wait(timeout)
+        return super().wait_for_new_messages(timeout)
@@ -0,0 +1,303 @@
+import logging
+import time
+import urllib.parse
+
+from change_detector import CHANGE_DETECTION, ChangeDetector
+from driver_executor import SCAN_CHUNK_SIZE
+from driver_tracing import PHASE_EXTRACTION, traced
+
+logger = logging.getLogger(__name__)
+
+# Selectors for Slack's message list
+MESSAGE_SELECTOR = "div.c-message_kit__background"
+MAIN_MESSAGE_SELECTOR = "div.p-view_contents--primary div.c-message_kit__background"
+THREAD_MESSAGE_SELECTOR = "div.c-virtual_list__item--thread div.c-message_kit__background"
+THREAD_PANE_SELECTOR = "div.p-threads_view"
+
+# The panes a snapshot can cover
+PANE_MAIN = "main"
+PANE_THREAD = "thread"
+ALL_PANES = frozenset([PANE_MAIN, PANE_THREAD])
+PANE_SELECTORS = {PANE_MAIN: MAIN_MESSAGE_SELECTOR, PANE_THREAD: THREAD_MESSAGE_SELECTOR}
+
+# Sender selectors, tried in order
+SENDER_SELECTORS = [
+    "a.c-message__sender_link",
+    "button.c-message__sender_button",
+    "span.c-message__sender",
+    "span.offscreen[data-qa^='aria-labelledby']",
+]
+
+# Runs inside the page and returns one plain JSON object per message node, so a
+# whole scan costs a single WebDriver round trip instead of several per message.
+# Optional arguments[2] / arguments[3] (start, count) limit it to a chunk of nodes;
+# a negative start counts from the last node. With arguments[4] (a ts), only the nodes after the last one at or before that
+# ts are read, and start counts from the first of them.
+EXTRACT_MESSAGES_SCRIPT = """
+var selector = arguments[0];
+var senderSelectors = arguments[1];
+var nodes = document.querySelectorAll(selector);
+var start = arguments[2] || 0;
+if (start < 0) {
+    start = Math.max(0, nodes.length + start);
+}
+if (arguments[4] != null) {
+    var first = nodes.length;
+    while (first > 0) {
+        var tsElement = nodes[first - 1].querySelector('a.c-timestamp');
+        if (tsElement && parseFloat(tsElement.getAttribute('data-ts')) <= arguments[4]) {
+            break;
+        }
+        first--;
+    }
+    start += first;
+}
+var end = arguments[3] ? Math.min(nodes.length, start + arguments[3]) : nodes.length;
+var records = [];
+for (var i = start; i < end; i++) {
+    var node = nodes[i];
+    var timestampElement = node.querySelector('a.c-timestamp');
+    var sender = null;
+    for (var j = 0; j < senderSelectors.length; j++) {
+        var senderElement = node.querySelector(senderSelectors[j]);
+        if (senderElement) {
+            sender = senderElement.innerText;
+            break;
+        }
+    }
+    var blocks = node.querySelector('div.c-message_kit__blocks');
+    records.push({
+        message_id: timestampElement ? timestampElement.getAttribute('data-ts') : null,
+        sender_name: sender,
+        content: blocks ? blocks.innerText : '',
+        in_thread: node.closest('div.c-virtual_list__item--thread') !== null
+    });
+}
+return records;
+"""
+
+# Everything one poll cycle needs, read in a single execute_script call: the URL,
+# whether the chat is a DM, whether a thread is open, and the first chunk of
+# message records (same arguments and record format as EXTRACT_MESSAGES_SCRIPT).
+SNAPSHOT_SCRIPT = """
+var extractMessages = function() {
+""" + EXTRACT_MESSAGES_SCRIPT + """
+};
+var mainContent = document.querySelector('div.p-view_contents.p-view_contents--primary');
+var label = mainContent ? (mainContent.getAttribute('aria-label') || '') : '';
+var threadPane = document.querySelector('div.p-threads_view');
+return {
+    url: window.location.href,
+    is_dm: label.indexOf('Conversation with') !== -1,
+    thread_open: !!threadPane && threadPane.getClientRects().length > 0
+        && window.getComputedStyle(threadPane).visibility !== 'hidden',
+    messages: extractMessages.apply(null, arguments)
+};
+"""
+
+
+# Fingerprints the main pane and the thread pane separately, so a poll can tell
+# which of them changed. Returns [url, main pane, thread pane ('' while closed)],
+# each pane as message count | hash of the last data-ts (| hash of the text).
+# arguments: main message selector, thread message selector, thread pane selector.
+PANE_FINGERPRINT_SCRIPT = """
+function hash(text) {
+    var h = 0;
+    for (var i = 0; i < text.length; i++) {
+        h = (h * 31 + text.charCodeAt(i)) | 0;
+    }
+    return h;
+}
+function paneFingerprint(selector) {
+    var nodes = document.querySelectorAll(selector);
+    var last = nodes.length ? nodes[nodes.length - 1].querySelector('a.c-timestamp') : null;
+    return nodes.length + '|' + hash(last ? last.getAttribute('data-ts') || '' : '');
+}
+var threadPane = document.querySelector(arguments[2]);
+var threadOpen = !!threadPane && threadPane.getClientRects().length > 0;
+return [
+    window.location.href,
+    paneFingerprint(arguments[0]),
+    threadOpen ? paneFingerprint(arguments[1]) + '|' + hash(threadPane.textContent) : ''
+];
+"""
+
+
+class SlackChangeDetector(ChangeDetector):
+    """
+    ChangeDetector that fingerprints the main pane and the thread pane
+    separately; changed_panes() tells which of them need scanning.
+    """
+
+    script = PANE_FINGERPRINT_SCRIPT
+
+    def __init__(self, enabled=CHANGE_DETECTION):
+        super().__init__(MAIN_MESSAGE_SELECTOR, enabled=enabled)
+        self.args = (MAIN_MESSAGE_SELECTOR, THREAD_MESSAGE_SELECTOR, THREAD_PANE_SELECTOR)
+
+    def changed_panes(self):
+        """
+        The panes (PANE_MAIN, PANE_THREAD) whose fingerprint differs from the
+        last processed cycle; all of them after a chat change or when unknown,
+        none if the only change was closing the thread.
+        """
+        if not self.pending or not self.processed or self.pending[0] != self.processed[0]:
+            return ALL_PANES
+        panes = set()
+        if self.pending[1] != self.processed[1]:
+            panes.add(PANE_MAIN)
+        if self.pending[2] != self.processed[2] and self.pending[2]:
+            # A closed thread has nothing to scan
+            panes.add(PANE_THREAD)
+        return frozenset(panes)
+
+    def pending_chat_id(self):
+        """The chat ID of the URL read by the last changed() call, or None."""
+        return chat_id_from_url(self.pending[0]) if self.pending else None
+
+
+def slack_change_detector():
+    """A SlackChangeDetector: message count and last data-ts per pane, plus the thread pane's text."""
+    return SlackChangeDetector()
+
+
+def chat_id_from_url(url):
+    """Returns the Slack chat ID for a URL: the channel query parameter, or the path."""
+    parsed_url = urllib.parse.urlparse(url)
+    channel_id = urllib.parse.parse_qs(parsed_url.query).get('channel', [None])[0]
+    return channel_id or parsed_url.path
+
+
+class SlackSnapshot:
+    """
+    The state of the Slack tab at one point in a poll cycle. `messages` holds
+    the rendered message records (see extract_slack_messages) of the panes in
+    `panes`, oldest first; `main_messages` and `thread_messages` split them
+    into the main pane and the open thread pane. With `after_ts`, the main
+    pane's messages up to that ts were not read.
+    """
+
+    def __init__(self, url, is_dm, thread_open, messages, detected_at, panes=ALL_PANES, after_ts=None):
+        self.url = url
+        self.chat_id = chat_id_from_url(url) if url else None
+        self.is_dm = is_dm
+        self.thread_open = thread_open
+        self.messages = messages
+        self.panes = panes
+        self.after_ts = after_ts
+        self.main_messages = [message for message in messages if not message['in_thread']]
+        self.thread_messages = [message for message in messages if message['in_thread']] if thread_open else []
+        self.detected_at = detected_at
+
+    @property
+    def thread_ts(self):
+        """The open thread's parent message ts, read from its first rendered message; None if none is rendered."""
+        return self.thread_messages[0]['message_id'] if self.thread_messages else None
+
+
+def parse_message_ts(message_id):
+    """
+    Converts a Slack data-ts value to a float, or None if it is missing or malformed.
+    """
+    try:
+        return float(message_id)
+    except (TypeError, ValueError):
+        return None
+
+
+@traced(PHASE_EXTRACTION)
+def extract_slack_messages(driver, selector=MESSAGE_SELECTOR, chunk_size=SCAN_CHUNK_SIZE):
+    """
+    Extracts every Slack message matching `selector`, `chunk_size` messages per
+    execute_script call (all in one call if chunk_size is 0). Chunking bounds how
+    long a queued send waits behind a scan.
+    Returns:
+        A list of dicts (oldest to newest) with message_id, message_ts_float,
+        sender_name (stripped text, or None if no sender element), content and in_thread.
+    """
+    if not chunk_size:
+        records = driver.execute_script(EXTRACT_MESSAGES_SCRIPT, selector, SENDER_SELECTORS) or []
+    else:
+        first_chunk = driver.execute_script(EXTRACT_MESSAGES_SCRIPT, selector, SENDER_SELECTORS, 0, chunk_size) or []
+        records = _extract_remaining_chunks(driver, selector, first_chunk, chunk_size)
+    logger.debug(f"Extracted {len(records)} messages for selector {selector!r}.")
+    return _normalize_records(records)
+
+
+@traced(PHASE_EXTRACTION)
+def extract_recent_messages(driver, count, selector=MAIN_MESSAGE_SELECTOR):
+    """
+    Extracts the last `count` messages matching `selector` (the main pane by
+    default) in one execute_script call, in the same format as extract_slack_messages.
+    """
+    records = driver.execute_script(EXTRACT_MESSAGES_SCRIPT, selector, SENDER_SELECTORS, -count) or []
+    return _normalize_records(records)
+
+
+@traced(PHASE_EXTRACTION)
+def take_slack_snapshot(driver, chunk_size=SCAN_CHUNK_SIZE, panes=ALL_PANES, after_ts=None):
+    """
+    Reads the URL, DM flag, thread state and the rendered messages of `panes`
+    (both by default; see SlackChangeDetector.changed_panes), with the context
+    and the first chunk of messages in one round trip (the rest, if any, in
+    further chunks as extract_slack_messages does).
+    With `after_ts` only the main pane's messages after it are read, e.g. when
+    returning to a chat whose watermark is known; the open thread, if it is
+    in `panes`, is read in full with extract_slack_messages.
+    Returns a SlackSnapshot.
+    """
+    panes = frozenset(panes)
+    if after_ts is not None:
+        selector = MAIN_MESSAGE_SELECTOR
+    else:
+        selector = MESSAGE_SELECTOR if panes == ALL_PANES else PANE_SELECTORS[next(iter(panes))]
+    if not chunk_size:
+        state = driver.execute_script(SNAPSHOT_SCRIPT, selector, SENDER_SELECTORS, 0, 0, after_ts) or {}
+        records = state.get('messages') or []
+    else:
+        state = driver.execute_script(SNAPSHOT_SCRIPT, selector, SENDER_SELECTORS, 0, chunk_size, after_ts) or {}
+        records = _extract_remaining_chunks(driver, selector, state.get('messages') or [], chunk_size, after_ts)
+    records = _normalize_records(records)
+    if after_ts is not None and PANE_THREAD in panes and state.get('thread_open'):
+        records += extract_slack_messages(driver, THREAD_MESSAGE_SELECTOR, chunk_size)
+    return SlackSnapshot(
+        state.get('url'),
+        bool(state.get('is_dm')),
+        bool(state.get('thread_open')),
+        records,
+        time.time(),
+        panes,
+        after_ts,
+    )
+
+
+def _extract_remaining_chunks(driver, selector, first_chunk, chunk_size, after_ts=None):
+    """Extends `first_chunk` (the records from 0 to chunk_size) with the following chunks."""
+    records = []
+    seen_ids = set()
+    chunk = first_chunk
+    start = 0
+    while True:
+        for record in chunk:
+            # Older history rendered between chunks shifts the list; skip repeats. A thread's
+            # parent is rendered in both panes with the same ts, so the pane is part of the key.
+            message_id = record.get('message_id')
+            if message_id is not None:
+                key = (message_id, bool(record.get('in_thread')))
+                if key in seen_ids:
+                    continue
+                seen_ids.add(key)
+            records.append(record)
+        start += len(chunk)
+        if len(chunk) < chunk_size:
+            return records
+        chunk = driver.execute_script(EXTRACT_MESSAGES_SCRIPT, selector, SENDER_SELECTORS, start, chunk_size, after_ts) or []
+
+
+def _normalize_records(records):
+    for record in records:
+        sender_name = record.get('sender_name')
+        record['sender_name'] = sender_name.strip() if sender_name is not None else None
+        record['content'] = (record.get('content') or "").strip()
+        record['message_ts_float'] = parse_message_ts(record.get('message_id'))
+    return records
@@ -0,0 +1,217 @@
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+from cdp_session import evaluate_function
+from sender_identity import hash_sender, normalized_sender
+
+logger = logging.getLogger(__name__)
+
+# Slack user ID of 'me' (e.g. U0123ABCD); messages from it are skipped to prevent feedback loops
+SLACK_USER_ID = os.getenv("SLACK_USER_ID")
+MAX_BUFFERED_MESSAGES = 1000  # Per channel
+MAX_BUFFERED_CHANNELS = 50  # Channels with undrained messages; the least recently active is dropped
+MAX_CACHED_SENDER_NAMES = 5000  # Slack user ID -> display name entries kept
+
+# Prefix for hashing a Slack user ID that could not be resolved to a display name.
+# Such hashes never match the DOM paths' (which hash the display name).
+UNRESOLVED_SENDER_PREFIX = "slack-user:"
+
+# Returns {user ID: sender text} for the message senders rendered in the page,
+# read from the same sender elements the DOM paths hash (Slack puts the user ID
+# in their data-message-sender attribute). arguments[0]: the IDs to look up.
+SENDER_NAMES_SCRIPT = """
+var wanted = {};
+for (var i = 0; i < arguments[0].length; i++) {
+    wanted[arguments[0][i]] = true;
+}
+var names = {};
+var elements = document.querySelectorAll('[data-message-sender]');
+for (var i = elements.length - 1; i >= 0; i--) {
+    var id = elements[i].getAttribute('data-message-sender');
+    if (wanted[id] && !names[id] && elements[i].innerText) {
+        names[id] = elements[i].innerText;
+    }
+}
+return names;
+"""
+
+# Message subtypes that carry a new, user-visible message
+RELAYED_SUBTYPES = {None, "bot_message", "file_share", "me_message", "thread_broadcast"}
+
+
+def chat_matches_channel(chat_id, channel_id):
+    """
+    True if a chat ID from get_current_chat_id (a channel ID or a URL path such
+    as /client/T123/C456) refers to `channel_id`.
+    """
+    if not chat_id or not channel_id:
+        return False
+    return chat_id == channel_id or chat_id.rstrip('/').endswith('/' + channel_id)
+
+
+def parse_message_event(payload, my_user_id=SLACK_USER_ID):
+    """
+    Decodes a Slack real-time websocket frame.
+    Returns:
+        A message dict, or None if the frame is not a new message from someone else.
+        Its sender_id is the Slack user (or bot) ID and sender_name the display
+        name if the frame carries a user_profile; hashed_sender_name is set when
+        the message is drained (see SlackWebSocketSource.resolve_senders).
+    """
+    try:
+        event = json.loads(payload)
+    except (TypeError, ValueError):
+        return None
+
+    if not isinstance(event, dict) or event.get('type') != 'message':
+        return None
+    if event.get('hidden') or event.get('subtype') not in RELAYED_SUBTYPES:
+        return None
+
+    sender = event.get('user') or event.get('bot_id') or event.get('username')
+    if my_user_id and sender == my_user_id:
+        return None
+
+    ts = event.get('ts')
+    try:
+        ts_float = float(ts)
+    except (TypeError, ValueError):
+        return None
+
+    profile = event.get('user_profile') or {}
+    return {
+        'message_id': ts,
+        'content': (event.get('text') or "").strip(),
+        'timestamp': ts_float,
+        'sender_id': sender,
+        'sender_name': profile.get('display_name') or profile.get('real_name') or event.get('username'),
+        'hashed_sender_name': None,
+        'channel': event.get('channel'),
+        'thread_ts': event.get('thread_ts'),
+        'detected_at': time.time(),
+    }
+
+
+class SlackWebSocketSource:
+    """
+    Message source that listens to Slack's own real-time websocket through CDP
+    Network.webSocketFrameReceived, instead of scraping the rendered DOM.
+
+    Frames carry the sender's user ID, while the DOM paths hash the sender's
+    display name, so senders are resolved to the name rendered in the page
+    (cached per user ID) before hashing; the same person then has the same
+    hashed_sender_name with either source. A sender that cannot be resolved
+    is hashed as UNRESOLVED_SENDER_PREFIX + user ID, which does not match.
+    """
+
+    def __init__(self, session, my_user_id=SLACK_USER_ID, max_buffered=MAX_BUFFERED_MESSAGES,
+                 max_channels=MAX_BUFFERED_CHANNELS):
+        self.session = session
+        self.my_user_id = my_user_id
+        self.max_buffered = max_buffered
+        self.max_channels = max_channels
+        self.sender_names = collections.OrderedDict()  # Slack user ID -> sender text, least recently used first
+        self._messages = collections.OrderedDict()  # Channel ID -> buffered messages, least recently active first
+        self._lock = threading.Lock()
+        self._activity = threading.Event()
+
+    def start(self):
+        self.session.on("Network.webSocketFrameReceived", self._on_frame)
+        self.session.send("Network.enable")
+        if not self.my_user_id:
+            logger.warning("SLACK_USER_ID is not set; messages from 'me' are only filtered out by name.")
+        logger.info("Listening for Slack websocket message events.")
+
+    def stop(self):
+        self.session.off("Network.webSocketFrameReceived", self._on_frame)
+        if self.session.connected:
+            try:
+                self.session.send("Network.disable")
+            except Exception:
+                logger.exception("Error disabling CDP network events.")
+
+    def drain_messages(self, chat_id, after_ts_float):
+        """
+        Removes and returns buffered messages for `chat_id` newer than `after_ts_float`, oldest first.
+        Messages from 'me' are left out once their senders are resolved.
+        """
+        collected = []
+        with self._lock:
+            for channel_id in list(self._messages):
+                if not chat_matches_channel(chat_id, channel_id):
+                    continue
+                collected.extend(self._messages.pop(channel_id))
+            self._activity.clear()
+
+        if after_ts_float is not None:
+            collected = [message for message in collected if message['timestamp'] > after_ts_float]
+        collected.sort(key=lambda message: message['timestamp'])
+        self.resolve_senders(collected)
+        return [message for message in collected if not self.is_from_me(message)]
+
+    def is_from_me(self, message):
+        """Whether a drained message's resolved sender is 'me' (pearl), as the DOM paths decide it."""
+        name = self.sender_names.get(message['sender_id']) or message['sender_name']
+        return name is not None and "pearl" in normalized_sender(name).lower()
+
+    def resolve_senders(self, messages):
+        """
+        Sets hashed_sender_name on `messages` from the sender's display name:
+        the cached one, else the one rendered in the page (one script call for
+        all unknown senders), else the name in the frame.
+        """
+        unknown = sorted({
+            message['sender_id'] for message in messages
+            if message['sender_id'] is not None and message['sender_id'] not in self.sender_names
+        })
+        if unknown:
+            try:
+                names = evaluate_function(self.session, SENDER_NAMES_SCRIPT, unknown) or {}
+            except Exception:
+                logger.exception("Error resolving Slack sender names.")
+                names = {}
+            for message in messages:
+                sender_id = message['sender_id']
+                name = names.get(sender_id) or message['sender_name']
+                if name and sender_id not in self.sender_names:
+                    self.sender_names[sender_id] = name
+            while len(self.sender_names) > MAX_CACHED_SENDER_NAMES:
+                self.sender_names.popitem(last=False)
+
+        for message in messages:
+            name = self.sender_names.get(message['sender_id'])
+            if message['sender_id'] is None:
+                message['hashed_sender_name'] = hash_sender(None)
+            elif name is not None:
+                self.sender_names.move_to_end(message['sender_id'])
+                message['hashed_sender_name'] = hash_sender(name)
+            else:
+                logger.warning(f"Could not resolve Slack user {message['sender_id']}; hashing the user ID instead.")
+                message['hashed_sender_name'] = hash_sender(f"{UNRESOLVED_SENDER_PREFIX}{message['sender_id']}")
+
+    def wait(self, timeout):
+        """Blocks until a message event arrives or `timeout` seconds pass."""
+        return self._activity.wait(timeout)
+
+    def _on_frame(self, params):
+        payload = params.get('response', {}).get('payloadData')
+        message = parse_message_event(payload, self.my_user_id)
+        if message is None:
+            return
+
+        with self._lock:
+            buffered = self._messages.get(message['channel'])
+            if buffered is None:
+                buffered = collections.deque(maxlen=self.max_buffered)
+                self._messages[message['channel']] = buffered
+            self._messages.move_to_end(message['channel'])
+            buffered.append(message)
+            while len(self._messages) > self.max_channels:
+                dropped_channel, dropped = self._messages.popitem(last=False)
+                logger.debug(f"Dropped {len(dropped)} buffered messages for {dropped_channel}.")
+            self._activity.set()
+        logger.debug(f"Slack websocket message {message['message_id']} in {message['channel']}.")
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The clients are flat modules; the fake driver lives with the benchmarks
+CLIENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CLIENT_DIR)
+sys.path.insert(0, os.path.join(CLIENT_DIR, "benchmarks"))
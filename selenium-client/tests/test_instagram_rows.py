@@ -0,0 +1,43 @@
+from fake_webdriver import instagram_driver
+
+import messaging_instagram
+from instagram_extraction import InstagramCursor
+
+
+def post_pair(driver):
+    driver.page.append_message("Alex Rivera", "thanks")
+    driver.page.append_message("Alex Rivera", "ok")
+
+
+def contents(rows):
+    return [row['content'] for row in rows]
+
+
+def test_repeated_pair_is_relayed_again():
+    driver = instagram_driver(messages=20)
+    messaging_instagram.seen_messages.clear()
+    messaging_instagram.collect_new_messages_instagram(driver, "chat")
+
+    post_pair(driver)
+    assert contents(messaging_instagram.collect_new_messages_instagram(driver, "chat")) == ["thanks", "ok"]
+
+    driver.page.append_message("You", "np")
+    post_pair(driver)
+    assert contents(messaging_instagram.collect_new_messages_instagram(driver, "chat")) == ["thanks", "ok"]
+    assert messaging_instagram.collect_new_messages_instagram(driver, "chat") == []
+
+
+def test_cursor_relays_repeated_pair_after_losing_its_anchor():
+    driver = instagram_driver(messages=20)
+    cursor = InstagramCursor()
+    cursor.new_rows(driver)
+
+    post_pair(driver)
+    assert contents(cursor.new_rows(driver)) == ["thanks", "ok"]
+    driver.page.append_message("You", "np")
+    assert contents(cursor.new_rows(driver)) == ["np"]
+
+    post_pair(driver)
+    # The anchor row goes away, so the cursor falls back to the keys it saw recently
+    driver.page.grid.remove(driver.page.grid.elements()[-3])
+    assert contents(cursor.new_rows(driver)) == ["thanks", "ok"]
@@ -0,0 +1,45 @@
+from fake_webdriver import FakeDriver, SlackPage
+from fixtures import BASE_TS
+
+import multi_chat_monitor
+from multi_chat_monitor import MonitoredChat, MultiChatMonitor
+from slack_extraction import EXTRACT_MESSAGES_SCRIPT
+from watermark_store import WatermarkStore
+
+
+def scan_with_fake_tab(monkeypatch):
+    """Routes the monitor's CDP evaluations to a FakeDriver and counts full extractions."""
+    extractions = []
+
+    def evaluate_function(session, script, *args):
+        if script == EXTRACT_MESSAGES_SCRIPT:
+            extractions.append(script)
+        return session.execute_script(script, *args)
+
+    monkeypatch.setattr(multi_chat_monitor, "evaluate_function", evaluate_function)
+    return extractions
+
+
+def test_foreground_chat_is_left_to_the_foreground_loop(tmp_path, monkeypatch):
+    extractions = scan_with_fake_tab(monkeypatch)
+    watermark_store = WatermarkStore(str(tmp_path / "watermarks.db"))
+    monitor = MultiChatMonitor([], lambda chat_id, message: None, watermark_store=watermark_store)
+    tab = FakeDriver(SlackPage(messages=20))
+    chat = MonitoredChat(tab.page.url, "target", tab)
+    monitor.scan(chat)
+
+    # Open in the foreground: that loop relays the message and stores its watermark
+    monitor.set_foreground_chat(chat.chat_id)
+    tab.page.append_message("Alex Rivera", "seen in the foreground")
+    assert monitor.scan(chat) == []
+    watermark_store.set(chat.chat_id, BASE_TS + tab.page.next_index - 1)
+
+    monitor.set_foreground_chat("C_OTHER")
+    tab.page.append_message("Alex Rivera", "arrived in the background")
+    assert [message['content'] for message in monitor.scan(chat)] == ["arrived in the background"]
+
+    # Nothing changed: only the fingerprint is read
+    extracted = len(extractions)
+    assert monitor.scan(chat) == []
+    assert len(extractions) == extracted
+    watermark_store.close()
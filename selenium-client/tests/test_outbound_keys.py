@@ -0,0 +1,43 @@
+from fake_webdriver import FakeDriver, InstagramPage
+
+import messaging_client_base
+import messaging_slack
+from instagram_client import InstagramClient
+from messaging_client import relay_new_messages
+from outbound_spool import OutboundDelivery, OutboundSpool, message_idempotency_key
+from watermark_store import WatermarkStore
+
+
+def test_equal_row_keys_in_two_chats_are_both_spooled(tmp_path, monkeypatch):
+    spool = OutboundSpool(str(tmp_path / "outbound.db"))
+    monkeypatch.setattr(messaging_client_base, "outbound", OutboundDelivery(None, lambda: False, "user", spool=spool))
+    watermark_store = WatermarkStore(str(tmp_path / "watermarks.db"))
+
+    keys = []
+    for chat in ("111", "222"):
+        # Both chats render the same rows, so their row keys are equal too
+        client = InstagramClient(FakeDriver(InstagramPage(messages=20, url=f"https://www.instagram.com/direct/t/{chat}/")))
+        client.detect_new_messages(0)
+        client.driver.page.append_message("Alex Rivera", "thanks")
+        client.driver.page.append_message("Alex Rivera", "ok")
+        messages = client.detect_new_messages(0)
+        keys.append([message['message_id'] for message in messages])
+        relay_new_messages(client, client.get_current_chat_id(), messages, watermark_store, 0)
+
+    assert keys[0] == keys[1]
+    payloads = [payload for _, _, payload, _ in spool.pending(10)]
+    assert len(payloads) == 4
+    assert [payload['chat_id'] for payload in payloads] == ["111", "111", "222", "222"]
+    watermark_store.close()
+
+
+def test_slack_script_keys_unidentified_messages_like_the_clients(tmp_path, monkeypatch):
+    spool = OutboundSpool(str(tmp_path / "outbound.db"))
+    monkeypatch.setattr(messaging_slack, "outbound", OutboundDelivery(None, lambda: False, "user", spool=spool))
+    monkeypatch.setattr(messaging_slack, "message_batcher", None)
+    # Same time and text from two senders: two messages, not one redelivery
+    messaging_slack.send_message_via_websocket("hi", 1700000000.0, "alex", chat_id="C1")
+    messaging_slack.send_message_via_websocket("hi", 1700000000.0, "sam", chat_id="C1")
+
+    keys = [payload['idempotency_key'] for _, _, payload, _ in spool.pending(10)]
+    assert keys == [message_idempotency_key("C1", None, 1700000000.0, sender, "hi") for sender in ("alex", "sam")]
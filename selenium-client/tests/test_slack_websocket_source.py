@@ -0,0 +1,42 @@
+import json
+
+from slack_websocket_source import SlackWebSocketSource
+
+
+class FakeSession:
+    """Answers the sender-name lookup with no names rendered in the page."""
+
+    def send(self, method, params=None):
+        return {'result': {'value': {}}}
+
+
+def frame(channel, ts, user, display_name):
+    payload = json.dumps({
+        'type': 'message', 'channel': channel, 'ts': ts, 'user': user, 'text': f"hello from {display_name}",
+        'user_profile': {'display_name': display_name},
+    })
+    return {'response': {'payloadData': payload}}
+
+
+def test_messages_from_me_are_dropped_without_a_user_id():
+    source = SlackWebSocketSource(FakeSession(), my_user_id=None)
+    source._on_frame(frame("C1", "1700000001.000000", "U1", "Alex Rivera"))
+    source._on_frame(frame("C1", "1700000002.000000", "U2", "Pearl"))
+
+    drained = source.drain_messages("C1", None)
+
+    assert [message['sender_id'] for message in drained] == ["U1"]
+
+
+def test_least_recently_active_channel_is_dropped():
+    source = SlackWebSocketSource(FakeSession(), my_user_id=None, max_channels=2)
+    source._on_frame(frame("C1", "1700000001.000000", "U1", "Alex Rivera"))
+    source._on_frame(frame("C2", "1700000002.000000", "U1", "Alex Rivera"))
+    source._on_frame(frame("C1", "1700000003.000000", "U1", "Alex Rivera"))
+    source._on_frame(frame("C3", "1700000004.000000", "U1", "Alex Rivera"))
+
+    assert source.drain_messages("C2", None) == []
+    assert [message['message_id'] for message in source.drain_messages("C1", None)] == [
+        "1700000001.000000", "1700000003.000000"
+    ]
+    assert len(source.drain_messages("C3", None)) == 1
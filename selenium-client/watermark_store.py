@@ -0,0 +1,118 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_DB_PATH = os.getenv("WATERMARK_DB_PATH", "watermarks.db")
+FLUSH_BATCH_SIZE = 20  # Pending updates that force a commit
+FLUSH_INTERVAL = 2.0  # Seconds after which pending updates are committed anyway
+
+MAIN_PANE = ""  # thread_id used for the main message pane
+
+
+class WatermarkStore:
+    """
+    Persistent per-chat (and per-thread) processed-message watermarks.
+
+    Updates are buffered in memory and committed in batches, so the fsync cost
+    is shared by many messages instead of paid once per emitted message.
+    """
+
+    def __init__(self, path=WATERMARK_DB_PATH, batch_size=FLUSH_BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._cache = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        # WAL with synchronous=NORMAL fsyncs at checkpoints rather than on every commit
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS watermarks ("
+            " chat_id TEXT NOT NULL,"
+            " thread_id TEXT NOT NULL,"
+            " ts REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (chat_id, thread_id))"
+        )
+        self._connection.commit()
+        logger.info(f"Opened watermark store at {path}")
+
+    def get(self, chat_id, thread_id=MAIN_PANE):
+        """
+        Returns the stored watermark for a chat/thread, or None if there is none.
+        A thread_id of None means the pane could not be identified and is never tracked.
+        """
+        if chat_id is None or thread_id is None:
+            return None
+        key = (chat_id, thread_id)
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            if key in self._cache:
+                return self._cache[key]
+            row = self._connection.execute(
+                "SELECT ts FROM watermarks WHERE chat_id = ? AND thread_id = ?", key
+            ).fetchone()
+            ts = row[0] if row else None
+            self._cache[key] = ts
+            return ts
+
+    def set(self, chat_id, ts, thread_id=MAIN_PANE):
+        """Records a watermark; it only moves forward. Flushes when the batch is full or stale."""
+        if chat_id is None or thread_id is None or ts is None:
+            return
+        key = (chat_id, thread_id)
+        current = self.get(chat_id, thread_id)
+        if current is not None and ts <= current:
+            return
+        with self._lock:
+            self._pending[key] = ts
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        """Flushes if the batch is full or the last flush was more than flush_interval ago."""
+        with self._lock:
+            should_flush = self._pending and (
+                len(self._pending) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """Commits all pending watermarks in one transaction."""
+        with self._lock:
+            if not self._pending:
+                self._last_flush = time.monotonic()
+                return
+            pending = self._pending
+            self._pending = {}
+            now = time.time()
+            try:
+                with self._connection:
+                    self._connection.executemany(
+                        "INSERT INTO watermarks (chat_id, thread_id, ts, updated_at) VALUES (?, ?, ?, ?)"
+                        " ON CONFLICT(chat_id, thread_id) DO UPDATE SET"
+                        " ts = MAX(ts, excluded.ts), updated_at = excluded.updated_at",
+                        [(chat_id, thread_id, ts, now) for (chat_id, thread_id), ts in pending.items()],
+                    )
+            except sqlite3.Error:
+                logger.exception("Failed to flush watermarks; will retry.")
+                for key, ts in pending.items():
+                    self._pending.setdefault(key, ts)
+                return
+            self._cache.update(pending)
+            self._last_flush = time.monotonic()
+        logger.debug(f"Flushed {len(pending)} watermarks.")
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._connection.close()